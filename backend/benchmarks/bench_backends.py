@@ -0,0 +1,148 @@
+"""
+Parity check and latency/memory benchmark for the fish classifier inference
+backends (services.fish_classifier.BACKENDS).
+
+Each backend runs in its own process, so its resident memory can be measured
+in isolation. Predictions are compared with the Keras model on the same
+images. The script exits non-zero if any backend's mean top-5 overlap is
+below --min-top5.
+
+Run from the backend directory, after `python export_model.py ...`:
+    python -m benchmarks.bench_backends \\
+        --backend tflite:FishModelClassifier_V5.tflite \\
+        --backend tflite:FishModelClassifier_V5_int8.tflite \\
+        --backend onnx:FishModelClassifier_V5_int8.onnx \\
+        --images-dir ~/catch-photos
+
+Without --images-dir, synthetic images are used. Parity on real photos is
+what matters, because quantization error shows up most on natural images.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from services.fish_classifier import BACKENDS, INPUT_SIZE, decode_image
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load_images(images_dir, count: int) -> np.ndarray:
+    if images_dir:
+        paths = sorted(glob.glob(os.path.join(os.path.expanduser(images_dir), "*")))[:count]
+        batch = np.empty((len(paths),) + INPUT_SIZE + (3,), dtype=np.float32)
+        for i, path in enumerate(paths):
+            with open(path, "rb") as f:
+                decode_image(f.read(), batch[i])
+        return batch
+    rng = np.random.default_rng(0)
+    # Smooth random fields look more like photos to a CNN than white noise does
+    coarse = rng.uniform(0, 1, (count, 14, 14, 3)).astype(np.float32)
+    return np.repeat(np.repeat(coarse, 16, axis=1), 16, axis=2)
+
+
+def worker(backend: str, path: str, images_path: str, output_path: str, batch_sizes, repeat: int):
+    """Runs in a child process: load one backend, time it, save its predictions."""
+    images = np.load(images_path)
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    loader, default_path = BACKENDS[backend]
+    predict = loader(path or default_path)
+    predict(images[:1])
+    load_s = time.perf_counter() - started
+
+    latency = {}
+    for size in batch_sizes:
+        batch = images[:size] if size <= len(images) else np.resize(images, (size,) + images.shape[1:])
+        predict(batch)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            predict(batch)
+            best = min(best, time.perf_counter() - started)
+        latency[size] = {"batch_ms": round(best * 1000, 2), "per_image_ms": round(best * 1000 / size, 2)}
+
+    outputs = np.concatenate([predict(images[i:i + 16]) for i in range(0, len(images), 16)])
+    np.save(output_path, outputs)
+    print(json.dumps({"load_s": round(load_s, 2), "rss_mb": round(rss_mb(), 1),
+                      "model_rss_mb": round(rss_mb() - baseline_rss, 1), "latency": latency}))
+
+
+def agreement(reference: np.ndarray, candidate: np.ndarray):
+    ref_top5 = np.argsort(reference, axis=1)[:, ::-1][:, :5]
+    cand_top5 = np.argsort(candidate, axis=1)[:, ::-1][:, :5]
+    overlap = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ref_top5, cand_top5)])
+    top1 = np.mean(ref_top5[:, 0] == cand_top5[:, 0])
+    max_diff = float(np.abs(reference - candidate).max())
+    return float(top1), float(overlap), max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", default=[], metavar="NAME[:PATH]",
+                        help="Backend to compare against keras; repeatable")
+    parser.add_argument("--reference", default="keras", metavar="NAME[:PATH]")
+    parser.add_argument("--images-dir", help="Directory of real fish photos for the parity check")
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--batch-sizes", default="1,8,16")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-top5", type=float, default=0.95, help="Minimum mean top-5 overlap")
+    parser.add_argument("--worker", nargs=3, metavar=("SPEC", "IMAGES", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    batch_sizes = [int(s) for s in args.batch_sizes.split(",")]
+
+    if args.worker:
+        spec, images_path, output_path = args.worker
+        name, _, path = spec.partition(":")
+        worker(name, path, images_path, output_path, batch_sizes, args.repeat)
+        return
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        images_path = os.path.join(tmp, "images.npy")
+        np.save(images_path, load_images(args.images_dir, args.images))
+        results = {}
+        for spec in [args.reference] + args.backend:
+            output_path = os.path.join(tmp, f"{len(results)}.npy")
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_backends", "--worker", spec, images_path, output_path,
+                 "--batch-sizes", args.batch_sizes, "--repeat", str(args.repeat)],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{spec}: failed\n{proc.stderr.strip()[-2000:]}")
+                failed = True
+                continue
+            results[spec] = (json.loads(proc.stdout.strip().splitlines()[-1]), np.load(output_path))
+
+    if args.reference not in results:
+        sys.exit(1)
+    reference = results[args.reference][1]
+    header = f"{'backend':<44}{'load s':>8}{'RSS MB':>9}" + "".join(f"{f'b={b} ms/img':>13}" for b in batch_sizes)
+    print(header + f"{'top-1':>8}{'top-5':>8}{'max|dp|':>9}")
+    for spec, (stats, outputs) in results.items():
+        top1, top5, max_diff = agreement(reference, outputs)
+        row = f"{spec:<44}{stats['load_s']:>8}{stats['rss_mb']:>9}"
+        row += "".join(f"{stats['latency'][str(b)]['per_image_ms']:>13}" for b in batch_sizes)
+        print(row + f"{top1:>8.3f}{top5:>8.3f}{max_diff:>9.4f}")
+        if top5 < args.min_top5:
+            print(f"  FAIL: mean top-5 overlap {top5:.3f} < {args.min_top5}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
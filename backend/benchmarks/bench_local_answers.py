@@ -0,0 +1,73 @@
+"""
+Offline check of the local SeaBot answer engine (services.local_answers).
+
+Runs a fixed set of questions against the precomputed index with no network
+and no model, reports per-question latency, and exits non-zero if a question
+matches the wrong passage or an off-topic question gets a local answer.
+
+Run from the backend directory, after `python -m services.local_answers build`:
+    python -m benchmarks.bench_local_answers
+"""
+
+import argparse
+import sys
+import time
+
+from services.local_answers import DEFAULT_INDEX_PATH, EMERGENCY_REPLY, LocalAnswers
+
+# (question, expected passage id; None: must fall through to the model)
+CASES = [
+    ("What is PFZ?", "faq:pfz"),
+    ("what is the IBL border", "faq:ibl"),
+    ("where is the compass", "faq:compass"),
+    ("How do I record my catch?", "faq:catch-record"),
+    ("Is it safe to fish today?", "faq:safety-status"),
+    ("best time to catch mackerel", "fish:mackerel"),
+    ("pomfret season", "fish:pomfret"),
+    ("tell me about gill nets", "net:gill_nets"),
+    ("how much does a trawl net cost", "net:trawl_nets"),
+    ("fish finder price", "equipment:fish_finders"),
+    ("coast guard number", "screen:ImportantContactsScreen"),
+    ("संभावित मत्स्य क्षेत्र", "faq:pfz"),
+    ("மீன்பிடி வலை வழிகாட்டி", "faq:fishing-advice"),
+    ("My boat is sinking!", "emergency"),
+    ("Mayday, man overboard", "emergency"),
+    ("What to do in an emergency?", "faq:sos"),
+    ("What is the capital of France?", None),
+    ("How do I repair my outboard engine?", None),
+    ("Can you tell me a joke?", None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    engine = LocalAnswers.load(args.index)
+    print(f"Loaded {engine.stats()['passages']} passages in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    failed = False
+    for question, expected in CASES:
+        answer = engine.answer(question)
+        hits = engine.search(question, limit=1)
+        if answer is None:
+            got = None
+        elif answer == EMERGENCY_REPLY:
+            got = "emergency"
+        else:
+            got = hits[0][2]["id"]
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            engine.answer(question)
+        ms = (time.perf_counter() - started) * 1000 / args.repeat
+        ok = got == expected
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {ms:6.3f} ms  {question!r} -> {got} (expected {expected})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Microbenchmark: the original classifier preprocessing (full-resolution decode,
+float64 divide, expand_dims) vs services.fish_classifier's draft-mode decode
+into a preallocated float32 buffer, single-threaded and on the thread pool.
+
+Uses synthetic phone-sized JPEGs (12 MP by default) and reports time per
+image, peak Python-tracked memory per image and pixel-level parity.
+
+Run from the backend directory:
+    python -m benchmarks.bench_preprocess --images 16 --megapixels 12
+"""
+
+import argparse
+import asyncio
+import io
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from services.fish_classifier import INPUT_SIZE, Preprocessor, decode_image
+
+
+def legacy_preprocess(data: bytes) -> np.ndarray:
+    """The original main.py/fishClassify.py path, kept here as the reference."""
+    image = Image.open(io.BytesIO(data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize((224, 224))
+    img_array = np.array(image) / 255.0
+    return np.expand_dims(img_array, 0)
+
+
+def synthetic_jpeg(megapixels: float, seed: int) -> bytes:
+    """A smooth-ish random photo, so JPEG sizes resemble real camera output."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    small = Image.fromarray(rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8))
+    image = small.resize((width, height), Image.BILINEAR).filter(ImageFilter.GaussianBlur(2))
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def timed(fn, images, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for data in images:
+            fn(data)
+        best = min(best, time.perf_counter() - started)
+    return best / len(images)
+
+
+def peak_memory(fn, data) -> int:
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="Thread pool size (default: min(8, cpus))")
+    args = parser.parse_args()
+
+    images = [synthetic_jpeg(args.megapixels, seed) for seed in range(args.images)]
+    print(f"{args.images} JPEGs of {args.megapixels} MP, {np.mean([len(d) for d in images]) / 1e6:.1f} MB average")
+
+    buffer = np.empty(INPUT_SIZE + (3,), dtype=np.float32)
+    legacy = timed(legacy_preprocess, images, args.repeat)
+    fast = timed(lambda data: decode_image(data, buffer), images, args.repeat)
+
+    preprocessor = Preprocessor(args.workers)
+    pooled = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        asyncio.run(preprocessor.preprocess_many(images))
+        pooled = min(pooled, (time.perf_counter() - started) / len(images))
+    preprocessor.close()
+
+    legacy_mem = peak_memory(legacy_preprocess, images[0])
+    fast_mem = peak_memory(lambda data: decode_image(data, buffer), images[0])
+
+    diffs = [np.abs(legacy_preprocess(data)[0] - decode_image(data)) for data in images]
+    max_diff = max(float(d.max()) for d in diffs)
+    mean_diff = float(np.mean([d.mean() for d in diffs]))
+
+    print(f"legacy            {legacy * 1000:8.2f} ms/image   peak {legacy_mem / 1e6:7.2f} MB")
+    print(f"draft + float32   {fast * 1000:8.2f} ms/image   peak {fast_mem / 1e6:7.2f} MB   "
+          f"{legacy / fast:.1f}x faster")
+    print(f"thread pool batch {pooled * 1000:8.2f} ms/image   {legacy / pooled:.1f}x faster")
+    print(f"pixel parity: mean |diff| {mean_diff:.4f}, max |diff| {max_diff:.4f} (on a 0-1 scale)")
+    with Image.open(io.BytesIO(images[0])) as image:
+        full = image.size
+        image.draft('RGB', INPUT_SIZE)
+        print(f"decoded raster: {full[0]}x{full[1]} ({full[0] * full[1] * 3 / 1e6:.1f} MB) -> "
+              f"{image.size[0]}x{image.size[1]} ({image.size[0] * image.size[1] * 3 / 1e6:.1f} MB) in draft mode")
+    print("note: peak memory counts NumPy buffers only; PIL's decode rasters are outside tracemalloc")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Microbenchmark: scalar `IndiaFishingAlerts._score` vs the vectorized engine in
+services.scoring, with a parity check on the same random inputs.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scoring --points 10000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from services.fishing_alerts import IndiaFishingAlerts
+from services.scoring import FACTORS, score_arrays
+
+
+def scalar_scores(alerts: IndiaFishingAlerts, weather, marine, is_day):
+    """The original per-value scoring loop, kept here as the reference."""
+    checks = [
+        alerts._score(weather, "current.wind_speed_10m", alerts.limits["wind_ms"], "Wind", "m/s"),
+        alerts._score(weather, "current.precipitation", alerts.limits["rain_mm"], "Rain", "mm", invert=True),
+        alerts._score(weather, "current.visibility",
+                      alerts.limits["visibility_m"] if is_day else alerts.limits["visibility_m_night"],
+                      "Visibility", "m", higher_is_better=True, scale=1),
+        alerts._score(marine, "current.wave_height", alerts.limits["wave_m"], "Wave", "m"),
+        alerts._score(marine, "current.swell_wave_height", alerts.limits["swell_m"], "Swell", "m"),
+        alerts._score(marine, "current.ocean_current_velocity", alerts.limits["current_ms"], "Current", "m/s"),
+    ]
+    valid_scores = [c["probability"] for c in checks if c["probability"] is not None]
+    avg_score = sum(valid_scores) / len(valid_scores) if valid_scores else 0
+    return checks, round(avg_score, 2), avg_score >= 75 and is_day
+
+
+def random_inputs(n: int, missing: float, seed: int):
+    rng = np.random.default_rng(seed)
+    values = {
+        "wind": rng.uniform(0, 25, n),
+        "rain": rng.exponential(3, n),
+        "visibility": rng.uniform(0, 30000, n),
+        "wave": rng.uniform(0, 5, n),
+        "swell": rng.uniform(0, 4, n),
+        "current": rng.uniform(0, 2, n),
+    }
+    for arr in values.values():
+        arr[rng.random(n) < missing] = np.nan
+    is_day = rng.random(n) < 0.5
+    return values, is_day
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--missing", type=float, default=0.05, help="Fraction of values set missing")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    alerts = IndiaFishingAlerts(None)
+    values, is_day = random_inputs(args.points, args.missing, args.seed)
+
+    payloads = []
+    for i in range(args.points):
+        current = {"weather": {}, "marine": {}}
+        for name, _, _, source, key in FACTORS:
+            if not np.isnan(values[name][i]):
+                current[source][key] = float(values[name][i])
+        payloads.append(({"current": current["weather"]}, {"current": current["marine"]}, bool(is_day[i])))
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        scalar = [scalar_scores(alerts, w, m, d) for w, m, d in payloads]
+    scalar_s = (time.perf_counter() - start) / args.repeat
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        vector = score_arrays(alerts.limits, is_day=is_day, **values)
+    vector_s = (time.perf_counter() - start) / args.repeat
+
+    # Parity: same per-factor probabilities (None <-> NaN), risk and safe flag
+    prob_diff, risk_diff, safe_mismatch = 0.0, 0.0, 0
+    for i, (checks, risk, safe) in enumerate(scalar):
+        for (name, *_), check in zip(FACTORS, checks):
+            v = vector[name][i]
+            if check["probability"] is None:
+                assert np.isnan(v), f"point {i} {name}: expected missing, got {v}"
+            else:
+                prob_diff = max(prob_diff, abs(check["probability"] - round(float(v), 2)))
+        risk_diff = max(risk_diff, abs(risk - vector["risk_probability"][i]))
+        safe_mismatch += safe != bool(vector["safe"][i])
+
+    print(f"points:           {args.points}")
+    print(f"scalar _score:    {scalar_s * 1e3:9.2f} ms  ({scalar_s / args.points * 1e6:.2f} us/point)")
+    print(f"vectorized:       {vector_s * 1e3:9.2f} ms  ({vector_s / args.points * 1e6:.3f} us/point)")
+    print(f"speedup:          {scalar_s / vector_s:9.1f}x")
+    print(f"max |prob diff|:  {prob_diff:.4f}")
+    print(f"max |risk diff|:  {risk_diff:.4f}")
+    print(f"safe mismatches:  {safe_mismatch}")
+    if prob_diff > 0.01 or risk_diff > 0.01 or safe_mismatch:
+        raise SystemExit("Vectorized scores diverge from the scalar path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Load test and latency benchmark for the SeaGuard API.
+
+Starts the upstream stand-ins (benchmarks/stubs.py) and the API (main:app) as
+separate uvicorn processes, points the API at the stubs through its
+environment, then drives the selected endpoints at a fixed concurrency.
+Reports p50/p95/p99 latency, throughput, errors, upstream calls and API
+process memory, and writes the results as JSON so runs on different commits
+can be compared.
+
+Run from the backend directory:
+    python -m benchmarks.loadtest --endpoints fishing-alert,rss-feed,chat \\
+        --concurrency 64 --duration 20 --latency-ms 80
+    python -m benchmarks.loadtest --compare benchmarks/results/<older>.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# Coastal points spread along the Indian coastline, plus a "harbour" cluster
+COAST = [(19.0, 72.8), (16.9, 73.3), (13.3, 74.7), (9.9, 76.2), (8.1, 77.5), (13.1, 80.3),
+         (10.8, 79.8), (17.7, 83.3), (19.8, 85.8), (21.6, 87.5), (21.6, 69.6), (20.9, 70.4)]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB (Linux /proc, or psutil when installed)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 1024 / 1024
+    except Exception:
+        return None
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def point(spread: float) -> Dict[str, float]:
+    lat, lon = random.choice(COAST)
+    return {"lat": round(lat + random.uniform(-spread, spread), 5),
+            "lon": round(lon + random.uniform(-spread, spread), 5)}
+
+
+def fish_image() -> bytes:
+    """A synthetic phone-sized JPEG, generated once."""
+    from PIL import Image
+    import numpy as np
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, (3024, 4032, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def build_scenarios(args) -> Dict[str, Callable[[httpx.AsyncClient], "asyncio.Future"]]:
+    image = None
+
+    def fishing_alert(client):
+        return client.get("/fishing-alert", params=point(args.spread))
+
+    def rss_feed(client):
+        return client.get("/rss-feed", params=point(args.spread))
+
+    def chat(client):
+        question = random.choice(["How do I use SOS?", "What is PFZ?", "Which net for sardines?"])
+        return client.post("/chat", json={"history": [{"role": "user", "content": question}]})
+
+    async def chat_stream(client):
+        # Latency recorded for this scenario is the time to the first streamed token
+        question = random.choice(["How do I use SOS?", "What is PFZ?", "Which net for sardines?"])
+        async with client.stream("POST", "/chat/stream",
+                                 json={"history": [{"role": "user", "content": question}]}) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    break
+            return response
+
+    def fish_classify(client):
+        nonlocal image
+        image = image or fish_image()
+        return client.post("/fish-classify/predict", files={"file": ("fish.jpg", image, "image/jpeg")})
+
+    return {"fishing-alert": fishing_alert, "rss-feed": rss_feed, "chat": chat, "chat-stream": chat_stream,
+            "fish-classify": fish_classify}
+
+
+def start_process(cmd: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url: str, proc: subprocess.Popen, timeout: float, expect_ok: bool = False) -> float:
+    """Seconds until `url` answers (with a 2xx if `expect_ok`), or raise if the process dies or times out."""
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Process exited with code {proc.returncode} before becoming ready")
+            try:
+                response = await client.get(url, timeout=1)
+                if not expect_ok or response.is_success:
+                    return time.perf_counter() - started
+                await asyncio.sleep(0.2)
+            except httpx.HTTPError:
+                await asyncio.sleep(0.05)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+async def drive(base_url: str, name: str, request, concurrency: int, duration: float, warmup: float,
+                pid: int) -> Dict[str, object]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    peak_rss = 0.0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        measuring_from = time.perf_counter() + warmup
+        stop_at = measuring_from + duration
+
+        async def worker():
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    response = await request(client)
+                    outcome = None if response.status_code < 400 else str(response.status_code)
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                if started >= measuring_from:
+                    latencies.append(time.perf_counter() - started)
+                    if outcome:
+                        errors[outcome] = errors.get(outcome, 0) + 1
+
+        async def sample_memory():
+            nonlocal peak_rss
+            while time.perf_counter() < stop_at:
+                peak_rss = max(peak_rss, rss_mb(pid) or 0)
+                await asyncio.sleep(0.25)
+
+        await asyncio.gather(sample_memory(), *(worker() for _ in range(concurrency)))
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 2) if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+async def run(args) -> Dict[str, object]:
+    stub_port, app_port = free_port(), free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    latency = {"default": args.latency_ms, "jitter": args.jitter_ms}
+    for item in args.upstream_latency:
+        name, _, ms = item.partition("=")
+        latency[name] = float(ms)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    stub_env = {**os.environ, "STUB_LATENCY": json.dumps(latency)}
+    app_env = {
+        # Every simulated user shares 127.0.0.1, so the per-client chat limit would throttle them all
+        "CHAT_PER_CLIENT_LIMIT": "1000000",
+        **os.environ,
+        "OPEN_METEO_URL": f"{stub_url}/v1/forecast",
+        "OPEN_METEO_MARINE_URL": f"{stub_url}/v1/marine",
+        "NOMINATIM_URL": f"{stub_url}/reverse",
+        "GOOGLE_NEWS_RSS_URL": f"{stub_url}/rss/search",
+        "MISTRAL_SERVER_URL": stub_url,
+        "MISTRAL_API_KEY": "benchmark",
+        "TWILIO_VERIFY_URL": stub_url,
+        "TWILIO_ACCOUNT_SID": "ACbenchmark", "TWILIO_AUTH_TOKEN": "benchmark",
+        "TWILIO_PHONE_NUMBER": "+10000000000", "TWILIO_SERVICE_SID": "VAbenchmark",
+        "SUPABASE_URL": stub_url, "SUPABASE_KEY": "bench.mark.key",
+        "SAFETY_GRID_ENABLED": "1" if args.safety_grid else "0",
+    }
+
+    uvicorn = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--log-level", "warning"]
+    stub = start_process(uvicorn + ["--port", str(stub_port), "benchmarks.stubs:app"], stub_env,
+                         os.path.join(args.out_dir, "stubs.log"))
+    api = None
+    try:
+        await wait_ready(f"{stub_url}/stub/stats", stub, 30)
+        api = start_process(uvicorn + ["--port", str(app_port), "--workers", str(args.workers), "main:app"],
+                            app_env, os.path.join(args.out_dir, "api.log"))
+        startup_s = await wait_ready(f"http://127.0.0.1:{app_port}/", api, args.startup_timeout)
+        rss_start = rss_mb(api.pid)
+        # The model loads in the background; wait so its warmup is not measured as request latency
+        model_ready_s = None
+        if "fish-classify" in args.endpoints:
+            model_ready_s = await wait_ready(f"http://127.0.0.1:{app_port}/fish-classify/ready", api,
+                                             args.startup_timeout, expect_ok=True)
+
+        scenarios = build_scenarios(args)
+        results = {}
+        for name in args.endpoints.split(","):
+            async with httpx.AsyncClient() as client:
+                before = (await client.get(f"{stub_url}/stub/stats")).json()
+            print(f"-> {name}: {args.concurrency} concurrent for {args.duration}s", flush=True)
+            results[name] = await drive(f"http://127.0.0.1:{app_port}", name, scenarios[name],
+                                        args.concurrency, args.duration, args.warmup, api.pid)
+            async with httpx.AsyncClient() as client:
+                after = (await client.get(f"{stub_url}/stub/stats")).json()
+            results[name]["upstream_calls"] = {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+
+        return {
+            "git_commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {
+                "concurrency": args.concurrency, "duration_s": args.duration, "warmup_s": args.warmup,
+                "workers": args.workers, "latency_ms": latency, "spread_deg": args.spread,
+                "safety_grid": args.safety_grid,
+            },
+            "startup_s": round(startup_s, 2),
+            "model_ready_s": round(startup_s + model_ready_s, 2) if model_ready_s is not None else None,
+            "rss_start_mb": round(rss_start, 1) if rss_start else None,
+            "rss_end_mb": round(rss_mb(api.pid) or 0, 1),
+            "results": results,
+        }
+    finally:
+        for proc in (api, stub):
+            if proc is not None:
+                proc.terminate()
+                try:
+                    proc.wait(10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+
+def print_report(report: Dict[str, object], baseline: Optional[Dict[str, object]] = None):
+    print(f"\ncommit {report['git_commit']}  startup {report['startup_s']}s  "
+          f"rss {report['rss_start_mb']} -> {report['rss_end_mb']} MB")
+    header = f"{'endpoint':<16}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in report["results"].items():
+        print(f"{name:<16}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{sum(r['errors'].values()):>8}{r['peak_rss_mb']:>9}")
+        old = (baseline or {}).get("results", {}).get(name)
+        if old:
+            deltas = []
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+                if old.get(key) and r.get(key) is not None:
+                    deltas.append(f"{key} {100 * (r[key] - old[key]) / old[key]:+.1f}%")
+            print(f"{'':<16}vs {baseline['git_commit']}: " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default="fishing-alert,rss-feed,chat",
+                        help="Comma-separated: fishing-alert, rss-feed, chat, chat-stream (time to first token), "
+                             "fish-classify")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15, help="Measured seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before each endpoint")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the API")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Injected upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--upstream-latency", action="append", default=[], metavar="NAME=MS",
+                        help="Per-upstream latency: open-meteo, nominatim, google-news, mistral, twilio, token")
+    parser.add_argument("--spread", type=float, default=0.5, help="Degrees of scatter around each coastal point")
+    parser.add_argument("--safety-grid", action="store_true", help="Enable the background safety grid")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--out-dir", default=RESULTS_DIR,
+                        help="Directory for process logs and results (default: benchmarks/results, git-ignored)")
+    parser.add_argument("--output", help="Results file (default: <out-dir>/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        args.out_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['git_commit']}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\nSaved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Local stand-ins for the upstream services used by the SeaGuard API:
+Open-Meteo (forecast + marine), Nominatim, Google News RSS, Mistral chat
+completions and Twilio Verify.
+
+Responses are synthetic but shaped like the real APIs, and every request
+sleeps for an injected latency first. Latency comes from the STUB_LATENCY
+environment variable as JSON, in milliseconds, e.g.
+    {"default": 50, "jitter": 10, "open-meteo": 200, "mistral": 800}
+
+Run with:
+    STUB_LATENCY='{"default": 50}' uvicorn benchmarks.stubs:app --port 9100
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from zoneinfo import ZoneInfo
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+app = FastAPI(title="SeaGuard upstream stubs")
+
+IST = ZoneInfo("Asia/Kolkata")
+LATENCY = json.loads(os.getenv("STUB_LATENCY", "{}"))
+COUNTS = {}
+
+
+async def delay(service: str):
+    COUNTS[service] = COUNTS.get(service, 0) + 1
+    base = LATENCY.get(service, LATENCY.get("default", 0))
+    jitter = LATENCY.get("jitter", 0)
+    ms = max(0.0, base + random.uniform(-jitter, jitter))
+    if ms:
+        await asyncio.sleep(ms / 1000)
+
+
+def _coords(request: Request):
+    lats = [float(x) for x in request.query_params["latitude"].split(",")]
+    lons = [float(x) for x in request.query_params["longitude"].split(",")]
+    return list(zip(lats, lons))
+
+
+def _hourly_times(days: int):
+    """Local hours from today's midnight, as Open-Meteo returns them for timezone=Asia/Kolkata."""
+    start = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0)
+    return [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(days * 24)]
+
+
+def _open_meteo(request: Request, current_fields, hourly_fields):
+    rng = random.Random(request.query_params["latitude"])
+    results = []
+    for lat, lon in _coords(request):
+        body = {"latitude": lat, "longitude": lon, "timezone": "Asia/Kolkata"}
+        if "current" in request.query_params:
+            body["current"] = {name: round(fn(rng), 2) for name, fn in current_fields.items()
+                               if name in request.query_params["current"].split(",")}
+        if "hourly" in request.query_params:
+            times = _hourly_times(int(request.query_params.get("forecast_days", 7)))
+            body["hourly"] = {"time": times}
+            for name in request.query_params["hourly"].split(","):
+                if name in hourly_fields:
+                    body["hourly"][name] = [round(hourly_fields[name](rng), 2) for _ in times]
+        results.append(body)
+    return JSONResponse(results[0] if len(results) == 1 else results)
+
+
+WEATHER_FIELDS = {
+    "temperature_2m": lambda r: r.uniform(24, 34),
+    "relative_humidity_2m": lambda r: r.uniform(50, 95),
+    "apparent_temperature": lambda r: r.uniform(26, 40),
+    "precipitation": lambda r: r.choice([0, 0, 0, 0.4, 2.5]),
+    "precipitation_probability": lambda r: r.uniform(0, 100),
+    "weather_code": lambda r: r.choice([0, 1, 2, 3, 61]),
+    "pressure_msl": lambda r: r.uniform(1000, 1015),
+    "wind_speed_10m": lambda r: r.uniform(1, 15),
+    "visibility": lambda r: r.uniform(2000, 30000),
+}
+MARINE_FIELDS = {
+    "wave_height": lambda r: r.uniform(0.2, 3.0),
+    "wave_direction": lambda r: r.uniform(0, 360),
+    "wind_wave_period": lambda r: r.uniform(2, 8),
+    "swell_wave_height": lambda r: r.uniform(0.1, 2.5),
+    "ocean_current_velocity": lambda r: r.uniform(0, 1.5),
+}
+
+
+@app.get("/v1/forecast")
+async def open_meteo_forecast(request: Request):
+    await delay("open-meteo")
+    return _open_meteo(request, WEATHER_FIELDS, WEATHER_FIELDS)
+
+
+@app.get("/v1/marine")
+async def open_meteo_marine(request: Request):
+    await delay("open-meteo")
+    return _open_meteo(request, MARINE_FIELDS, MARINE_FIELDS)
+
+
+DISTRICTS = ["Mumbai", "Ratnagiri", "Udupi", "Kochi", "Kollam", "Kanyakumari", "Chennai",
+             "Nagapattinam", "Visakhapatnam", "Puri", "Digha", "Porbandar", "Veraval", "Karwar"]
+
+
+@app.get("/reverse")
+async def nominatim_reverse(lat: float, lon: float):
+    await delay("nominatim")
+    district = DISTRICTS[int(abs(lat * 7 + lon * 3)) % len(DISTRICTS)]
+    return {"display_name": f"{district}, India", "address": {"city": district, "state": "Stub State", "country": "India"}}
+
+
+@app.get("/rss/search")
+async def google_news_rss(request: Request):
+    await delay("google-news")
+    query = request.query_params.get("q", "")
+    etag = f'"{abs(hash(query)) % 10 ** 8}-{int(time.time() // 600)}"'
+    last_modified = formatdate(time.time() // 600 * 600, usegmt=True)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Last-Modified": last_modified})
+    items = "".join(
+        f"<item><title>Coastal update {i} - Stub News</title><link>https://example.com/{i}</link>"
+        f"<pubDate>{formatdate(time.time() - i * 3600, usegmt=True)}</pubDate>"
+        f"<description>&lt;a href=\"https://example.com/{i}\"&gt;Coastal update {i}&lt;/a&gt; Sea conditions report</description>"
+        f"<source url=\"https://example.com\">Stub News</source></item>"
+        for i in range(10)
+    )
+    xml = (f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><rss version=\"2.0\"><channel>"
+           f"<title>\"{query}\" - Google News</title><link>https://news.google.com</link>"
+           f"<description>Google News</description><lastBuildDate>{last_modified}</lastBuildDate>"
+           f"{items}</channel></rss>")
+    return Response(content=xml, media_type="application/rss+xml",
+                    headers={"ETag": etag, "Last-Modified": last_modified})
+
+
+REPLY = ("Based on data, conditions look favorable near the coast today. Check the SAFE or UNSAFE "
+         "status on the Home screen before leaving and always trust your judgment at sea.")
+
+
+@app.post("/v1/chat/completions")
+async def mistral_chat(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    if body.get("stream"):
+        return StreamingResponse(_mistral_stream(model), media_type="text/event-stream")
+    await delay("mistral")
+    return {
+        "id": "stub", "object": "chat.completion", "model": model, "created": int(time.time()),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 600, "completion_tokens": 40, "total_tokens": 640},
+    }
+
+
+async def _mistral_stream(model: str):
+    # Time to first token is the injected latency; tokens then trickle in
+    await delay("mistral")
+    words = REPLY.split(" ")
+    for i, word in enumerate(words):
+        chunk = {
+            "id": "stub", "object": "chat.completion.chunk", "model": model, "created": int(time.time()),
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": word if i == 0 else " " + word},
+                         "finish_reason": "stop" if i == len(words) - 1 else None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(LATENCY.get("token", 10) / 1000)
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v2/Services/{service_sid}/Verifications")
+async def twilio_verification(service_sid: str, request: Request):
+    await delay("twilio")
+    form = await request.form()
+    return {"sid": "VEstub", "service_sid": service_sid, "to": form.get("To"), "channel": "sms", "status": "pending"}
+
+
+@app.post("/v2/Services/{service_sid}/VerificationCheck")
+async def twilio_verification_check(service_sid: str, request: Request):
+    await delay("twilio")
+    form = await request.form()
+    status = "approved" if form.get("Code") == "123456" else "pending"
+    return {"sid": "VEstub", "service_sid": service_sid, "to": form.get("To"), "status": status}
+
+
+@app.get("/stub/stats")
+async def stub_stats():
+    """Upstream request counts, so a benchmark can report upstream calls per API request."""
+    return COUNTS
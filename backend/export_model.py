@@ -0,0 +1,77 @@
+"""
+Export FishModelClassifier_V5.h5 for the lighter inference backends.
+
+    python export_model.py --format tflite              # FishModelClassifier_V5.tflite
+    python export_model.py --format tflite --quantize   # FishModelClassifier_V5_int8.tflite
+    python export_model.py --format onnx --quantize     # FishModelClassifier_V5_int8.onnx
+
+--quantize applies dynamic-range quantization: weights are stored as int8
+and activations stay float, so no calibration data is needed. Serve the
+result with FISH_BACKEND=tflite|onnx and FISH_MODEL_PATH=<file>, after
+checking it with `python -m benchmarks.bench_backends`.
+
+Needs TensorFlow, plus tf2onnx and onnxruntime for ONNX. Serving needs only
+tflite-runtime or onnxruntime.
+"""
+
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+INPUT_SHAPE = (None, 224, 224, 3)
+
+
+def export_tflite(model, output: str, quantize: bool):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(output, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, output: str, quantize: bool):
+    import tensorflow as tf
+    import tf2onnx
+
+    signature = [tf.TensorSpec(INPUT_SHAPE, tf.float32, name="input")]
+    if not quantize:
+        tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=output)
+        return
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    with tempfile.TemporaryDirectory() as tmp:
+        float_output = os.path.join(tmp, "float.onnx")
+        tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=float_output)
+        quantize_dynamic(float_output, output, weight_type=QuantType.QInt8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="FishModelClassifier_V5.h5")
+    parser.add_argument("--format", choices=["tflite", "onnx"], required=True)
+    parser.add_argument("--quantize", action="store_true", help="int8 dynamic-range quantization")
+    parser.add_argument("--output", help="Output file (default: next to the model)")
+    args = parser.parse_args()
+
+    from tensorflow.keras.models import load_model
+
+    model = load_model(args.model, compile=False)
+    # Fix the input spec so exported graphs take a dynamic batch of 224x224 RGB
+    model(np.zeros((1,) + INPUT_SHAPE[1:], dtype=np.float32))
+
+    base = os.path.splitext(args.model)[0] + ("_int8" if args.quantize else "")
+    output = args.output or f"{base}.{args.format}"
+    if args.format == "tflite":
+        export_tflite(model, output, args.quantize)
+    else:
+        export_onnx(model, output, args.quantize)
+    print(f"Wrote {output} ({os.path.getsize(output) / 1e6:.1f} MB, "
+          f"from {os.path.getsize(args.model) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
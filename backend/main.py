@@ -14,45 +14,35 @@ with accurate day/night detection and clean response.
 """
 
 from fastapi import FastAPI, HTTPException, File, UploadFile
+from typing import List
 from services.fishing_alerts import IndiaFishingAlerts
+from services.safety_grid import CoastalSafetyGrid
+from services.cache import SqliteStore
+from services.responses import ResponseEncoder, dumps
 from services.authentication import AuthService
 from services.chat import ChatService
-from models.alert import AlertResponse
+from services.answer_cache import AnswerCache
+from services.admission import AdmissionController, Overloaded
+from services.local_answers import DEFAULT_INDEX_PATH, LocalAnswers
+from models.alert import AlertResponse, BatchAlertRequest, BatchAlertResponse, TimelineResponse
 from models.authentication import Phone, Otp
 from models.chat import ChatRequest
 from pydantic import BaseModel
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from services.rss_service import RssService
 import httpx
+import importlib.util
 
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from PIL import Image
-import numpy as np
-import io
-
-# Fish class names from the Kaggle notebook
-CLASS_NAMES = [
-    'Bangus', 'Big Head Carp', 'Black Spotted Barb', 'Catfish', 'Climbing Perch', 
-    'Fourfinger Threadfin', 'Freshwater Eel', 'Glass Perchlet', 'Goby', 'Gold Fish', 
-    'Gourami', 'Grass Carp', 'Green Spotted Puffer', 'Indian Carp', 'Indo-Pacific Tarpon', 
-    'Jaguar Gapote', 'Janitor Fish', 'Knifefish', 'Long-Snouted Pipefish', 'Mosquito Fish', 
-    'Mudfish', 'Mullet', 'Pangasius', 'Perch', 'Scat Fish', 'Silver Barb', 'Silver Carp',
-    'Silver Perch', 'Snakehead', 'Tenpounder', 'Tilapia'
-]
-
-# Load model
-model = load_model('FishModelClassifier_V5.h5', compile=False)
-
-def preprocess_image(image: Image.Image):
-    """Preprocess image same as training code"""
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
-    
-    image = image.resize((224, 224))
-    img_array = np.array(image) / 255.0
-    return np.expand_dims(img_array, 0)
+from services.fish_classifier import CLASS_NAMES, ClassifierBusy, get_classifier, top_predictions
+import asyncio
+
+# The inference runtime is imported and the model loaded lazily (background warmup or first
+# request), so workers that only serve alerts, news and OTP start in well under a second.
+# Requests are grouped into batched forward passes on a dedicated inference thread.
+FISH_CLASSIFIER_ENABLED = os.getenv("FISH_CLASSIFIER_ENABLED", "1") == "1"
+fish_classifier = get_classifier()
+MAX_PREDICT_BATCH_IMAGES = int(os.getenv("FISH_MAX_BATCH_IMAGES", "64"))
 
 # --- FastAPI Setup ---
 app = FastAPI(
@@ -63,9 +53,51 @@ app = FastAPI(
 
 
 alerts: IndiaFishingAlerts = None
-rss_service = RssService()
+safety_grid: CoastalSafetyGrid = None
+MAX_BATCH_POINTS = int(os.getenv("ALERT_MAX_BATCH_POINTS", "5000"))
+response_encoder = ResponseEncoder()
+rss_service: RssService = None
 auth_service = AuthService()
-chat_service = ChatService()
+
+# fallback: answer from local content only when Mistral fails, times out or is saturated;
+# first: answer matching FAQ-type questions locally without calling Mistral; off
+CHAT_LOCAL_ANSWERS = os.getenv("CHAT_LOCAL_ANSWERS", "fallback")
+
+def load_local_answers():
+    """Offline SeaBot answer index (rebuild with `python -m services.local_answers build`)."""
+    if CHAT_LOCAL_ANSWERS == "off":
+        return None
+    try:
+        return LocalAnswers.load(os.getenv("CHAT_LOCAL_INDEX", DEFAULT_INDEX_PATH))
+    except Exception as e:
+        logging.warning(f"Local SeaBot answers disabled: {e}")
+        return None
+
+chat_service = ChatService(
+    AnswerCache(
+        ttl=int(os.getenv("CHAT_CACHE_TTL", "86400")),
+        max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "5000")),
+        # e.g. paraphrase-multilingual-MiniLM-L12-v2; needs sentence-transformers
+        embedding_model=os.getenv("CHAT_CACHE_EMBEDDING_MODEL"),
+        similarity=float(os.getenv("CHAT_CACHE_SIMILARITY", "0.92")),
+    ) if os.getenv("CHAT_CACHE_ENABLED", "1") == "1" else None,
+    # Tokens per model request in session mode, system prompt included
+    session_token_budget=int(os.getenv("CHAT_SESSION_TOKEN_BUDGET", "2000")),
+    session_ttl=int(os.getenv("CHAT_SESSION_TTL", str(6 * 3600))),
+    max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "10000")),
+    # Mistral calls in flight at once (stay under the account's rate limit); the rest queue fairly
+    # per client, emergencies first, and get a 429 when the queue is full
+    admission=AdmissionController(
+        max_in_flight=int(os.getenv("CHAT_MAX_IN_FLIGHT", "8")),
+        max_queue=int(os.getenv("CHAT_MAX_QUEUE", "64")),
+        per_user_limit=int(os.getenv("CHAT_PER_CLIENT_LIMIT", "2")),
+        queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT", "10")),
+        max_priority=int(os.getenv("CHAT_MAX_PRIORITY_QUEUE", "16")),
+    ),
+    local_answers=load_local_answers(),
+    local_first=CHAT_LOCAL_ANSWERS == "first",
+    llm_timeout=float(os.getenv("CHAT_LLM_TIMEOUT", "20")),
+)
 
 
 class Otp(BaseModel):
@@ -74,78 +106,299 @@ class Otp(BaseModel):
 
 @app.on_event("startup")
 async def startup_event():
-    app.state.httpx_client = httpx.AsyncClient(timeout=8)
+    # One pooled client for every upstream; HTTP/2 multiplexing when the h2 package is installed
+    app.state.httpx_client = httpx.AsyncClient(
+        timeout=8,
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=32, keepalive_expiry=60),
+    )
+    # Optional cache file shared by all uvicorn workers on this host
+    cache_db = os.getenv("ALERT_CACHE_DB")
+    app.state.cache_store = SqliteStore(cache_db) if cache_db else None
+    # Chat sessions follow a client across workers and restarts when the store is configured
+    chat_service.sessions.store = app.state.cache_store
     global alerts
-    alerts = IndiaFishingAlerts(app.state.httpx_client)
+    alerts = IndiaFishingAlerts(
+        app.state.httpx_client,
+        grid_deg=float(os.getenv("ALERT_GRID_DEG", "0.05")),
+        cache_ttl=int(os.getenv("ALERT_CACHE_TTL", "300")),
+        cache_max_entries=int(os.getenv("ALERT_CACHE_MAX_ENTRIES", "10000")),
+        cache_max_bytes=int(os.getenv("ALERT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        batch_chunk_size=int(os.getenv("ALERT_BATCH_CHUNK_SIZE", "100")),
+        model_run_interval_h=int(os.getenv("FORECAST_MODEL_RUN_INTERVAL_H", "6")),
+        model_run_delay_h=float(os.getenv("FORECAST_MODEL_RUN_DELAY_H", "3")),
+        cache_stale_ttl=int(os.getenv("ALERT_CACHE_STALE_TTL", "1800")),
+        upstream_max_concurrency=int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16")),
+        breaker_failure_threshold=int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5")),
+        breaker_reset_timeout=float(os.getenv("UPSTREAM_BREAKER_RESET", "30")),
+        cache_store=app.state.cache_store,
+        weather_url=os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast"),
+        marine_url=os.getenv("OPEN_METEO_MARINE_URL", "https://marine-api.open-meteo.com/v1/marine"),
+    )
+    global rss_service
+    rss_service = RssService(
+        app.state.httpx_client,
+        grid_deg=float(os.getenv("RSS_GEOCODE_GRID_DEG", "0.1")),
+        geocode_ttl=int(os.getenv("RSS_GEOCODE_TTL", str(30 * 86400))),
+        geocode_max_entries=int(os.getenv("RSS_GEOCODE_MAX_ENTRIES", "50000")),
+        cache_store=app.state.cache_store,
+        nominatim_max_concurrency=int(os.getenv("NOMINATIM_MAX_CONCURRENCY", "4")),
+        breaker_failure_threshold=int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5")),
+        breaker_reset_timeout=float(os.getenv("UPSTREAM_BREAKER_RESET", "30")),
+        feed_ttl=int(os.getenv("RSS_FEED_TTL", "600")),
+        feed_stale_ttl=int(os.getenv("RSS_FEED_STALE_TTL", "86400")),
+        feed_max_entries=int(os.getenv("RSS_FEED_MAX_ENTRIES", "2000")),
+        # Feeds kept warm in the background: the N most requested places, plus any listed
+        warm_top_n=int(os.getenv("RSS_WARM_TOP_N", "20")),
+        warm_places=[p.strip() for p in os.getenv("RSS_WARM_PLACES", "").split(",") if p.strip()],
+    )
+    rss_service.start()
+    global safety_grid
+    # Opt-in: a 0.25° refresh covers ~7,700 nodes (fewer once land is masked out), i.e. two
+    # Open-Meteo location-calls per sea node every SAFETY_GRID_REFRESH_INTERVAL seconds; at the
+    # defaults that is several hundred thousand calls a day, which needs a commercial API plan
+    if os.getenv("SAFETY_GRID_ENABLED", "0") == "1":
+        safety_grid = CoastalSafetyGrid(
+            alerts,
+            resolution=float(os.getenv("SAFETY_GRID_RESOLUTION", "0.25")),
+            refresh_interval=int(os.getenv("SAFETY_GRID_REFRESH_INTERVAL", "900")),
+        )
+        safety_grid.start()
+    if FISH_CLASSIFIER_ENABLED and os.getenv("FISH_CLASSIFIER_WARMUP", "1") == "1":
+        app.state.fish_warmup = asyncio.create_task(fish_classifier.warmup())
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    # Joins the batcher and worker processes, so keep it off the event loop
+    await asyncio.to_thread(fish_classifier.close)
+    if safety_grid is not None:
+        await safety_grid.stop()
+    await rss_service.stop()
     await app.state.httpx_client.aclose()
+    if app.state.cache_store is not None:
+        # Waits for queued writes, so keep it off the event loop
+        await asyncio.to_thread(app.state.cache_store.close)
 
 @app.get("/")
 def root():
     return {"message": "Welcome to SeaGuard. Use /docs for API details."}
 
+def require_fish_classifier():
+    if not FISH_CLASSIFIER_ENABLED:
+        raise HTTPException(503, "Fish classification is not served by this deployment")
+
 @app.get("/fish-classify")
 async def fish_classify_root():
-    return {"message": "Fish Classification API", "species_count": len(CLASS_NAMES)}
+    return {"message": "Fish Classification API", "species_count": len(CLASS_NAMES),
+            "enabled": FISH_CLASSIFIER_ENABLED, **fish_classifier.status()}
+
+@app.get("/fish-classify/ready")
+async def fish_classify_ready():
+    """Readiness probe: 200 once the model is loaded, 503 while loading, failed or disabled."""
+    status = {"enabled": FISH_CLASSIFIER_ENABLED, **fish_classifier.status()}
+    return JSONResponse(status, status_code=200 if FISH_CLASSIFIER_ENABLED and fish_classifier.ready else 503)
 
 @app.post("/fish-classify/predict")
 async def predict_fish(file: UploadFile = File(...)):
     """Predict fish species from image"""
-    
+    require_fish_classifier()
     if not file.content_type.startswith('image/'):
         raise HTTPException(400, "File must be an image")
     
     try:
-        # Read and preprocess image
+        # Decode off the event loop; inference is batched on the classifier thread
         image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-        img_array = preprocess_image(image)
-        
-        # Predict
-        predictions = model.predict(img_array)
-        
-        # Get top 5 predictions
-        top_indices = np.argsort(predictions[0])[::-1][:5]
-        results = []
-        
-        for i, idx in enumerate(top_indices):
-            results.append({
-                "species": CLASS_NAMES[idx],
-                "confidence": f"{float(predictions[0][idx]) * 100:.2f}%"
-            })
-        
-        return {
-            "predicted_species": CLASS_NAMES[np.argmax(predictions[0])],
-            "top_predictions": results
-        }
-        
+        predictions = await fish_classifier.predict(image_bytes)
+        return top_predictions(predictions, k=5)
+    except ClassifierBusy as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(500, f"Prediction error: {str(e)}")
 
+@app.post("/fish-classify/predict-batch")
+async def predict_fish_batch(files: List[UploadFile] = File(...), top_k: int = 5):
+    """Predict species for many images in one upload, e.g. a whole trip's catch photos.
+
+    Images are decoded in parallel and classified as one tensor batch. Results
+    come back in upload order; an image that cannot be decoded gets an `error`
+    entry instead of failing the whole batch.
+    """
+    require_fish_classifier()
+    if len(files) > MAX_PREDICT_BATCH_IMAGES:
+        raise HTTPException(413, f"At most {MAX_PREDICT_BATCH_IMAGES} images per batch")
+    if not 1 <= top_k <= len(CLASS_NAMES):
+        raise HTTPException(400, f"top_k must be between 1 and {len(CLASS_NAMES)}")
+
+    uploads = [None] * len(files)
+    for i, file in enumerate(files):
+        if (file.content_type or "").startswith('image/'):
+            uploads[i] = await file.read()
+    candidates = [i for i, data in enumerate(uploads) if data is not None]
+    try:
+        predictions = await fish_classifier.predict_batch([uploads[i] for i in candidates])
+    except ClassifierBusy as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(500, f"Prediction error: {str(e)}")
+
+    results = [{"filename": file.filename, "error": "File must be an image"} for file in files]
+    for i, prediction in zip(candidates, predictions):
+        if isinstance(prediction, Exception):
+            results[i]["error"] = str(prediction)
+        else:
+            results[i] = {"filename": files[i].filename, **top_predictions(prediction, k=top_k)}
+    return {"results": results}
+
+@app.get("/fish-classify/stats")
+async def fish_classify_stats():
+    """Model state, micro-batching queue depth, batch size distribution and prediction cache hit rate."""
+    return fish_classifier.stats()
+
+def validate_chat_request(request: ChatRequest):
+    if request.message is None and not request.history:
+        raise HTTPException(status_code=400, detail="Send either history or message (with an optional session_id)")
+
+# Proxies (e.g. 127.0.0.1 behind ngrok or nginx) whose X-Forwarded-For is believed; from anyone
+# else the header is client-supplied and would let one client spread over many fair-queue slots
+CHAT_TRUSTED_PROXIES = {p.strip() for p in os.getenv("CHAT_TRUSTED_PROXIES", "").split(",") if p.strip()}
+
+def chat_client_id(http: Request) -> str:
+    """Who a chat request counts against for fair queueing: the originating IP."""
+    peer = http.client.host if http.client else "anonymous"
+    if peer not in CHAT_TRUSTED_PROXIES:
+        return peer
+    # Rightmost hop not added by one of our proxies; anything left of it is the client's claim
+    hops = [h.strip() for h in http.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    for hop in reversed(hops):
+        if hop not in CHAT_TRUSTED_PROXIES:
+            return hop
+    return hops[0] if hops else peer
+
+def chat_overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 @app.post("/chat")
-async def chat_with_expert(request: ChatRequest):
+async def chat_with_expert(request: ChatRequest, http: Request):
+    """SeaBot reply. Send the full `history`, or just `message` plus the `session_id` from the last reply."""
+    validate_chat_request(request)
     try:
-        return await chat_service.get_chat_response(request)
+        return await chat_service.get_chat_response(request, chat_client_id(http))
+    except Overloaded as e:
+        raise chat_overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/chat/stats")
+async def chat_stats():
+    """SeaBot answer cache hit rate, live sessions, admission queue depth and wait times, and local answers."""
+    return chat_service.stats()
+
+@app.post("/chat/stream")
+async def chat_with_expert_stream(request: ChatRequest, http: Request):
+    """SeaBot reply as Server-Sent Events, so text shows up as it is generated.
+
+    Each `data:` event carries {"delta": text}. The stream ends with a `done`
+    event carrying the full {"response": text} (plus `session_id` in session
+    mode), or an `error` event. When SeaBot is saturated the request fails
+    with 429 and Retry-After before the stream starts.
+    """
+    validate_chat_request(request)
+    stream = chat_service.stream_chat_response(request, chat_client_id(http))
+    # Wait for the first chunk before sending headers, so admission can still answer 429
+    try:
+        first = [await stream.__anext__()]
+    except StopAsyncIteration:
+        first = []
+    except Overloaded as e:
+        raise chat_overloaded(e)
+    except Exception as e:
+        first = e
+
+    async def events():
+        reply = []
+        try:
+            if isinstance(first, Exception):
+                raise first
+            for delta in first:
+                reply.append(delta)
+                yield b"data: " + dumps({"delta": delta}) + b"\n\n"
+            async for delta in stream:
+                reply.append(delta)
+                yield b"data: " + dumps({"delta": delta}) + b"\n\n"
+            done = {"response": "".join(reply)}
+            if request.session_id:
+                done["session_id"] = request.session_id
+            yield b"event: done\ndata: " + dumps(done) + b"\n\n"
+        except Exception as e:
+            logging.error(f"Error in chat stream: {e}")
+            yield b"event: error\ndata: " + dumps({"detail": str(e)}) + b"\n\n"
+        finally:
+            await stream.aclose()
+
+    # No-transform and X-Accel-Buffering keep proxies from buffering the stream
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
+
 @app.get("/fishing-alert", response_model=AlertResponse)
-async def fishing_alert(lat: float, lon: float):
-    result = await alerts.get_alerts(lat, lon)
+async def fishing_alert(request: Request, lat: float, lon: float, compact: bool = False):
+    if compact:
+        return await compact_fishing_alert(lat, lon, request.headers.get("accept-encoding", ""))
+    # Serve from the precomputed grid when it covers the point; otherwise fetch live
+    result = safety_grid.get_alerts(lat, lon) if safety_grid is not None else None
+    if result is None:
+        result = await alerts.get_alerts(lat, lon)
+    if "ERROR" in result["status"]:
+        raise HTTPException(status_code=503, detail=result["message"])
+    return result
+
+async def compact_fishing_alert(lat: float, lon: float, accept_encoding: str):
+    """Compact, compressed alert. Cache hits reuse the already encoded bytes of their cell."""
+    result = safety_grid.get_alerts(lat, lon) if safety_grid is not None else None
+    if result is not None:
+        return response_encoder.response(result, accept_encoding, transform=alerts.compact)
+    cell, result = await alerts.get_cell_alerts(lat, lon)
     if "ERROR" in result["status"]:
         raise HTTPException(status_code=503, detail=result["message"])
+    label = alerts.cell_label(cell)
+    return response_encoder.response(result, accept_encoding, key=("alert", cell),
+                                     transform=lambda r: alerts.compact(r, label))
+
+@app.post("/fishing-alert/batch", response_model=BatchAlertResponse)
+async def fishing_alert_batch(request: Request, body: BatchAlertRequest, compact: bool = False):
+    """Alerts for many points (e.g. a whole fleet) in one call, returned in input order."""
+    if len(body.points) > MAX_BATCH_POINTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_POINTS} points per batch")
+    results = await alerts.get_alerts_batch([(p.lat, p.lon) for p in body.points])
+    if compact:
+        return response_encoder.response({"results": [alerts.compact(r) for r in results]},
+                                         request.headers.get("accept-encoding", ""))
+    return {"results": results}
+
+@app.get("/fishing-alert/timeline", response_model=TimelineResponse)
+async def fishing_alert_timeline(lat: float, lon: float, hours: int = 72):
+    """Hourly safety forecast and safe departure windows for the next `hours` (max 72)."""
+    if not 1 <= hours <= 72:
+        raise HTTPException(status_code=400, detail="hours must be between 1 and 72")
+    result = await alerts.get_timeline(lat, lon, hours)
+    if "ERROR" in result.get("status", ""):
+        raise HTTPException(status_code=503, detail=result["message"])
     return result
 
+@app.get("/fishing-alert/stats")
+async def fishing_alert_stats():
+    """Cache hit rates and upstream circuit state."""
+    return alerts.stats()
+
 @app.get("/rss-feed")
-async def rss_feed(lat: float, lon: float):
+async def rss_feed(request: Request, lat: float, lon: float):
     """
     Provides a JSON feed of recent fishing and coastal news for a given location.
+    Feeds are cached per place, so their encoded bytes are reused across requests.
     """
     try:
-        news_data = await rss_service.get_news(lat, lon)
-        return JSONResponse(content=news_data)
+        place, news_data = await rss_service.get_feed(lat, lon)
+        return response_encoder.response(news_data, request.headers.get("accept-encoding", ""),
+                                         key=("rss-feed", place))
     except HTTPException as e:
         # Re-raise HTTPExceptions thrown from the service
         raise e
@@ -154,6 +407,11 @@ async def rss_feed(lat: float, lon: float):
         logging.error(f"Error in rss_feed endpoint: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred while fetching the news feed.")
 
+@app.get("/rss-feed/stats")
+async def rss_feed_stats():
+    """Geocode and feed cache hit rates, revalidations and upstream circuit state."""
+    return rss_service.stats()
+
 @app.post("/send-otp")
 async def send_otp(request: Phone):
     result = auth_service.send_otp(request.phone_number)
@@ -1,6 +1,5 @@
-
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 class AlertResponse(BaseModel):
     safe: bool
@@ -12,3 +11,19 @@ class AlertResponse(BaseModel):
     time: str
     time_of_day: str
     data: Dict[str, Any]
+
+class AlertPoint(BaseModel):
+    lat: float
+    lon: float
+
+class BatchAlertRequest(BaseModel):
+    points: List[AlertPoint]
+
+class BatchAlertResponse(BaseModel):
+    results: List[AlertResponse]
+
+class TimelineResponse(BaseModel):
+    location: str
+    time: str
+    hours: List[Dict[str, Any]]
+    windows: List[Dict[str, Any]]
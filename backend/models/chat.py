@@ -1,9 +1,12 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 
 class Message(BaseModel):
     role: str
     content: str
 
 class ChatRequest(BaseModel):
-    history: List[Message] = Field(..., description="The conversation history for memory.")
+    history: List[Message] = Field(default_factory=list, description="The conversation history for memory. Not needed with session_id/message.")
+    session_id: Optional[str] = Field(None, description="Server-side conversation to continue; a new one is started when omitted or expired.")
+    message: Optional[str] = Field(None, description="The new user message, for session mode. The reply includes the session_id to send next time.")
+    language: Optional[str] = Field(None, description="Language code of the conversation, e.g. 'ta'. Detected from the script when omitted.")
@@ -0,0 +1,164 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict
+
+
+class Overloaded(Exception):
+    """Admission refused; the client should retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"SeaBot is busy ({reason}), please retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency for calls to a rate-limited upstream, with a fair queue and backpressure.
+
+    At most `max_in_flight` calls run at once. Waiting callers queue per user
+    and are admitted round-robin across users, so one chatty client cannot
+    starve the rest; each user may have at most `per_user_limit` calls queued
+    or running. Priority callers (emergencies) go to a separate lane that is
+    always served first and is not bounded by `max_queue`; they still count
+    against `per_user_limit`, and past `max_priority` waiting emergencies
+    further ones queue like any other call. Everything else is
+    refused with `Overloaded` when the queue is full or a caller waits longer
+    than `queue_timeout`, so clients get a fast 429 instead of piling up.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queue: int = 64, per_user_limit: int = 2,
+                 queue_timeout: float = 10, max_priority: int = 16, name: str = "llm"):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+        self.queue_timeout = queue_timeout
+        self.max_priority = max_priority
+        self._in_flight = 0
+        self._per_user: Dict[str, int] = {}
+        self._priority: Deque[asyncio.Future] = deque()
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self._service_time = 2.0  # Moving average of seconds per call, for Retry-After
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"user_limit": 0, "queue_full": 0, "timeout": 0}
+
+    @asynccontextmanager
+    async def slot(self, user: str, priority: bool = False):
+        """Hold one in-flight slot for the duration of the block."""
+        await self.acquire(user, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - started)
+            self.release(user)
+
+    async def acquire(self, user: str, priority: bool = False):
+        if self._per_user.get(user, 0) >= self.per_user_limit:
+            self._reject("user_limit")
+        priority = priority and len(self._priority) < self.max_priority
+        immediate = self._in_flight < self.max_in_flight and (priority or not self._queued)
+        if not immediate and not priority and self._queued >= self.max_queue:
+            self._reject("queue_full")
+        self._per_user[user] = self._per_user.get(user, 0) + 1
+        if immediate:
+            self._admit()
+            self._waits.append(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        if priority:
+            self._priority.append(future)
+        else:
+            self._queues.setdefault(user, deque()).append(future)
+        self._queued += 1
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), None if priority else self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Admitted in the same tick as the timeout: the slot is ours, so keep it
+            if not future.done() or future.cancelled():
+                self._forget(user, future)
+                self._reject("timeout")
+        except BaseException:
+            # Cancelled while queued, or admitted just as the caller went away
+            if future.done() and not future.cancelled():
+                self.release(user)
+            else:
+                self._forget(user, future)
+            raise
+        self._waits.append(time.monotonic() - queued_at)
+
+    def release(self, user: str):
+        self._in_flight -= 1
+        self._per_user[user] -= 1
+        if not self._per_user[user]:
+            del self._per_user[user]
+        self._dispatch()
+
+    def retry_after(self) -> int:
+        """Seconds until a newly queued call would likely be admitted."""
+        backlog = self._queued / max(1, self.max_in_flight)
+        return max(1, math.ceil((backlog + 1) * self._service_time))
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))] * 1000, 1) if waits else 0
+
+        return {
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "queued_priority": len(self._priority),
+            "users_waiting": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_p50_ms": pct(50),
+            "wait_p95_ms": pct(95),
+            "mean_call_s": round(self._service_time, 2),
+        }
+
+    def _admit(self):
+        self._in_flight += 1
+        self.admitted += 1
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        raise Overloaded(reason.replace("_", " "), self.retry_after())
+
+    def _forget(self, user: str, future: asyncio.Future):
+        """Take a waiter that gave up out of the queue, and give back its per-user count."""
+        queue = self._priority if future in self._priority else self._queues.get(user)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._queued -= 1
+            if queue is not self._priority and not queue:
+                del self._queues[user]
+        future.cancel()
+        self._per_user[user] -= 1
+        if not self._per_user[user]:
+            del self._per_user[user]
+
+    def _dispatch(self):
+        while self._in_flight < self.max_in_flight and self._queued:
+            if self._priority:
+                future = self._priority.popleft()
+            else:
+                # Round-robin: serve the user at the head, then move them to the back
+                user, queue = next(iter(self._queues.items()))
+                future = queue.popleft()
+                if queue:
+                    self._queues.move_to_end(user)
+                else:
+                    del self._queues[user]
+            self._queued -= 1
+            if future.done():
+                continue
+            self._admit()
+            future.set_result(None)
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.cache import GridCache
+from services.distress import is_distress
+
+# First character of a script -> language. Latin text falls back to "latin"
+# unless the client says which language it is.
+_SCRIPTS = [
+    (0x0900, 0x097F, "hi"),  # Devanagari (Hindi, Marathi, Konkani)
+    (0x0980, 0x09FF, "bn"),  # Bengali, Assamese
+    (0x0A00, 0x0A7F, "pa"),  # Gurmukhi
+    (0x0A80, 0x0AFF, "gu"),
+    (0x0B00, 0x0B7F, "or"),
+    (0x0B80, 0x0BFF, "ta"),
+    (0x0C00, 0x0C7F, "te"),
+    (0x0C80, 0x0CFF, "kn"),
+    (0x0D00, 0x0D7F, "ml"),
+    (0x0600, 0x06FF, "ur"),  # Arabic script (Urdu, Sindhi)
+]
+
+# Questions about current or upcoming conditions must go to the model every time
+LIVE_PATTERNS = [
+    r"\b(today|tonight|tomorrow|now|right now|currently|current conditions|this (morning|evening|week))\b",
+    r"\b(weather|forecast|wind|waves?|swell|rain|storm|cyclone|tide|safe to (go|fish|sail))\b",
+    r"\b(aujourd'hui|maintenant|demain|météo|hoy|ahora|mañana|clima)\b",
+    "आज|अभी|कल|मौसम|तूफान|हवा",  # Hindi / Marathi
+    "இன்று|இப்போது|நாளை|வானிலை|புயல்",  # Tamil
+    "ఈరోజు|ఇప్పుడు|రేపు|వాతావరణం|తుఫాను",  # Telugu
+    "ഇന്ന്|ഇപ്പോൾ|നാളെ|കാലാവസ്ഥ|കൊടുങ്കാറ്റ്",  # Malayalam
+    "আজ|এখন|আগামীকাল|আবহাওয়া|ঝড়",  # Bengali
+    "ಇಂದು|ಈಗ|ನಾಳೆ|ಹವಾಮಾನ",  # Kannada
+    "આજે|હમણાં|કાલે|હવામાન",  # Gujarati
+    "ଆଜି|ଏବେ|ପାଣିପାଗ",  # Odia
+]
+_LIVE = re.compile("|".join(f"(?:{p})" for p in LIVE_PATTERNS), re.IGNORECASE)
+
+
+def normalize(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(" " if unicodedata.category(c)[0] in "PSZC" else c for c in text)
+    return " ".join(text.split())
+
+
+def detect_language(text: str) -> str:
+    for c in text:
+        code = ord(c)
+        for start, end, language in _SCRIPTS:
+            if start <= code <= end:
+                return language
+    return "latin"
+
+
+def is_live_question(text: str) -> bool:
+    return _LIVE.search(text) is not None
+
+
+class AnswerCache:
+    """Caches SeaBot answers to stand-alone questions, keyed on normalized text plus language.
+
+    Entries live in a `GridCache` (TTL, LRU and size bound, optional shared
+    store), which also coalesces identical questions asked at the same time
+    into one model call. With `embedding_model` set and sentence-transformers
+    installed, a miss is retried against stored questions in the same
+    language by cosine similarity, catching rephrasings.
+
+    Only first questions are cached: a question asked mid-conversation can
+    depend on earlier turns. Questions about live conditions and distress
+    messages are never cached.
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 5000, embedding_model: Optional[str] = None,
+                 similarity: float = 0.92, store=None):
+        self.similarity = similarity
+        self._cache = GridCache(ttl=ttl, max_entries=max_entries, max_bytes=32 * 1024 * 1024,
+                                store=store, namespace="chat-answers")
+        self._encoder = None
+        if embedding_model:
+            try:
+                from sentence_transformers import SentenceTransformer
+                self._encoder = SentenceTransformer(embedding_model)
+            except Exception as e:  # Optional: exact matching only without it
+                logging.warning(f"Answer cache embeddings disabled: {e}")
+        # language -> (keys, unit embeddings), rows in insertion order
+        self._index: Dict[str, Tuple[List[Tuple[str, str]], Optional[np.ndarray]]] = {}
+        self.max_entries = max_entries
+        self.lookups = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.skipped = 0
+
+    def key_for(self, history: List[Any], language: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """(language, normalized question) for a cacheable request, else None."""
+        user_turns = [m for m in history if m.role == "user"]
+        if (len(user_turns) != 1 or len(history) != 1 or is_live_question(user_turns[0].content)
+                or is_distress(user_turns[0].content)):
+            self.skipped += 1
+            return None
+        text = normalize(user_turns[0].content)
+        if not text:
+            self.skipped += 1
+            return None
+        return ((language or detect_language(text)).lower(), text)
+
+    async def lookup(self, key: Tuple[str, str]) -> Optional[str]:
+        """Cached answer for an exact or (with embeddings) similar question."""
+        self.lookups += 1
+        answer = self._cache.get(key)
+        if answer is not None:
+            self.hits += 1
+            return answer
+        return await self._similar_answer(key)
+
+    async def get_or_answer(self, key: Tuple[str, str], answer: Callable[[], Awaitable[str]]) -> str:
+        """Cached answer, or `answer()` run once for every caller asking the same question meanwhile."""
+        cached = await self.lookup(key)
+        if cached is not None:
+            return cached
+        result = await self._cache.get_or_load(key, answer)
+        await self._index_key(key)
+        return result
+
+    async def put(self, key: Tuple[str, str], answer: str):
+        self._cache.put(key, answer)
+        await self._index_key(key)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        return {
+            "entries": stats["entries"],
+            "bytes": stats["bytes"],
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "coalesced": stats["coalesced"],
+            "skipped": self.skipped,
+            "hit_rate": round((self.hits + self.similar_hits) / self.lookups, 4) if self.lookups else 0,
+            "embeddings": self._encoder is not None,
+        }
+
+    async def _similar_answer(self, key: Tuple[str, str]) -> Optional[str]:
+        if self._encoder is None:
+            return None
+        similar = await self._nearest(key)
+        answer = self._cache.get(similar) if similar is not None else None
+        if answer is not None:
+            self.similar_hits += 1
+            # Alias the rephrasing so it hits exactly next time
+            self._cache.put(key, answer)
+        return answer
+
+    async def _embed(self, text: str) -> np.ndarray:
+        vector = await asyncio.to_thread(self._encoder.encode, [text], normalize_embeddings=True)
+        return np.asarray(vector, dtype=np.float32)
+
+    async def _nearest(self, key: Tuple[str, str]) -> Optional[Tuple[str, str]]:
+        keys, vectors = self._index.get(key[0], ([], None))
+        if vectors is None or not keys:
+            return None
+        scores = vectors @ (await self._embed(key[1]))[0]
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.similarity else None
+
+    async def _index_key(self, key: Tuple[str, str]):
+        if self._encoder is None:
+            return
+        keys, vectors = self._index.get(key[0], ([], None))
+        if key in keys:
+            return
+        vector = await self._embed(key[1])
+        keys = keys + [key]
+        vectors = vector if vectors is None else np.vstack([vectors, vector])
+        # Drop the oldest rows once the index outgrows the cache it points into
+        if len(keys) > self.max_entries:
+            keys, vectors = keys[-self.max_entries:], vectors[-self.max_entries:]
+        self._index[key[0]] = (keys, vectors)
@@ -17,6 +17,10 @@ class AuthService:
 
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
         self.twilio_client = TwilioClient(self.twilio_account_sid, self.twilio_auth_token)
+        # Optional override of the Verify API host, e.g. a local stand-in for benchmarks
+        twilio_verify_url = os.environ.get("TWILIO_VERIFY_URL")
+        if twilio_verify_url:
+            self.twilio_client.verify.base_url = twilio_verify_url
 
     def send_otp(self, phone_number: str):
         try:
@@ -0,0 +1,394 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+
+class Uncacheable(Exception):
+    """Raised by a loader to hand back a degraded value that must not be cached.
+
+    If a stale entry exists for the key it is served instead of the degraded value.
+    """
+
+    def __init__(self, value: Any):
+        super().__init__("Degraded value")
+        self.value = value
+
+
+class SqliteStore:
+    """TTL key/value store in a SQLite file, shared by every worker process on a host.
+
+    Used as a second level under `GridCache` so workers share upstream payloads
+    and the cache survives restarts. WAL mode lets readers proceed while one
+    process writes; all errors are logged and treated as misses, since the
+    store is only ever a cache.
+
+    The event loop never touches the file: `get_many` reads in a worker thread
+    (one connection per thread) and `set` queues the write for a single writer
+    thread and returns at once, which also runs `purge` every `purge_every` writes.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200000, timeout: float = 0.5, purge_every: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        # Only ever used on the writer thread once the table exists
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+            " fresh_until REAL NOT NULL, stale_until REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA mmap_size=268435456")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float, float]]:
+        """(value, fresh_until, stale_until) with wall-clock times, or None if absent or expired. Blocking."""
+        return self._get_many(namespace, [key]).get(key)
+
+    async def get_many(self, namespace: str, keys: List[str]) -> Dict[str, Tuple[bytes, float, float]]:
+        """`get` for several keys in one worker-thread round trip; absent keys are left out."""
+        return await asyncio.to_thread(self._get_many, namespace, keys)
+
+    def _get_many(self, namespace: str, keys: List[str]) -> Dict[str, Tuple[bytes, float, float]]:
+        rows: Dict[str, Tuple[bytes, float, float]] = {}
+        try:
+            conn, now = self._reader(), time.time()
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                for key, value, fresh_until, stale_until in conn.execute(
+                    "SELECT key, value, fresh_until, stale_until FROM cache "
+                    f"WHERE namespace = ? AND key IN ({','.join('?' * len(chunk))}) AND stale_until > ?",
+                    (namespace, *chunk, now),
+                ):
+                    rows[key] = (value, fresh_until, stale_until)
+        except sqlite3.Error as e:
+            logging.warning(f"Cache store read failed: {e}")
+        return rows
+
+    def set(self, namespace: str, key: str, value: bytes, fresh_until: float, stale_until: float):
+        """Queue a write for the writer thread; returns immediately."""
+        try:
+            self._writer.submit(self._set, namespace, key, value, fresh_until, stale_until)
+        except RuntimeError:
+            pass  # Closed: shutting down, the write is only a cache fill
+
+    def _set(self, namespace: str, key: str, value: bytes, fresh_until: float, stale_until: float):
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, fresh_until, stale_until) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, fresh_until, stale_until),
+            )
+        except sqlite3.Error as e:
+            logging.warning(f"Cache store write failed: {e}")
+            return
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge()
+
+    async def flush(self):
+        """Wait until every write queued so far is on disk."""
+        await asyncio.wrap_future(self._writer.submit(lambda: None))
+
+    def purge(self):
+        """Drop expired rows, then the soonest-expiring ones beyond `max_entries`. Runs on the writer thread."""
+        try:
+            self._conn.execute("DELETE FROM cache WHERE stale_until <= ?", (time.time(),))
+            self._conn.execute(
+                "DELETE FROM cache WHERE (namespace, key) IN "
+                "(SELECT namespace, key FROM cache ORDER BY stale_until DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        except sqlite3.Error as e:
+            logging.warning(f"Cache store purge failed: {e}")
+
+    def close(self):
+        """Finish queued writes, then close every connection."""
+        self._writer.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+class GridCache:
+    """Bounded LRU + TTL cache keyed on lat/lon grid cells.
+
+    Coordinates are snapped to a grid of `grid_deg` degrees so nearby GPS fixes
+    share one entry. Concurrent loads of the same key are coalesced into a
+    single upstream fetch (single-flight). `ttl` may be a callable returning
+    seconds, for entries that expire at a wall-clock boundary.
+
+    Entries past their TTL are kept for another `stale_ttl` seconds and served
+    immediately while a background reload runs (stale-while-revalidate).
+
+    With a `store`, entries are written behind to it under `namespace` and
+    misses in `get_or_load`/`get_or_load_many` are filled from it, keeping the
+    same TTL windows; `get` and `peek` only look in memory.
+    """
+
+    def __init__(self, grid_deg: float = 0.05, ttl: Union[float, Callable[[], float]] = 300,
+                 max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, stale_ttl: float = 0,
+                 store: Optional[SqliteStore] = None, namespace: str = ""):
+        self.grid_deg = grid_deg
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (fresh_until, stale_until, size, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, float, int, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.store_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Snap a coordinate to its grid cell index."""
+        return (round(lat / self.grid_deg), round(lon / self.grid_deg))
+
+    def center(self, cell: Tuple[int, int]) -> Tuple[float, float]:
+        """Coordinate of the grid cell's center, rounded to avoid float noise in URLs."""
+        return (round(cell[0] * self.grid_deg, 6), round(cell[1] * self.grid_deg, 6))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Fresh value for `key` in memory, or None."""
+        value, fresh = self._lookup(key)
+        if fresh:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Value for `key` even if stale, e.g. to revalidate it; not counted as a hit or miss."""
+        return self._lookup(key)[0]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None):
+        raw = None
+        if size is None or self.store is not None:
+            raw = self._encode(value)
+            size = len(raw) if raw is not None else 1024
+        ttl = self.ttl() if callable(self.ttl) else self.ttl
+        now = time.monotonic()
+        self._insert(key, value, size, now + ttl, now + ttl + self.stale_ttl)
+        if self.store is not None and raw is not None:
+            wall = time.time()
+            self.store.set(self.namespace, self._store_key(key), raw, wall + ttl, wall + ttl + self.stale_ttl)
+
+    def _insert(self, key: Hashable, value: Any, size: int, fresh_until: float, stale_until: float):
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (fresh_until, stale_until, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for `key`, or run `loader` once for all concurrent callers.
+
+        Values are only cached when the loader returns normally; exceptions are
+        propagated to every waiting caller. Stale values are returned at once
+        and refreshed in the background.
+        """
+        value, fresh = (await self._lookup_many([key]))[key]
+        if fresh:
+            self.hits += 1
+            return value
+        if value is not None:
+            self.stale_hits += 1
+            self._start_load(key, loader)
+            return value
+
+        self.misses += 1
+        task = self._start_load(key, loader)
+        try:
+            # Shield so a disconnecting client does not cancel the fetch for everyone else
+            value = await asyncio.shield(task)
+        except Uncacheable as e:
+            return e.value
+        # Batch loads resolve their per-key futures with the Uncacheable wrapper itself
+        return value.value if isinstance(value, Uncacheable) else value
+
+    async def get_or_load_many(self, keys: Iterable[Hashable],
+                               loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+                               ) -> Dict[Hashable, Any]:
+        """Batch variant of `get_or_load`.
+
+        `loader` is called once with every key that is missing or stale and not
+        already being loaded, and must return a `{key: value}` dict whose values
+        may be `Uncacheable`. Keys it fails to produce map to an exception
+        instance in the returned dict instead of raising.
+        """
+        values: Dict[Hashable, Any] = {}
+        waiting: Dict[Hashable, Optional[asyncio.Future]] = {}
+        to_load: List[Hashable] = []
+        found = await self._lookup_many(list(dict.fromkeys(keys)))
+        for key, (value, fresh) in found.items():
+            if value is not None:
+                values[key] = value
+                if fresh:
+                    self.hits += 1
+                    continue
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+            if key in self._inflight:
+                self.coalesced += 1
+                if value is None:
+                    waiting[key] = self._inflight[key]
+            else:
+                to_load.append(key)
+                if value is None:
+                    waiting[key] = None
+
+        if to_load:
+            loop = asyncio.get_running_loop()
+            for key in to_load:
+                self._inflight[key] = loop.create_future()
+                if key in waiting:
+                    waiting[key] = self._inflight[key]
+            batch = asyncio.ensure_future(loader(to_load))
+            batch.add_done_callback(lambda t: self._settle_many(to_load, t))
+
+        if waiting:
+            settled = await asyncio.shield(asyncio.gather(*waiting.values(), return_exceptions=True))
+            for key, value in zip(waiting, settled):
+                values[key] = value.value if isinstance(value, Uncacheable) else value
+        return values
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+    def _lookup(self, key: Hashable) -> Tuple[Optional[Any], bool]:
+        """(value, is_fresh) for `key` in memory; value is None when absent or past its stale window."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        fresh_until, stale_until, _, value = entry
+        now = time.monotonic()
+        if now >= stale_until:
+            self._drop(key)
+            return None, False
+        self._entries.move_to_end(key)
+        return value, now < fresh_until
+
+    async def _lookup_many(self, keys: List[Hashable]) -> Dict[Hashable, Tuple[Optional[Any], bool]]:
+        """`_lookup` for each key, filling memory misses from the shared store in one read."""
+        found = {key: self._lookup(key) for key in keys}
+        missing = {self._store_key(key): key for key, (value, _) in found.items() if value is None}
+        if missing and self.store is not None:
+            rows = await self.store.get_many(self.namespace, list(missing))
+            for store_key, row in rows.items():
+                found[missing[store_key]] = self._fill_from_store(missing[store_key], row)
+        return found
+
+    def _fill_from_store(self, key: Hashable, row: Tuple[bytes, float, float]) -> Tuple[Optional[Any], bool]:
+        """Fill a memory miss from the shared store, e.g. an entry another worker fetched."""
+        if key in self._entries:
+            return self._lookup(key)  # Loaded here while the store was being read
+        raw, fresh_until, stale_until = row
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return None, False
+        self.store_hits += 1
+        # Store times are wall-clock so they mean the same thing in every process
+        offset = time.monotonic() - time.time()
+        self._insert(key, value, len(raw), fresh_until + offset, stale_until + offset)
+        return value, time.time() < fresh_until
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._settle(key, t))
+        else:
+            self.coalesced += 1
+        return task
+
+    def _settle(self, key: Hashable, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+    def _settle_many(self, keys: List[Hashable], task: asyncio.Future):
+        if task.cancelled():
+            error, results = RuntimeError("Batch load cancelled"), {}
+        else:
+            error, results = task.exception(), {}
+            if error is None:
+                results = task.result()
+                error = KeyError("No data returned for cell")
+        for key in keys:
+            future = self._inflight.pop(key, None)
+            if future is None or future.done():
+                continue
+            if key not in results:
+                future.set_exception(error)
+                future.exception()  # Mark retrieved; waiters still see it via await
+                continue
+            if not isinstance(results[key], Uncacheable):
+                self.put(key, results[key])
+            future.set_result(results[key])
+
+    def _drop(self, key: Hashable):
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    @staticmethod
+    def _store_key(key: Hashable) -> str:
+        return json.dumps(key)
+
+    @staticmethod
+    def _encode(value: Any) -> Optional[bytes]:
+        try:
+            return json.dumps(value, default=str).encode()
+        except (TypeError, ValueError):
+            return None
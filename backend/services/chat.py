@@ -1,20 +1,23 @@
+import asyncio
+import logging
 import os
+from contextlib import nullcontext
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from mistralai import Mistral
 from mistralai.models import SystemMessage, UserMessage, AssistantMessage
 from dotenv import load_dotenv
-from models.chat import ChatRequest
+from models.chat import ChatRequest, Message
+from services.admission import AdmissionController
+from services.answer_cache import AnswerCache
+from services.chat_sessions import ChatSession, ChatSessionStore, estimate_tokens
+from services.distress import is_distress
+from services.local_answers import LocalAnswers
 
 load_dotenv()
 
-class ChatService:
-    def __init__(self):
-        self.api_key = os.getenv("MISTRAL_API_KEY")
-        if not self.api_key:
-            raise ValueError("MISTRAL_API_KEY not set in environment.")
-        self.client = Mistral(api_key=self.api_key)
+MODEL = "mistral-saba-latest"
 
-    async def get_chat_response(self, request: ChatRequest):
-        system_prompt = """You are SeaBot, the AI assistant for the SeaGuard application. 
+SYSTEM_PROMPT = """You are SeaBot, the AI assistant for the SeaGuard application. 
 You are a seasoned, reliable, and friendly maritime expert. 
 Your mission is to keep fishermen in India safe, compliant, and efficient by providing clear, accurate, and actionable guidance in simple language.
 
@@ -53,23 +56,251 @@ Strictly follow these guidelines in every response.
 Reply in the language of the user's query. 
 """
 
+# Built once and sent byte-identical at the head of every request, so the
+# provider's prompt prefix cache applies; per-session context goes after it
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+SUMMARY_PROMPT = """Summarize this conversation between a fisherman and SeaBot in under 80 words.
+Keep facts that matter for later questions: location, boat and gear, target species, problems raised and advice given.
+Write in the language of the conversation. Plain text only."""
+
+class ChatService:
+    def __init__(self, answer_cache: Optional[AnswerCache] = None, session_token_budget: int = 1500,
+                 session_ttl: float = 6 * 3600, max_sessions: int = 10000,
+                 admission: Optional[AdmissionController] = None, local_answers: Optional[LocalAnswers] = None,
+                 local_first: bool = False, llm_timeout: Optional[float] = None):
+        self.api_key = os.getenv("MISTRAL_API_KEY")
+        if not self.api_key:
+            raise ValueError("MISTRAL_API_KEY not set in environment.")
+        # MISTRAL_SERVER_URL points the SDK at a proxy or local stand-in (e.g. for benchmarks)
+        self.client = Mistral(api_key=self.api_key, server_url=os.getenv("MISTRAL_SERVER_URL"))
+        self.answer_cache = answer_cache
+        # Bounds concurrent Mistral calls; raises services.admission.Overloaded when saturated
+        self.admission = admission
+        # Offline answers from the app's own content: used when Mistral fails, is too slow
+        # (`llm_timeout` seconds) or is saturated, or before calling it with `local_first`
+        self.local_answers = local_answers
+        self.local_first = local_first
+        self.llm_timeout = llm_timeout
+        self.local_served = {"first": 0, "fallback": 0}
+        self.sessions = ChatSessionStore(self._summarize, token_budget=session_token_budget,
+                                         max_sessions=max_sessions, ttl=session_ttl)
 
+    @staticmethod
+    def _to_message(role: str, content: str):
+        return UserMessage(content=content) if role == 'user' else AssistantMessage(content=content)
 
-        messages = [SystemMessage(content=system_prompt)]
+    def build_messages(self, request: ChatRequest):
+        messages = [SYSTEM_MESSAGE]
         for msg in request.history:
-            if msg.role == 'user':
-                messages.append(UserMessage(content=msg.content))
-            elif msg.role == 'assistant':
-                messages.append(AssistantMessage(content=msg.content))
+            if msg.role in ('user', 'assistant'):
+                messages.append(self._to_message(msg.role, msg.content))
+        return messages
+
+    async def _start_session_turn(self, session: ChatSession,
+                                  request: ChatRequest) -> Tuple[list, Optional[Tuple[str, str]]]:
+        """Record the new user message; (model messages, answer cache key). Call under session.lock."""
+        await self.sessions.refresh(session)
+        first = not session.messages and not session.summary and not session.pending_summary
+        self.sessions.append(session, "user", request.message)
+        summary, recent = self.sessions.context(session, SYSTEM_PROMPT_TOKENS)
+        messages = [SYSTEM_MESSAGE]
+        if summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation: {summary}"))
+        messages += [self._to_message(m["role"], m["content"]) for m in recent]
+        key = None
+        if first and self.answer_cache:
+            key = self.answer_cache.key_for([Message(role="user", content=request.message)], request.language)
+        return messages, key
+
+    def _cache_key(self, request: ChatRequest) -> Optional[Tuple[str, str]]:
+        return self.answer_cache.key_for(request.history, request.language) if self.answer_cache else None
+
+    @staticmethod
+    def _question(request: ChatRequest) -> str:
+        """The message being answered."""
+        if request.message is not None:
+            return request.message
+        user_turns = [m for m in request.history if m.role == 'user']
+        return user_turns[-1].content if user_turns else ""
+
+    def _is_emergency(self, request: ChatRequest) -> bool:
+        return is_distress(self._question(request))
+
+    def _local_answer(self, request: ChatRequest) -> Optional[str]:
+        return self.local_answers.answer(self._question(request), request.language) if self.local_answers else None
+
+    def _slot(self, client_id: str, priority: bool):
+        return self.admission.slot(client_id, priority) if self.admission else nullcontext()
+
+    async def get_chat_response(self, request: ChatRequest, client_id: str = "anonymous"):
+        slot = lambda: self._slot(client_id, self._is_emergency(request))
+        if request.message is None:
+            # Stateless: the client sends the whole history
+            messages, key = self.build_messages(request), self._cache_key(request)
+            return {"response": await self._answer(request, messages, key, slot)}
+
+        session = await self.sessions.get_or_create(request.session_id)
+        request.session_id = session.id
+        async with session.lock:
+            messages, key = await self._start_session_turn(session, request)
+            try:
+                reply = await self._answer(request, messages, key, slot)
+            except BaseException:
+                # Failed, or the client went away: drop the unanswered message so a retry does not duplicate it
+                self.sessions.drop_unanswered(session)
+                raise
+            self.sessions.append(session, "assistant", reply)
+        return {"response": reply, "session_id": session.id}
+
+    async def _answer(self, request: ChatRequest, messages, key: Optional[Tuple[str, str]], slot=nullcontext) -> str:
+        local = self._local_answer(request)
+        if local is not None and self.local_first:
+            self.local_served["first"] += 1
+            return local
+        try:
+            # Common stand-alone questions are answered from the cache, one model call per question
+            if key is not None:
+                return await self.answer_cache.get_or_answer(key, lambda: self._complete(messages, slot))
+            return await self._complete(messages, slot)
+        except Exception as e:
+            if local is None:
+                raise
+            logging.warning(f"SeaBot answered from local content after model error: {e!r}")
+            self.local_served["fallback"] += 1
+            return local
+
+    async def _complete(self, messages, slot=nullcontext) -> str:
+        # Admission happens here, after the cache, so cached answers never queue
+        async with slot():
+            return await asyncio.wait_for(self._call(messages), self.llm_timeout)
 
+    async def _call(self, messages) -> str:
         try:
             chat_response = await self.client.chat.complete_async(
-                model="mistral-saba-latest",
+                model=MODEL,
                 messages=messages,
             )
             
-            return {"response": chat_response.choices[0].message.content}
+            return chat_response.choices[0].message.content
 
         except Exception as e:
-            print(f"Error: {str(e)}")
+            logging.warning(f"Mistral call failed: {e!r}")
+            raise
+
+    async def _summarize(self, previous: str, turns: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+        if previous:
+            transcript = f"Earlier summary: {previous}\n{transcript}"
+        return await self._complete([SystemMessage(content=SUMMARY_PROMPT), UserMessage(content=transcript)],
+                                    lambda: self._slot("summarizer", False))
+
+    async def stream_chat_response(self, request: ChatRequest, client_id: str = "anonymous") -> AsyncIterator[str]:
+        """Yield the reply in text chunks as Mistral generates them. Cached answers come as one chunk.
+
+        In session mode `request.session_id` is set to the (possibly new) session's id.
+        """
+        session = None
+        if request.message is None:
+            messages, key = self.build_messages(request), self._cache_key(request)
+        else:
+            session = await self.sessions.get_or_create(request.session_id)
+            request.session_id = session.id
+            await session.lock.acquire()
+        try:
+            if session is not None:
+                messages, key = await self._start_session_turn(session, request)
+            local = self._local_answer(request)
+            if local is not None and self.local_first:
+                self.local_served["first"] += 1
+                reply = local
+            else:
+                reply = await self.answer_cache.lookup(key) if key is not None else None
+            if reply is not None:
+                yield reply
+            else:
+                parts = []
+                try:
+                    async for delta in self._stream_in_slot(messages, client_id, self._is_emergency(request)):
+                        parts.append(delta)
+                        yield delta
+                except Exception as e:
+                    # Only before the first chunk: a local answer cannot continue a partial reply
+                    if parts or local is None:
+                        raise
+                    logging.warning(f"SeaBot answered from local content after model error: {e!r}")
+                    self.local_served["fallback"] += 1
+                    parts.append(local)
+                    key = None  # Not a model answer; keep it out of the answer cache
+                    yield local
+                reply = "".join(parts)
+                if key is not None and reply:
+                    await self.answer_cache.put(key, reply)
+            if session is not None:
+                self.sessions.append(session, "assistant", reply)
+        except BaseException:
+            # Failed, or the client disconnected mid-stream (GeneratorExit): the turn has no answer
+            if session is not None:
+                self.sessions.drop_unanswered(session)
             raise
+        finally:
+            if session is not None:
+                session.lock.release()
+
+    async def _stream_in_slot(self, messages, client_id: str, priority: bool) -> AsyncIterator[str]:
+        """`_stream`, holding the admission slot only while Mistral generates.
+
+        A task reads the model's stream into a queue inside the slot, so a client
+        that reads slowly does not keep the slot after generation has finished.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async with self._slot(client_id, priority):
+                    async for delta in self._stream(messages):
+                        queue.put_nowait(delta)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(None)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()  # The client went away: stop generating and free the slot
+
+    async def _stream(self, messages) -> AsyncIterator[str]:
+        try:
+            stream = await asyncio.wait_for(self.client.chat.stream_async(
+                model=MODEL,
+                messages=messages,
+            ), self.llm_timeout)
+            # `llm_timeout` also bounds each wait for the next chunk, so a stalled stream gives up its slot
+            events = stream.__aiter__()
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), self.llm_timeout)
+                except StopAsyncIteration:
+                    break
+                delta = event.data.choices[0].delta.content if event.data.choices else None
+                if delta:
+                    yield delta
+        except Exception as e:
+            logging.warning(f"Mistral stream failed: {e!r}")
+            raise
+
+    def stats(self) -> Dict[str, object]:
+        return {"answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+                "sessions": self.sessions.stats(),
+                "admission": self.admission.stats() if self.admission else None,
+                "local_answers": {**self.local_answers.stats(), "served": dict(self.local_served)}
+                if self.local_answers else None}
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 UTF-8 bytes per token holds for English and Indic scripts alike."""
+    return max(1, len(text.encode("utf-8")) // 4)
+
+
+class ChatSession:
+    def __init__(self, session_id: str, messages: Optional[List[Dict[str, str]]] = None, summary: str = ""):
+        self.id = session_id
+        self.messages = messages or []  # [{"role", "content"}], oldest first
+        self.summary = summary
+        self.pending_summary: List[Dict[str, str]] = []  # Turns evicted from the window, not yet summarized
+        self.lock = asyncio.Lock()  # Serializes turns
+        self._summary_lock = asyncio.Lock()
+        self.touched = time.monotonic()
+        self.version = 0  # Bumped on every save, so workers can tell whose copy is newer
+
+    def to_json(self) -> bytes:
+        return json.dumps({"messages": self.messages, "summary": self.summary,
+                           "pending": self.pending_summary, "version": self.version}).encode()
+
+    @classmethod
+    def from_json(cls, session_id: str, raw: bytes) -> "ChatSession":
+        data = json.loads(raw)
+        session = cls(session_id, data["messages"], data["summary"])
+        session.pending_summary = data.get("pending", [])
+        session.version = data.get("version", 0)
+        return session
+
+
+class ChatSessionStore:
+    """Server-side SeaBot conversations, so clients send only a session id and the new message.
+
+    The context sent to the model is bounded by `token_budget`: the most recent
+    turns that fit (a rolling window) plus a short summary of everything older.
+    Turns leaving the window are folded into the summary by `summarize` in the
+    background once `summary_batch_tokens` of them have piled up, so no request
+    waits for it and long chats cost one summary call per few turns. Sessions expire after `ttl`
+    seconds of inactivity and the least recently used are dropped beyond
+    `max_sessions`. With a `store` (SqliteStore) sessions survive restarts and
+    follow a client across workers: each turn starts from the stored copy when
+    another worker has saved a newer one (see `refresh`).
+    """
+
+    def __init__(self, summarize: Callable[[str, List[Dict[str, str]]], Awaitable[str]], token_budget: int = 1500,
+                 max_sessions: int = 10000, ttl: float = 6 * 3600, store=None, summary_batch_tokens: int = 200):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.summary_batch_tokens = summary_batch_tokens
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.store = store
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._tasks: set = set()
+        self.created = 0
+        self.expired = 0
+        self.reloaded = 0
+        self.summaries = 0
+
+    async def get_or_create(self, session_id: Optional[str]) -> ChatSession:
+        """The live session for `session_id`, or a new one (with a fresh id) if unknown or expired."""
+        session = self._sessions.get(session_id) if session_id else None
+        now = time.monotonic()
+        if session is not None and now - session.touched > self.ttl:
+            del self._sessions[session_id]
+            self.expired += 1
+            session = None
+        if session is None and session_id and self.store is not None:
+            row = (await self.store.get_many("chat-session", [session_id])).get(session_id)
+            if row is not None:
+                session = self._sessions.get(session_id) or ChatSession.from_json(session_id, row[0])
+        if session is None:
+            session = ChatSession(secrets.token_urlsafe(16))
+            self.created += 1
+        session.touched = now
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    async def refresh(self, session: ChatSession):
+        """Pick up turns another worker saved since this one last saw the session. Call under session.lock."""
+        if self.store is None:
+            return
+        row = (await self.store.get_many("chat-session", [session.id])).get(session.id)
+        if row is None:
+            return
+        stored = ChatSession.from_json(session.id, row[0])
+        if stored.version > session.version:
+            session.messages, session.summary = stored.messages, stored.summary
+            session.pending_summary, session.version = stored.pending_summary, stored.version
+            self.reloaded += 1
+
+    def context(self, session: ChatSession, reserved_tokens: int = 0) -> Tuple[str, List[Dict[str, str]]]:
+        """(summary, recent messages) within the token budget, after `reserved_tokens` for the system prompt.
+
+        Messages that no longer fit move to the session's summarization backlog.
+        """
+        budget = self.token_budget - reserved_tokens - estimate_tokens(session.summary or " ")
+        kept, used = [], 0
+        for message in reversed(session.messages):
+            cost = estimate_tokens(message["content"]) + 4
+            # Always keep the newest message, even when it alone is over budget
+            if kept and used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+        evicted = len(session.messages) - len(kept)
+        if evicted:
+            session.pending_summary.extend(session.messages[:evicted])
+            session.messages = kept
+        # One summary at a time; turns evicted meanwhile, or left by a failed one, go into the next
+        if (not session._summary_lock.locked() and
+                sum(estimate_tokens(m["content"]) for m in session.pending_summary) >= self.summary_batch_tokens):
+            self._schedule_summary(session)
+        return session.summary, kept
+
+    def append(self, session: ChatSession, role: str, content: str):
+        session.messages.append({"role": role, "content": content})
+        session.touched = time.monotonic()
+        self._save(session)
+
+    def drop_unanswered(self, session: ChatSession):
+        """Remove a trailing user message whose reply failed, here and in the store, so a retry does not repeat it."""
+        if session.messages and session.messages[-1]["role"] == "user":
+            session.messages.pop()
+            self._save(session)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "created": self.created, "expired": self.expired,
+                "reloaded": self.reloaded, "summaries": self.summaries, "summarizing": len(self._tasks)}
+
+    def _schedule_summary(self, session: ChatSession):
+        task = asyncio.ensure_future(self._fold_summary(session))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold_summary(self, session: ChatSession):
+        async with session._summary_lock:
+            # The turns stay pending (and in saved copies) until their summary exists
+            turns = list(session.pending_summary)
+            if not turns:
+                return
+            try:
+                summary = await self.summarize(session.summary, turns)
+            except Exception as e:
+                # Keep the turns for the next attempt rather than losing them
+                logging.warning(f"Chat summary failed for session {session.id}: {e}")
+                return
+            session.summary = summary
+            session.pending_summary = session.pending_summary[len(turns):]
+            self.summaries += 1
+            self._save(session)
+
+    def _save(self, session: ChatSession):
+        if self.store is not None:
+            session.version += 1
+            wall = time.time()
+            self.store.set("chat-session", session.id, session.to_json(), wall + self.ttl, wall + self.ttl)
@@ -0,0 +1,24 @@
+import re
+
+# Messages from someone in distress right now. One list for both uses: such a message
+# jumps the SeaBot admission queue and gets only the SOS reply. Phrases, not words:
+# "help me with nets", "how does SOS work" or "what if my boat sinks" are ordinary questions.
+DISTRESS_PATTERNS = [
+    r"\b(mayday|man overboard|send help|help us|save us|save me|"
+    r"(we are|we're|i am|i'm) (sinking|drowning|lost at sea)|(is|are) drowning|sinking fast|"
+    r"(boat|ship|vessel) is (sinking|capsizing|on fire|taking on water)|(boat|ship|vessel) on fire|"
+    r"capsi[sz]ed|taking (on )?water)\b",
+    "बचाओ|डूब रह|वाचवा|बुडत आहे",  # Hindi / Marathi
+    "காப்பாற்று|மூழ்குகிற",  # Tamil
+    "కాపాడండి|మునిగిపోతు",  # Telugu
+    "രക്ഷിക്കണേ|മുങ്ങുന്നു",  # Malayalam
+    "বাঁচাও|ডুবে যাচ্ছে",  # Bengali
+    "ಕಾಪಾಡಿ|ಮುಳುಗುತ್ತಿದೆ",  # Kannada
+    "બચાવો|ડૂબી રહ",  # Gujarati
+    "ବଞ୍ଚାଅ|ବୁଡ଼ିଯାଉଛି",  # Odia
+]
+_DISTRESS = re.compile("|".join(f"(?:{p})" for p in DISTRESS_PATTERNS), re.IGNORECASE)
+
+
+def is_distress(text: str) -> bool:
+    return _DISTRESS.search(text) is not None
@@ -0,0 +1,850 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+# Fish class names from the Kaggle notebook
+CLASS_NAMES = [
+    'Bangus', 'Big Head Carp', 'Black Spotted Barb', 'Catfish', 'Climbing Perch',
+    'Fourfinger Threadfin', 'Freshwater Eel', 'Glass Perchlet', 'Goby', 'Gold Fish',
+    'Gourami', 'Grass Carp', 'Green Spotted Puffer', 'Indian Carp', 'Indo-Pacific Tarpon',
+    'Jaguar Gapote', 'Janitor Fish', 'Knifefish', 'Long-Snouted Pipefish', 'Mosquito Fish',
+    'Mudfish', 'Mullet', 'Pangasius', 'Perch', 'Scat Fish', 'Silver Barb', 'Silver Carp',
+    'Silver Perch', 'Snakehead', 'Tenpounder', 'Tilapia'
+]
+
+INPUT_SIZE = (224, 224)
+
+
+class ClassifierBusy(Exception):
+    """The classifier cannot take the request now (queue full, or loading recently failed); retry later."""
+
+
+def preprocess_image(image: Image.Image) -> np.ndarray:
+    """Preprocess image same as training code: RGB, 224x224, scaled to [0, 1]. Shape (224, 224, 3)."""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize(INPUT_SIZE)
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+
+def decode_image(data: bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Decode and preprocess encoded image bytes into `out`, a (224, 224, 3) float32 buffer.
+
+    JPEGs are decoded in draft mode: libjpeg scales by 1/2, 1/4 or 1/8 during
+    the DCT, to the smallest size still at least 224x224, so a 12 MP photo
+    never materializes at full resolution. The final resize matches
+    `preprocess_image`.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('RGB', INPUT_SIZE)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        pixels = np.asarray(image.resize(INPUT_SIZE))
+    if out is None:
+        out = np.empty(INPUT_SIZE + (3,), dtype=np.float32)
+    np.divide(pixels, np.float32(255), out=out)
+    return out
+
+
+class Preprocessor:
+    """Decodes uploads on a dedicated thread pool straight into one float32 batch buffer.
+
+    PIL releases the GIL while decoding and resizing, so images in a batch are
+    decoded in parallel. Each worker writes its own slice of the buffer; no
+    per-image arrays are stacked afterwards.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 1),
+                                        thread_name_prefix="fish-preprocess")
+
+    async def preprocess(self, data: bytes) -> np.ndarray:
+        """One image, shape (224, 224, 3). Decode errors are raised."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, decode_image, data)
+
+    async def preprocess_many(self, images: Sequence[bytes]) -> Tuple[np.ndarray, List[Optional[Exception]]]:
+        """Batch buffer of shape (n, 224, 224, 3) and a per-image error (or None).
+
+        Rows of images that failed to decode are left uninitialized.
+        """
+        loop = asyncio.get_running_loop()
+        batch = np.empty((len(images),) + INPUT_SIZE + (3,), dtype=np.float32)
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._pool, decode_image, data, batch[i]) for i, data in enumerate(images)),
+            return_exceptions=True,
+        )
+        return batch, [r if isinstance(r, Exception) else None for r in results]
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+def top_predictions(probabilities: np.ndarray, k: int = 5) -> Dict[str, Any]:
+    """Response body for one image: best species plus the top `k` with confidences."""
+    top_indices = np.argsort(probabilities)[::-1][:k]
+    return {
+        "predicted_species": CLASS_NAMES[int(top_indices[0])],
+        "top_predictions": [
+            {"species": CLASS_NAMES[int(idx)], "confidence": f"{float(probabilities[idx]) * 100:.2f}%"}
+            for idx in top_indices
+        ],
+    }
+
+
+class MicroBatcher:
+    """Collects classification requests into batches for one forward pass on a worker thread.
+
+    The worker blocks for the first queued request, then keeps collecting until
+    `max_batch_size` images are queued or `max_wait_ms` has passed, runs
+    `predict_fn` once on the concatenated batch and resolves every caller's
+    future on its own event loop. A request larger than `max_batch_size`
+    runs as a pass of its own. If a merged pass fails, its requests are rerun
+    one by one so the error reaches only the request that caused it. The
+    model only ever runs on worker threads, so the event loop keeps serving
+    alerts and chat during inference.
+
+    `num_workers` > 1 keeps several batches in flight, for a `predict_fn`
+    that hands work to other processes.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray], max_batch_size: int = 16,
+                 max_wait_ms: float = 5, max_queue_size: int = 256, name: str = "fish-classifier",
+                 num_workers: int = 1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.num_workers = num_workers
+        self._queue: "queue.Queue[Optional[Tuple[np.ndarray, asyncio.AbstractEventLoop, asyncio.Future]]]" = \
+            queue.Queue(maxsize=max_queue_size)
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.images = 0
+        self.rejected = 0
+        self.inference_seconds = 0.0
+        self.batch_sizes: Dict[int, int] = {}
+
+    def start(self):
+        if not self._threads:
+            self._threads = [threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                             for i in range(self.num_workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Finish the queued work, then stop the workers."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    async def predict(self, image: np.ndarray) -> np.ndarray:
+        """Class probabilities for one preprocessed image of shape (224, 224, 3)."""
+        return (await self.predict_many(image[np.newaxis]))[0]
+
+    async def predict_many(self, images: np.ndarray) -> np.ndarray:
+        """Class probabilities for a stack of preprocessed images, shape (n, 224, 224, 3).
+
+        The stack stays together in one forward pass; it shares the pass with
+        other queued requests when they fit within `max_batch_size`.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((images, loop, future))
+        except queue.Full:
+            self.rejected += 1
+            raise ClassifierBusy("Too many images waiting for classification")
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "workers": self.num_workers,
+            "batches": self.batches,
+            "images": self.images,
+            "rejected": self.rejected,
+            "mean_batch_size": round(self.images / self.batches, 2) if self.batches else 0,
+            "mean_batch_ms": round(1000 * self.inference_seconds / self.batches, 2) if self.batches else 0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
+
+    def _collect(self, first) -> Tuple[list, Any, bool]:
+        """(batch, request held back for the next batch, whether a stop was requested)."""
+        if first is None:
+            return [], None, True
+        batch, size = [first], len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, None, True
+            if size + len(item[0]) > self.max_batch_size:
+                # Too big to join this pass; it leads the next one
+                return batch, item, False
+            batch.append(item)
+            size += len(item[0])
+        return batch, None, False
+
+    def _run(self):
+        stopping, pending = False, None
+        while not stopping:
+            batch, pending, stopping = self._collect(pending or self._queue.get())
+            if not batch:
+                continue
+            images = batch[0][0] if len(batch) == 1 else np.concatenate([images for images, _, _ in batch])
+            outputs, error = self._infer(images)
+            if error is not None and len(batch) > 1:
+                # Rerun each request alone, so a bad input fails only its own caller
+                for request_images, loop, future in batch:
+                    result, request_error = self._infer(request_images)
+                    loop.call_soon_threadsafe(_resolve, future, result, request_error)
+                continue
+            offset = 0
+            for request_images, loop, future in batch:
+                result = outputs[offset:offset + len(request_images)] if error is None else None
+                offset += len(request_images)
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+        if pending is not None:
+            # Stopped with a request still held back from the last batch
+            _, loop, future = pending
+            loop.call_soon_threadsafe(_resolve, future, None, ClassifierBusy("Classifier stopped"))
+
+    def _infer(self, images: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[Exception]]:
+        started = time.perf_counter()
+        try:
+            outputs, error = np.asarray(self.predict_fn(images)), None
+        except Exception as e:
+            logging.exception(f"Batched inference failed for {len(images)} images")
+            outputs, error = None, e
+        with self._stats_lock:
+            self.inference_seconds += time.perf_counter() - started
+            self.batches += 1
+            self.images += len(images)
+            self.batch_sizes[len(images)] = self.batch_sizes.get(len(images), 0) + 1
+        return outputs, error
+
+
+def _resolve(future: asyncio.Future, result: Any, error: Optional[Exception]):
+    # The caller may have gone away (client disconnect) while its image was in flight
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def keras_predict_fn(model) -> Callable[[np.ndarray], np.ndarray]:
+    """Direct model call: skips `model.predict`'s per-call dataset setup, which dominates small batches."""
+    def predict(batch: np.ndarray) -> np.ndarray:
+        return model(batch, training=False).numpy()
+    return predict
+
+
+def load_keras(path: str, num_threads: Optional[int] = None) -> Callable[[np.ndarray], np.ndarray]:
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    if num_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+    return keras_predict_fn(load_model(path, compile=False))
+
+
+def load_tflite(path: str, num_threads: Optional[int] = None) -> Callable[[np.ndarray], np.ndarray]:
+    """TFLite interpreter, from the standalone runtime when installed so full TensorFlow is not needed."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+
+    interpreter = Interpreter(model_path=path, num_threads=num_threads)
+    input_index = interpreter.get_input_details()[0]["index"]
+    output_index = interpreter.get_output_details()[0]["index"]
+    allocated = [None]
+
+    # Called only from the batcher thread; the interpreter is not thread-safe
+    def predict(batch: np.ndarray) -> np.ndarray:
+        if allocated[0] != batch.shape:
+            interpreter.resize_tensor_input(input_index, batch.shape, strict=False)
+            interpreter.allocate_tensors()
+            allocated[0] = batch.shape
+        interpreter.set_tensor(input_index, np.ascontiguousarray(batch, dtype=np.float32))
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index).copy()
+    return predict
+
+
+def load_onnx(path: str, num_threads: Optional[int] = None) -> Callable[[np.ndarray], np.ndarray]:
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+
+    def predict(batch: np.ndarray) -> np.ndarray:
+        return session.run(None, {input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+    return predict
+
+
+# Inference backend name -> (loader, default model file). Files other than the
+# .h5 are produced by `python export_model.py`.
+BACKENDS: Dict[str, Tuple[Callable[..., Callable[[np.ndarray], np.ndarray]], str]] = {
+    "keras": (load_keras, "FishModelClassifier_V5.h5"),
+    "tflite": (load_tflite, "FishModelClassifier_V5.tflite"),
+    "onnx": (load_onnx, "FishModelClassifier_V5.onnx"),
+}
+
+
+_spawn_lock = threading.Lock()
+
+
+@contextmanager
+def _spawn_main(module_name: str):
+    """Make processes started in this block import `module_name` as their `__main__`.
+
+    Spawned children re-run the parent's `__main__`; under `python main.py`
+    that would build the whole API (auth, chat, alerts) in every worker.
+    """
+    with _spawn_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = sys.modules[module_name]
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+class _WorkerProcess:
+    """One classifier process with its own shared-memory input and output slots."""
+
+    def __init__(self, context, index: int, backend: str, model_path: str, num_threads: Optional[int],
+                 max_batch_size: int):
+        from services import fish_worker
+
+        self.max_batch_size = max_batch_size
+        self.conn = self.process = None
+        self.input_shm = shared_memory.SharedMemory(
+            create=True, size=max_batch_size * INPUT_SIZE[0] * INPUT_SIZE[1] * 3 * 4)
+        try:
+            self.output_shm = shared_memory.SharedMemory(create=True, size=max_batch_size * len(CLASS_NAMES) * 4)
+        except BaseException:
+            self.input_shm.close()
+            self.input_shm.unlink()
+            raise
+        try:
+            self.inputs = np.ndarray((max_batch_size,) + INPUT_SIZE + (3,), dtype=np.float32,
+                                     buffer=self.input_shm.buf)
+            self.outputs = np.ndarray((max_batch_size, len(CLASS_NAMES)), dtype=np.float32,
+                                      buffer=self.output_shm.buf)
+            self.conn, child_conn = context.Pipe()
+            self.process = context.Process(
+                target=fish_worker.run, name=f"fish-classifier-{index}", daemon=True,
+                args=(backend, model_path, num_threads, max_batch_size, self.input_shm.name, self.output_shm.name,
+                      child_conn),
+            )
+            with _spawn_main(fish_worker.__name__):
+                self.process.start()
+            child_conn.close()
+        except BaseException:
+            self.close()
+            raise
+
+    def wait_ready(self, timeout: float):
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"{self.process.name} did not load the model within {timeout}s")
+        status, detail = self.conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"{self.process.name} failed to load the model: {detail}")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # Only the array data crosses the process boundary, through the shared slot
+        size = len(batch)
+        self.inputs[:size] = batch
+        self.conn.send(size)
+        status, detail = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"{self.process.name}: {detail}")
+        return self.outputs[:size].copy()
+
+    def close(self):
+        """Stop the process and free its shared memory. Safe to call more than once."""
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        if self.process is not None and self.process.pid is not None:
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(5)
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        self.inputs = self.outputs = None  # Release the views before closing the mappings
+        for shm in (self.input_shm, self.output_shm):
+            if shm is not None and shm.buf is not None:
+                shm.close()
+                shm.unlink()
+
+
+class ProcessPool:
+    """Classifier worker processes, each loading the model once, fed through shared memory.
+
+    Processes are spawned rather than forked, because TensorFlow is not
+    fork-safe, and start from the small `services.fish_worker` module rather
+    than the server's script. The tflite runtime memory-maps the model file,
+    so its pages are shared between workers through the page cache; keras and
+    onnxruntime read the model into each process, so memory grows with the
+    process count. `predict` blocks the calling thread until an idle worker
+    has run the batch; give `MicroBatcher` one thread per process. A worker
+    that dies is replaced before its next batch. If any worker fails to start,
+    every process and shared-memory segment created so far is released.
+    """
+
+    def __init__(self, processes: int, backend: str, model_path: str, num_threads: Optional[int] = None,
+                 max_batch_size: int = 16, load_timeout: float = 300):
+        self.backend = backend
+        self.model_path = model_path
+        # Default to one intra-op thread per process so workers do not oversubscribe cores
+        self.num_threads = num_threads or 1
+        self.max_batch_size = max_batch_size
+        self.load_timeout = load_timeout
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_WorkerProcess] = []
+        try:
+            for i in range(processes):
+                self._workers.append(self._spawn(i))
+            for worker in self._workers:
+                worker.wait_ready(load_timeout)
+        except BaseException:
+            self.close()
+            raise
+        self._idle: "queue.Queue[int]" = queue.Queue()
+        for i in range(processes):
+            self._idle.put(i)
+
+    def _spawn(self, index: int) -> _WorkerProcess:
+        return _WorkerProcess(self._context, index, self.backend, self.model_path, self.num_threads,
+                              self.max_batch_size)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        index = self._idle.get()
+        try:
+            worker = self._workers[index]
+            if not worker.process.is_alive():
+                logging.warning(f"{worker.process.name} exited with code {worker.process.exitcode}; restarting")
+                worker.close()
+                worker = self._workers[index] = self._spawn(index)
+                try:
+                    worker.wait_ready(self.load_timeout)
+                except BaseException:
+                    worker.close()  # Retried on the next batch that gets this slot
+                    raise
+                self.restarts += 1
+            return np.concatenate([worker.predict(batch[i:i + self.max_batch_size])
+                                   for i in range(0, len(batch), self.max_batch_size)])
+        finally:
+            self._idle.put(index)
+
+    @property
+    def processes(self) -> int:
+        return len(self._workers)
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+        self._workers = []
+
+
+def content_hash(data: bytes) -> bytes:
+    """Fast 128-bit digest of the uploaded bytes."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+# Block boundaries for a 9x8 downsample of the 224x224 input
+_DHASH_ROWS = np.linspace(0, INPUT_SIZE[1], 8, endpoint=False).astype(np.intp)
+_DHASH_COLS = np.linspace(0, INPUT_SIZE[0], 9, endpoint=False).astype(np.intp)
+
+
+def perceptual_hash(image: np.ndarray) -> bytes:
+    """64-bit difference hash (dHash) of a preprocessed (224, 224, 3) image.
+
+    Grayscale is averaged into 9x8 blocks and each bit records whether a block
+    is brighter than its left neighbour, so re-encoded or rescaled copies of a
+    photo usually hash identically.
+    """
+    gray = image.mean(axis=2)
+    blocks = np.add.reduceat(np.add.reduceat(gray, _DHASH_ROWS, axis=0), _DHASH_COLS, axis=1)
+    blocks /= np.outer(np.diff(np.append(_DHASH_ROWS, INPUT_SIZE[1])), np.diff(np.append(_DHASH_COLS, INPUT_SIZE[0])))
+    return np.packbits(blocks[:, 1:] > blocks[:, :-1]).tobytes()
+
+
+class PredictionCache:
+    """Bounded LRU of class probabilities keyed on content hashes of uploaded images.
+
+    Exact re-uploads (network retries) hit on the hash of the raw bytes before
+    any decoding. With `perceptual=True`, a miss is looked up again by the
+    perceptual hash of the preprocessed image, which catches resends of a
+    re-encoded copy; only inference is skipped in that case. Hashes up to
+    `max_distance` bits apart count as the same photo.
+    """
+
+    def __init__(self, max_entries: int = 10000, perceptual: bool = False, max_distance: int = 4):
+        self.max_entries = max_entries
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        probabilities = self._entries.get(key)
+        if probabilities is not None:
+            self._entries.move_to_end(key)
+        return probabilities
+
+    def lookup(self, content_key: bytes) -> Optional[np.ndarray]:
+        probabilities = self.get(content_key)
+        if probabilities is not None:
+            self.hits += 1
+        return probabilities
+
+    def lookup_perceptual(self, content_key: bytes, image: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[bytes]]:
+        """(probabilities or None, perceptual key) after a content-hash miss."""
+        if not self.perceptual:
+            self.misses += 1
+            return None, None
+        phash_key = b"p" + perceptual_hash(image)
+        probabilities = self.get(phash_key)
+        if probabilities is None and self.max_distance > 0:
+            probabilities = self._nearest(phash_key)
+        if probabilities is None:
+            self.misses += 1
+            return None, phash_key
+        self.perceptual_hits += 1
+        self.put(content_key, probabilities)
+        return probabilities, phash_key
+
+    def _nearest(self, phash_key: bytes) -> Optional[np.ndarray]:
+        """Probabilities of the closest cached perceptual hash within `max_distance` bits."""
+        keys = [key for key in self._entries if key[:1] == b"p"]
+        if not keys:
+            return None
+        hashes = np.frombuffer(b"".join(key[1:] for key in keys), dtype=np.uint8).reshape(len(keys), -1)
+        distances = np.unpackbits(hashes ^ np.frombuffer(phash_key[1:], dtype=np.uint8), axis=1).sum(axis=1)
+        best = int(distances.argmin())
+        return self.get(keys[best]) if distances[best] <= self.max_distance else None
+
+    def put(self, key: bytes, probabilities: np.ndarray):
+        self._entries[key] = probabilities
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.perceptual_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "perceptual_hits": self.perceptual_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.perceptual_hits) / lookups, 4) if lookups else 0,
+        }
+
+
+class FishClassifier:
+    """The fish classification subsystem, loaded lazily so non-ML workers never import its runtime.
+
+    The inference runtime (see `BACKENDS`) is imported and the model loaded on
+    a worker thread, either by `warmup()` at startup or by the first request,
+    which waits for it. Until then the API serves everything else; `status()`
+    backs a readiness probe.
+    """
+
+    def __init__(self, model_path: Optional[str] = None, max_batch_size: int = 16, max_wait_ms: float = 5,
+                 max_queue_size: int = 256, preprocess_workers: Optional[int] = None, backend: str = "keras",
+                 num_threads: Optional[int] = None, cache_max_entries: int = 10000, perceptual_cache: bool = False,
+                 perceptual_distance: int = 4, processes: int = 0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown fish classifier backend {backend!r}; expected one of {sorted(BACKENDS)}")
+        self.backend = backend
+        self.model_path = model_path or BACKENDS[backend][1]
+        self.num_threads = num_threads
+        self.processes = processes
+        self.pool: Optional[ProcessPool] = None
+        self.preprocessor = Preprocessor(preprocess_workers)
+        self.cache = PredictionCache(cache_max_entries, perceptual_cache, perceptual_distance) if cache_max_entries > 0 else None
+        self._batcher_options = dict(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                     max_queue_size=max_queue_size)
+        self.batcher: Optional[MicroBatcher] = None
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._loading: Optional[asyncio.Future] = None
+        # After a failed load, requests are refused until `_retry_at`; the wait doubles per failure
+        self.failures = 0
+        self._retry_at = 0.0
+
+    def load(self) -> MicroBatcher:
+        """Import the runtime, load the model and run one warmup pass. Blocking; runs off the event loop."""
+        started = time.perf_counter()
+        if self.processes:
+            # Each process loads the model and runs its own warmup pass
+            self.pool = ProcessPool(self.processes, self.backend, self.model_path, self.num_threads,
+                                    self._batcher_options["max_batch_size"])
+            batcher = MicroBatcher(self.pool.predict, num_workers=self.processes, **self._batcher_options)
+        else:
+            loader, _ = BACKENDS[self.backend]
+            predict_fn = loader(self.model_path, self.num_threads)
+            # The first call builds the graph; pay for it here rather than in a request
+            predict_fn(np.zeros((1,) + INPUT_SIZE + (3,), dtype=np.float32))
+            batcher = MicroBatcher(predict_fn, **self._batcher_options)
+        batcher.start()
+        self.load_seconds = round(time.perf_counter() - started, 2)
+        logging.info(f"Fish classifier ({self.backend}, {self.model_path}) ready in {self.load_seconds}s")
+        return batcher
+
+    async def warmup(self):
+        """Load in the background, e.g. from a startup task. Errors are recorded, not raised."""
+        try:
+            await self.ensure_loaded()
+        except Exception:
+            pass
+
+    async def ensure_loaded(self) -> MicroBatcher:
+        if self.batcher is not None:
+            return self.batcher
+        if self._loading is None:
+            wait = self._retry_at - time.monotonic()
+            if wait > 0:
+                raise ClassifierBusy(f"Fish classifier failed to load ({self.error}); retrying in {wait:.0f}s")
+            self.state = "loading"
+            self._loading = asyncio.ensure_future(asyncio.to_thread(self.load))
+        loading = self._loading
+        try:
+            self.batcher = await asyncio.shield(loading)
+        except Exception as e:
+            if self._loading is loading:
+                logging.exception("Fish classifier failed to load")
+                self.failures += 1
+                self._retry_at = time.monotonic() + min(600, 15 * 2 ** (self.failures - 1))
+                self._loading = None  # Let a request after the backoff retry
+            self.state, self.error = "failed", str(e)
+            raise
+        self.state = "ready"
+        self.failures = 0
+        return self.batcher
+
+    async def predict(self, data: bytes) -> np.ndarray:
+        """Class probabilities for one encoded image. Decode errors are raised."""
+        result = (await self.predict_batch([data]))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def predict_batch(self, uploads: Sequence[bytes]) -> List[Union[np.ndarray, Exception]]:
+        """Class probabilities for each encoded image, or the exception that image raised while decoding.
+
+        Cached images skip decoding (exact bytes) or inference (perceptual
+        match); the rest are decoded in parallel and run as one tensor batch.
+        """
+        results: List[Union[np.ndarray, Exception, None]] = [None] * len(uploads)
+        keys = [content_hash(data) for data in uploads] if self.cache else []
+        pending = []
+        for i in range(len(uploads)):
+            results[i] = self.cache.lookup(keys[i]) if self.cache else None
+            if results[i] is None:
+                pending.append(i)
+        if not pending:
+            return results
+
+        batch, errors = await self.preprocessor.preprocess_many([uploads[i] for i in pending])
+        to_infer, rows, phash_keys = [], [], {}
+        for row, (i, error) in enumerate(zip(pending, errors)):
+            if error is not None:
+                results[i] = error
+                continue
+            if self.cache:
+                results[i], phash_keys[i] = self.cache.lookup_perceptual(keys[i], batch[row])
+                if results[i] is not None:
+                    continue
+            to_infer.append(i)
+            rows.append(row)
+        if not to_infer:
+            return results
+
+        # Rows that failed or hit the cache are dropped from the buffer
+        images = batch if len(rows) == len(batch) else batch[rows]
+        predictions = await self.predict_many(images)
+        for i, probabilities in zip(to_infer, predictions):
+            results[i] = probabilities
+            if self.cache:
+                self.cache.put(keys[i], probabilities)
+                if phash_keys.get(i):
+                    self.cache.put(phash_keys[i], probabilities)
+        return results
+
+    async def predict_many(self, images: np.ndarray) -> np.ndarray:
+        """Class probabilities for a preprocessed batch of shape (n, 224, 224, 3)."""
+        return await (await self.ensure_loaded()).predict_many(images)
+
+    @property
+    def ready(self) -> bool:
+        return self.batcher is not None
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "backend": self.backend, "processes": self.processes,
+                "load_seconds": self.load_seconds, "error": self.error}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.status(), **(self.batcher.stats() if self.batcher else {}),
+                "process_restarts": self.pool.restarts if self.pool else None,
+                "cache": self.cache.stats() if self.cache else None}
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.stop()
+            self.batcher = None
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        self.state = "idle"
+        self.preprocessor.close()
+
+
+_default_classifier: Optional[FishClassifier] = None
+
+
+def get_classifier() -> FishClassifier:
+    """The process-wide classifier configured from FISH_* environment variables.
+
+    Every app mounted in the process (main.py, fishClassify.py) shares this
+    instance, so the model is loaded once.
+    """
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = FishClassifier(
+            os.getenv("FISH_MODEL_PATH"),
+            backend=os.getenv("FISH_BACKEND", "keras"),
+            num_threads=int(os.getenv("FISH_INFERENCE_THREADS", "0")) or None,
+            max_batch_size=int(os.getenv("FISH_BATCH_MAX_SIZE", "16")),
+            max_wait_ms=float(os.getenv("FISH_BATCH_MAX_WAIT_MS", "5")),
+            max_queue_size=int(os.getenv("FISH_BATCH_MAX_QUEUE", "256")),
+            preprocess_workers=int(os.getenv("FISH_PREPROCESS_WORKERS", "0")) or None,
+            cache_max_entries=int(os.getenv("FISH_CACHE_MAX_ENTRIES", "10000")),
+            perceptual_cache=os.getenv("FISH_CACHE_PERCEPTUAL", "0") == "1",
+            perceptual_distance=int(os.getenv("FISH_CACHE_PERCEPTUAL_DISTANCE", "4")),
+            # >0 runs inference in that many worker processes instead of a thread in this one
+            processes=int(os.getenv("FISH_WORKER_PROCESSES", "0")),
+        )
+    return _default_classifier
+
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+async def classify_directory(classifier: FishClassifier, root: str, batch_size: int = 32, top_k: int = 5,
+                             in_flight: int = 2, output=None) -> Tuple[int, float]:
+    """Classify every image under `root` through the same path as the API, writing JSON lines to `output`.
+
+    Keeps `in_flight` batches moving so file reads, decoding and inference
+    overlap. Returns (images classified, seconds taken).
+    """
+    import json
+    import sys
+
+    paths = sorted(os.path.join(directory, name) for directory, _, names in os.walk(root) for name in names
+                   if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    output = output or sys.stdout
+    semaphore = asyncio.Semaphore(in_flight)
+    done = 0
+    started = time.perf_counter()
+
+    def read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    async def run(chunk: List[str]):
+        nonlocal done
+        async with semaphore:
+            uploads = await asyncio.gather(*(asyncio.to_thread(read, path) for path in chunk))
+            results = await classifier.predict_batch(uploads)
+        for path, result in zip(chunk, results):
+            line = {"path": os.path.relpath(path, root)}
+            line.update({"error": str(result)} if isinstance(result, Exception) else top_predictions(result, top_k))
+            output.write(json.dumps(line) + "\n")
+        done += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"\r{done}/{len(paths)} images, {done / elapsed:.1f} images/sec", end="", file=sys.stderr)
+
+    await classifier.ensure_loaded()
+    started = time.perf_counter()
+    await asyncio.gather(*(run(paths[i:i + batch_size]) for i in range(0, len(paths), batch_size)))
+    print(file=sys.stderr)
+    return len(paths), time.perf_counter() - started
+
+
+def main():
+    """Offline bulk labelling: python -m services.fish_classifier PHOTOS_DIR [--output labels.jsonl]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Classify a directory of fish photos and report images/sec.")
+    parser.add_argument("directory")
+    parser.add_argument("--output", help="JSON lines file (default: stdout)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=os.getenv("FISH_BACKEND", "keras"))
+    parser.add_argument("--model", default=os.getenv("FISH_MODEL_PATH"))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=0, help="Inference worker processes (0: in-process)")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads per model instance")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    classifier = FishClassifier(args.model, backend=args.backend, num_threads=args.threads,
+                                max_batch_size=args.batch_size, processes=args.processes,
+                                max_queue_size=1024, cache_max_entries=100000)
+    output = open(args.output, "w") if args.output else None
+    try:
+        count, seconds = asyncio.run(classify_directory(
+            classifier, args.directory, args.batch_size, args.top_k, in_flight=max(2, args.processes + 1),
+            output=output))
+    finally:
+        classifier.close()
+        if output:
+            output.close()
+    cache = classifier.cache.stats()
+    print(f"Classified {count} images in {seconds:.1f}s: {count / seconds if seconds else 0:.1f} images/sec "
+          f"({classifier.backend}, batch {args.batch_size}, {args.processes or 'in-process'} workers, "
+          f"{cache['hits'] + cache['perceptual_hits']} duplicates)", flush=True)
+
+
+if __name__ == "__main__":
+    main()
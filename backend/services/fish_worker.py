@@ -0,0 +1,43 @@
+"""
+Entry module of fish classifier worker processes (see services.fish_classifier.ProcessPool).
+
+Spawned workers import this as their `__main__` instead of the server's
+script, so a worker starts with numpy and the inference runtime only.
+"""
+
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+
+def run(backend: str, model_path: str, num_threads: Optional[int], max_batch_size: int,
+        input_name: str, output_name: str, conn):
+    """Serve batches from shared memory until told to stop."""
+    from services.fish_classifier import BACKENDS, CLASS_NAMES, INPUT_SIZE
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    inputs = outputs = None
+    try:
+        inputs = np.ndarray((max_batch_size,) + INPUT_SIZE + (3,), dtype=np.float32, buffer=input_shm.buf)
+        outputs = np.ndarray((max_batch_size, len(CLASS_NAMES)), dtype=np.float32, buffer=output_shm.buf)
+        loader, _ = BACKENDS[backend]
+        predict_fn = loader(model_path, num_threads)
+        predict_fn(np.zeros((1,) + INPUT_SIZE + (3,), dtype=np.float32))
+        conn.send(("ready", None))
+        while True:
+            size = conn.recv()
+            if size is None:
+                break
+            try:
+                outputs[:size] = predict_fn(inputs[:size])
+                conn.send(("ok", size))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        del inputs, outputs  # Release the views before closing the mappings
+        input_shm.close()
+        output_shm.close()
@@ -1,107 +1,394 @@
 
 import httpx
-from datetime import datetime
-from typing import Dict, Any, Optional
+import math
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
 from zoneinfo import ZoneInfo  # Accurate timezone handling
 import asyncio
-import time
+import numpy as np
+
+from services.cache import GridCache, SqliteStore, Uncacheable
+from services import solar
+from services.scoring import FACTORS, score_arrays
+from services.upstream import Upstream
 
 
 class IndiaFishingAlerts:
-    def __init__(self, httpx_client: httpx.AsyncClient):
+    def __init__(self, httpx_client: httpx.AsyncClient, grid_deg: float = 0.05, cache_ttl: int = 300,
+                 cache_max_entries: int = 10000, cache_max_bytes: int = 64 * 1024 * 1024,
+                 batch_chunk_size: int = 100, model_run_interval_h: int = 6, model_run_delay_h: float = 3,
+                 cache_stale_ttl: int = 1800, upstream_max_concurrency: int = 16,
+                 breaker_failure_threshold: int = 5, breaker_reset_timeout: float = 30,
+                 cache_store: Optional[SqliteStore] = None,
+                 weather_url: str = "https://api.open-meteo.com/v1/forecast",
+                 marine_url: str = "https://marine-api.open-meteo.com/v1/marine"):
         self.session = httpx_client
+        self.WEATHER_URL = weather_url
+        self.MARINE_URL = marine_url
+        self.WEATHER_PARAMS = {
+            "current": "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,precipitation_probability,weather_code,pressure_msl,wind_speed_10m,visibility",
+        }
+        self.MARINE_PARAMS = {
+            "current": "wave_height,wave_direction,wind_wave_period,swell_wave_height,ocean_current_velocity"
+        }
+        # Each upstream gets its own circuit breaker and concurrency limit, so an outage
+        # fails fast instead of every request waiting out the client timeout
+        self._upstreams = {
+            url: Upstream(name, max_concurrency=upstream_max_concurrency,
+                          failure_threshold=breaker_failure_threshold, reset_timeout=breaker_reset_timeout)
+            for url, name in ((self.WEATHER_URL, "open-meteo-forecast"), (self.MARINE_URL, "open-meteo-marine"))
+        }
+        self.HOURLY_WEATHER_PARAMS = {"hourly": "wind_speed_10m,precipitation,visibility", "forecast_days": 4}
+        self.HOURLY_MARINE_PARAMS = {"hourly": "wave_height,swell_wave_height,ocean_current_velocity", "forecast_days": 4}
+        # Forecast models run every `model_run_interval_h` hours (UTC) and show up upstream
+        # roughly `model_run_delay_h` later; hourly timelines are cached until then
+        self.model_run_interval_h = model_run_interval_h
+        self.model_run_delay_h = model_run_delay_h
+        # Open-Meteo accepts comma-separated coordinate lists; keep URLs a sane length
+        self.batch_chunk_size = batch_chunk_size
         self.IST = ZoneInfo("Asia/Kolkata")
+        # Day/night is computed locally instead of from Open-Meteo's daily sunrise/sunset block
+        self.solar = solar.SolarTable(grid_deg)
         self.limits = {
             'wind_ms': 12.0, 'wave_m': 2.5, 'rain_mm': 10.0,
             'swell_m': 2.0, 'current_ms': 1.0,
             'visibility_m': 1000, 'visibility_m_night': 5000,
         }
-        self._cache = {}
-        self._cache_ttl = 300  # Cache for 5 minutes
+        # Keyed on grid cells matching the marine model resolution, not raw GPS fixes
+        # Stale entries are served while a refresh runs, and during upstream outages.
+        # An optional on-disk store shares entries between workers and across restarts.
+        self._cache = GridCache(grid_deg=grid_deg, ttl=cache_ttl, max_entries=cache_max_entries,
+                                max_bytes=cache_max_bytes, stale_ttl=cache_stale_ttl,
+                                store=cache_store, namespace=f"alert:{grid_deg}")
+        self._timeline_cache = GridCache(grid_deg=grid_deg, ttl=self._seconds_until_next_model_run,
+                                         max_entries=cache_max_entries, max_bytes=cache_max_bytes,
+                                         stale_ttl=cache_stale_ttl,
+                                         store=cache_store, namespace=f"hourly:{grid_deg}")
 
     async def get_alerts(self, lat: float, lon: float, location_name: str = "") -> Dict[str, Any]:
         """Evaluate safety probability for fishing."""
-        cache_key = (lat, lon)
-        if cache_key in self._cache and (time.time() - self._cache[cache_key]["timestamp"]) < self._cache_ttl:
-            return self._cache[cache_key]["data"]
+        _, result = await self.get_cell_alerts(lat, lon)
+        if "ERROR" in result["status"]:
+            return {**result, "location": location_name}
+        # Cached results are shared by the whole cell; only the location label is per request
+        return {**result, "location": location_name or f"{lat:.2f}°N, {lon:.2f}°E"}
+
+    async def get_cell_alerts(self, lat: float, lon: float) -> Tuple[Tuple[int, int], Dict[str, Any]]:
+        """The cached alert shared by the point's grid cell, without a location label.
 
+        The returned dict is shared between requests and must not be mutated.
+        """
+        cell = self._cache.cell(lat, lon)
         try:
-            weather_params = {
-                "current": "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,precipitation_probability,weather_code,pressure_msl,wind_speed_10m,visibility",
-                "daily": "sunrise,sunset"
-            }
-            marine_params = {
-                "current": "wave_height,wave_direction,wind_wave_period,swell_wave_height,ocean_current_velocity"
+            result = await self._cache.get_or_load(cell, lambda: self._evaluate_cell(cell))
+        except Exception as e:
+            return cell, self._error(str(e), "")
+        return cell, self._with_current_daylight({cell: result})[cell]
+
+    def _with_current_daylight(self, by_cell: Dict[Tuple[int, int], Any]) -> Dict[Tuple[int, int], Any]:
+        """Rescore cached alerts whose day/night state has changed since they were computed.
+
+        A cached or stale entry can outlive sunset, and night forces unsafe, so the
+        gate is checked on every serve. Unchanged entries are returned as the same
+        object, keeping their memoized encodings valid.
+        """
+        cached = [(cell, r) for cell, r in by_cell.items()
+                  if isinstance(r, dict) and r.get("time_of_day") in ("Day", "Night")]
+        if not cached:
+            return by_cell
+        coords = [self._cache.center(cell) for cell, _ in cached]
+        is_day = self._is_daytime(coords)
+        flipped = [(cell, r, c) for (cell, r), c, day in zip(cached, coords, is_day)
+                   if (r["time_of_day"] == "Day") != day]
+        if not flipped:
+            return by_cell
+        rescored = self._build_results([{"current": r["data"]["weather"]} for _, r, _ in flipped],
+                                       [{"current": r["data"]["marine"]} for _, r, _ in flipped],
+                                       [c for _, _, c in flipped])
+        return {**by_cell, **{cell: result for (cell, _, _), result in zip(flipped, rescored)}}
+
+    def cell_label(self, cell: Tuple[int, int]) -> str:
+        lat, lon = self._cache.center(cell)
+        return f"{lat:.2f}°N, {lon:.2f}°E"
+
+    @staticmethod
+    def compact(result: Dict[str, Any], location: str = "") -> Dict[str, Any]:
+        """Low-bandwidth form of an alert: no raw upstream blocks or message strings."""
+        return {
+            "safe": result["safe"],
+            "status": result["status"],
+            "advice": result["advice"],
+            "risk_probability": result["risk_probability"],
+            "location": location or result.get("location", ""),
+            "time": result["time"],
+            "time_of_day": result["time_of_day"],
+            "factors": {f["factor"]: f["probability"] for f in result.get("data", {}).get("factors", [])},
+        }
+
+    async def get_alerts_batch(self, points: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+        """Evaluate many points at once, one upstream request per chunk of unique grid cells.
+
+        Results are returned in the same order as `points`.
+        """
+        cells = [self._cache.cell(lat, lon) for lat, lon in points]
+        by_cell = self._with_current_daylight(await self._cache.get_or_load_many(cells, self._evaluate_cells))
+
+        results = []
+        for (lat, lon), cell in zip(points, cells):
+            result = by_cell[cell]
+            if isinstance(result, Exception):
+                results.append(self._error(str(result), f"{lat:.2f}°N, {lon:.2f}°E"))
+            else:
+                results.append({**result, "location": f"{lat:.2f}°N, {lon:.2f}°E"})
+        return results
+
+    async def get_timeline(self, lat: float, lon: float, hours: int = 72, location_name: str = "") -> Dict[str, Any]:
+        """Hour-by-hour safety for the coming `hours`, plus the contiguous safe windows."""
+        cell = self._timeline_cache.cell(lat, lon)
+        try:
+            forecast = await self._timeline_cache.get_or_load(cell, lambda: self._evaluate_timeline(cell))
+        except Exception as e:
+            return self._error(str(e), location_name)
+
+        upcoming = self._score_timeline(cell, forecast, hours)
+        return {
+            "location": location_name or f"{lat:.2f}°N, {lon:.2f}°E",
+            "time": datetime.now(self.IST).strftime("%d-%m-%Y %H:%M IST"),
+            "hours": upcoming,
+            "windows": self._safe_windows(upcoming),
+        }
+
+    async def _evaluate_cell(self, cell) -> Dict[str, Any]:
+        """Fetch and score conditions at the center of a grid cell."""
+        lat, lon = self._cache.center(cell)
+        weather, marine = await asyncio.gather(
+            self._fetch(self.WEATHER_URL, lat, lon, **self.WEATHER_PARAMS),
+            self._fetch(self.MARINE_URL, lat, lon, **self.MARINE_PARAMS),
+        )
+        logging.debug(f"Marine data for {lat}, {lon}: {marine.get('current', {})}")
+        result = self._build_result(weather, marine, lat, lon)
+        # Don't let a partial upstream failure overwrite (or outlive) good data
+        if not weather or not marine:
+            raise Uncacheable(result)
+        return result
+
+    async def _evaluate_cells(self, cells: List[Tuple[int, int]]) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """Fetch and score many grid cells using Open-Meteo multi-coordinate requests."""
+        chunks = [cells[i:i + self.batch_chunk_size] for i in range(0, len(cells), self.batch_chunk_size)]
+
+        async def evaluate_chunk(chunk):
+            coords = [self._cache.center(cell) for cell in chunk]
+            weathers, marines = await asyncio.gather(
+                self._fetch_many(self.WEATHER_URL, coords, **self.WEATHER_PARAMS),
+                self._fetch_many(self.MARINE_URL, coords, **self.MARINE_PARAMS),
+            )
+            results = self._build_results(weathers, marines, coords)
+            return {
+                cell: result if weather and marine else Uncacheable(result)
+                for cell, result, weather, marine in zip(chunk, results, weathers, marines)
             }
-            
-            weather_task = self._fetch("https://api.open-meteo.com/v1/forecast", lat, lon, **weather_params)
-            marine_task = self._fetch("https://marine-api.open-meteo.com/v1/marine", lat, lon, **marine_params)
-            
-            weather, marine = await asyncio.gather(weather_task, marine_task)
-
-            # Determine day/night
-            is_day = self._is_daytime(weather)
-            time_of_day = "Day" if is_day else "Night"
-
-            # Factor checks
-            checks = [
-                self._score(weather, "current.wind_speed_10m", self.limits["wind_ms"], "Wind", "m/s"),
-                self._score(weather, "current.precipitation", self.limits["rain_mm"], "Rain", "mm", invert=True),
-                self._score(weather, "current.visibility",
-                            self.limits["visibility_m"] if is_day else self.limits["visibility_m_night"],
-                            "Visibility", "m", higher_is_better=True, scale=1),
-                self._score(marine, "current.wave_height", self.limits["wave_m"], "Wave", "m"),
-                self._score(marine, "current.swell_wave_height", self.limits["swell_m"], "Swell", "m"),
-                self._score(marine, "current.ocean_current_velocity", self.limits["current_ms"], "Current", "m/s"),
-            ]
-
-            valid_scores = [c["probability"] for c in checks if c["probability"] is not None]
-            avg_score = sum(valid_scores) / len(valid_scores) if valid_scores else 0
-
-            # If it's night, force unsafe
-            safe = avg_score >= 75 and is_day
-            status = "🟢 SAFE" if safe else "🔴 UNSAFE"
-
-            print("DEBUG: Marine Data:", marine.get("current", {}))
-
-            result = {
+
+        results = {}
+        for chunk_result in await asyncio.gather(*(evaluate_chunk(chunk) for chunk in chunks)):
+            results.update(chunk_result)
+        return results
+
+    async def _evaluate_timeline(self, cell) -> Dict[str, Any]:
+        """Fetch the hourly forecast for a grid cell: hour start times and factor values.
+
+        Scoring waits until the timeline is served, since day/night depends on the time of the request.
+        """
+        lat, lon = self._timeline_cache.center(cell)
+        weather, marine = await asyncio.gather(
+            self._fetch(self.WEATHER_URL, lat, lon, **self.HOURLY_WEATHER_PARAMS),
+            self._fetch(self.MARINE_URL, lat, lon, **self.HOURLY_MARINE_PARAMS),
+        )
+        times = weather.get("hourly", {}).get("time")
+        if not times:
+            raise RuntimeError("Hourly forecast unavailable")
+
+        payloads = {"weather": weather, "marine": marine}
+        # Open-Meteo hourly times are naive IST wall-clock times
+        offset = datetime.now(self.IST).utcoffset().total_seconds()
+        epochs = (np.array(times, dtype="datetime64[m]") - np.datetime64(0, "m")).astype(np.int64) * 60 - offset
+        forecast = {
+            "time": times,
+            "epoch": epochs.tolist(),
+            "values": {name: self._hourly_series(payloads[source], key, times).tolist()
+                       for name, _, _, source, key in FACTORS},
+        }
+        if not marine:
+            raise Uncacheable(forecast)
+        return forecast
+
+    def _score_timeline(self, cell, forecast: Dict[str, Any], hours: int) -> List[Dict[str, Any]]:
+        """Score the cached forecast's hours from the current one on, `hours` at most, in one pass."""
+        now_hour = datetime.now(self.IST).strftime("%Y-%m-%dT%H:00")
+        start = next((i for i, t in enumerate(forecast["time"]) if t >= now_hour), len(forecast["time"]))
+        times = forecast["time"][start:][:hours]
+        if not times:
+            return []
+        end = start + len(times)
+        lat, lon = self._timeline_cache.center(cell)
+        epochs = np.array(forecast["epoch"][start:end], dtype=np.float64)
+        # An hour is only daytime if it is light from its start to its end
+        is_day = solar.is_daytime(lat, lon, epochs) & solar.is_daytime(lat, lon, epochs + 3600)
+        if times[0] == now_hour:
+            # The hour under way is judged at this moment, like /fishing-alert
+            is_day[0] = self._is_daytime([(lat, lon)])[0]
+        values = {name: np.array(series[start:end], dtype=np.float64) for name, series in forecast["values"].items()}
+        scores = score_arrays(self.limits, is_day=is_day, **values)
+
+        timeline = []
+        for i, t in enumerate(times):
+            row = scores[i]
+            timeline.append({
+                "time": t,
+                "safe": bool(row["safe"]),
+                "risk_probability": float(row["risk_probability"]),
+                "time_of_day": "Day" if row["is_day"] else "Night",
+                "factors": {
+                    label: None if np.isnan(row[name]) else round(float(row[name]), 2)
+                    for name, label, _, _, _ in FACTORS
+                },
+            })
+        return timeline
+
+    def _hourly_series(self, data: Dict[str, Any], key: str, times: List[str]) -> np.ndarray:
+        """Hourly values for `key` aligned to `times`, NaN where missing."""
+        hourly = data.get("hourly", {})
+        values = hourly.get(key)
+        if not values:
+            return np.full(len(times), np.nan)
+        if hourly.get("time") == times:
+            return np.array(values, dtype=np.float64)
+        index = {t: i for i, t in enumerate(hourly.get("time", []))}
+        return np.array([values[index[t]] if t in index else None for t in times], dtype=np.float64)
+
+    def _safe_windows(self, hours: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group consecutive safe hours into departure windows."""
+        windows = []
+        current = None
+        for hour in hours:
+            if not hour["safe"]:
+                current = None
+                continue
+            if current is None:
+                current = {"start": hour["time"], "end": None, "hours": 0, "scores": []}
+                windows.append(current)
+            current["end"] = (datetime.fromisoformat(hour["time"]) + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M")
+            current["hours"] += 1
+            current["scores"].append(hour["risk_probability"])
+        for window in windows:
+            scores = window.pop("scores")
+            window["risk_probability"] = round(sum(scores) / len(scores), 2)
+        return windows
+
+    def _seconds_until_next_model_run(self) -> float:
+        """Seconds until the next forecast run should be available upstream (at least a minute)."""
+        interval = self.model_run_interval_h * 3600
+        delay = self.model_run_delay_h * 3600
+        now = time.time()
+        next_run = math.floor((now - delay) / interval + 1) * interval + delay
+        return max(60.0, next_run - now)
+
+    def _build_result(self, weather: Dict[str, Any], marine: Dict[str, Any], lat: float, lon: float) -> Dict[str, Any]:
+        """Score upstream weather and marine payloads into an alert (without a location label)."""
+        return self._build_results([weather], [marine], [(lat, lon)])[0]
+
+    def _build_results(self, weathers: List[Dict[str, Any]], marines: List[Dict[str, Any]],
+                       coords: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+        """Score many weather/marine payload pairs (taken at `coords`) in one vectorized pass."""
+        payloads = {"weather": weathers, "marine": marines}
+        values = {
+            name: np.array([self._value(p, f"current.{key}") for p in payloads[source]], dtype=np.float64)
+            for name, _, _, source, key in FACTORS
+        }
+        is_day = self._is_daytime(coords)
+        scores = score_arrays(self.limits, is_day=is_day, **values)
+        now = datetime.now(self.IST).strftime("%d-%m-%Y %H:%M IST")
+
+        results = []
+        for i, (weather, marine) in enumerate(zip(weathers, marines)):
+            row = scores[i]
+            checks = []
+            for name, label, unit, _, _ in FACTORS:
+                val = values[name][i]
+                if np.isnan(val):
+                    checks.append({"factor": label, "probability": None, "message": f"{label} data unavailable"})
+                else:
+                    score = float(row[name])
+                    msg = f"{label}: {val:.1f} {unit} (Score: {score:.0f}%)"
+                    checks.append({"factor": label, "probability": round(score, 2), "message": msg})
+
+            # If it's night, force unsafe (handled by the scoring engine)
+            safe = bool(row["safe"])
+            results.append({
                 "safe": safe,
-                "status": status,
+                "status": "🟢 SAFE" if safe else "🔴 UNSAFE",
                 "message": " | ".join([c["message"] for c in checks if c["message"]]),
                 "advice": "Good for fishing" if safe else "Stay on shore",
-                "risk_probability": round(avg_score, 2),
-                "location": location_name or f"{lat:.2f}°N, {lon:.2f}°E",
-                "time": datetime.now(self.IST).strftime("%d-%m-%Y %H:%M IST"),
-                "time_of_day": time_of_day,
+                "risk_probability": float(row["risk_probability"]),
+                "time": now,
+                "time_of_day": "Day" if row["is_day"] else "Night",
                 "data": {
                     "weather": weather.get("current", {}),
                     "marine": marine.get("current", {}),
                     "factors": checks
                 },
-            }
-            self._cache[cache_key] = {"data": result, "timestamp": time.time()}
-            return result
-        except Exception as e:
-            return self._error(str(e), location_name)
+            })
+        return results
 
     async def _fetch(self, url: str, lat: float, lon: float, **params) -> Dict[str, Any]:
         try:
             params.update({"latitude": lat, "longitude": lon, "timezone": "Asia/Kolkata"})
-            r = await self.session.get(url, params=params)
-            r.raise_for_status()
+            r = await self._upstreams[url].call(lambda: self.session.get(url, params=params))
             return r.json()
         except Exception:
             return {}
 
-    def _is_daytime(self, weather: Dict[str, Any]) -> bool:
-        """Determine if it's currently daytime using IST correctly."""
+    async def _fetch_many(self, url: str, coords: List[Tuple[float, float]], **params) -> List[Dict[str, Any]]:
+        """Fetch several locations in one request; failed or malformed responses yield `{}` per location."""
         try:
-            now_ist = datetime.now(self.IST)
-            sr = datetime.fromisoformat(weather["daily"]["sunrise"][0]).replace(tzinfo=self.IST)
-            ss = datetime.fromisoformat(weather["daily"]["sunset"][0]).replace(tzinfo=self.IST)
-            return sr <= now_ist <= ss
+            params.update({
+                "latitude": ",".join(str(lat) for lat, _ in coords),
+                "longitude": ",".join(str(lon) for _, lon in coords),
+                "timezone": "Asia/Kolkata",
+            })
+            # Batch and grid refreshes queue for a slot rather than failing after the
+            # interactive queue timeout; the concurrency limit still bounds them
+            r = await self._upstreams[url].call(lambda: self.session.get(url, params=params), wait=True)
+            data = r.json()
+            # A single location comes back as an object rather than a list
+            if isinstance(data, dict):
+                data = [data]
+            if len(data) != len(coords):
+                return [{} for _ in coords]
+            return data
         except Exception:
-            return False  # If in doubt, assume night (safety first)
+            return [{} for _ in coords]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "alert_cache": self._cache.stats(),
+            "timeline_cache": self._timeline_cache.stats(),
+            "upstreams": {u.name: u.stats() for u in self._upstreams.values()},
+        }
+
+    def _is_daytime(self, coords: List[Tuple[float, float]]) -> np.ndarray:
+        """Whether it is currently daytime at each coordinate."""
+        if len(coords) == 1:
+            # Single requests hit the per-cell memo instead of recomputing the solar position
+            return np.array([self.solar.is_daytime(*coords[0])])
+        lats, lons = np.array(coords, dtype=np.float64).reshape(-1, 2).T
+        return solar.is_daytime(lats, lons)
+
+    def _value(self, data: Dict[str, Any], path: str) -> float:
+        """Numeric value at `path`, or NaN when missing so it can go into an array."""
+        val = self._get_nested(data, path)
+        return np.nan if val is None else val
 
     def _get_nested(self, data: Dict[str, Any], path: str) -> Optional[float]:
         try:
@@ -113,7 +400,7 @@ class IndiaFishingAlerts:
 
     def _score(self, data: Dict[str, Any], path: str, limit: float, label: str, unit: str,
                invert: bool = False, higher_is_better: bool = False, scale: int = 1) -> Dict[str, Any]:
-        """Calculate probability score for a single factor."""
+        """Calculate probability score for a single factor (scalar reference for services.scoring)."""
         val = self._get_nested(data, path)
         if val is None:
             return {"factor": label, "probability": None, "message": f"{label} data unavailable"}
@@ -137,6 +424,7 @@ class IndiaFishingAlerts:
             "status": "❌ ERROR",
             "message": f"Data unavailable: {msg}",
             "advice": "Cannot assess - stay safe",
+            "risk_probability": 0,
             "location": location,
             "time": datetime.now(self.IST).strftime("%d-%m-%Y %H:%M IST"),
             "time_of_day": "Unknown",
@@ -0,0 +1,307 @@
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.answer_cache import detect_language, normalize
+from services.distress import is_distress
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INDEX_PATH = os.path.join(BACKEND_DIR, "seabot_index.json")
+
+EMERGENCY_REPLY = ("If this is an emergency, please use the Emergency SOS button on the app's Home screen "
+                   "immediately. This is the fastest way to get help.")
+
+# The SeaBot system prompt's knowledge as question/answer pairs. `screens` link an
+# entry to screens in multilingual_screenTexts.json, whose translations make the
+# entry findable (and answerable, in brief) in the user's language.
+FAQ = [
+    {"id": "sos", "screens": ["SOSScreen"],
+     "question": "How do I send an SOS or call for help in an emergency?",
+     "answer": "Press the Emergency SOS button on the Home screen, or open the SOS tab. "
+               "This is the fastest way to get help."},
+    {"id": "safety-status", "screens": [],
+     "question": "Is it safe to go fishing? What does the SAFE or UNSAFE status on the Home screen mean?",
+     "answer": "The Home screen shows SAFE or UNSAFE from wind, wave height, swell, rain, visibility and currents. "
+               "UNSAFE means one or more of these is beyond safe limits. Based on data, conditions can look "
+               "favorable, but always trust your judgment and observe the sea directly."},
+    {"id": "pfz", "screens": ["PotentialFishingZoneScreen"],
+     "question": "What is PFZ? Where are the potential fishing zones and fish-rich areas?",
+     "answer": "PFZ means Potential Fishing Zones: areas likely to be rich in fish, published by INCOIS. "
+               "Open the Maps tab to see the latest PFZ near you."},
+    {"id": "ibl", "screens": ["IBLAlertsScreen"],
+     "question": "What is IBL, the international maritime boundary line or border?",
+     "answer": "IBL is India's International Boundary Line at sea. The Maps tab shows it and SeaGuard warns you "
+               "when you get close. Never cross the IBL."},
+    {"id": "catch-record", "screens": ["CatchRecordScreen", "LogNewCatchScreen"],
+     "question": "How do I record or log my catch?",
+     "answer": "Go to Features, then Record Catch. You can add the species, weight, location and a photo, "
+               "and see your catch history."},
+    {"id": "trip-planning", "screens": ["TripPlanningScreen"],
+     "question": "How do I plan a trip? Where can I see tides, moon phases and offline maps?",
+     "answer": "Use Trip Planning. It gives tides, moon phases and offline PFZ maps, so you can plan before "
+               "you leave the coast."},
+    {"id": "news", "screens": ["NewsScreen"],
+     "question": "Where can I read the latest fishing and weather news?",
+     "answer": "Go to Features, then the News tab, for the latest news for your area."},
+    {"id": "compass", "screens": ["CompassScreen"],
+     "question": "Where is the compass?",
+     "answer": "The compass is on the Home screen."},
+    {"id": "fishing-advice", "screens": ["FishingOptimizationHub", "FishingNetsGuide", "FishingGears",
+                                         "BaitSelection"],
+     "question": "Which nets, gear and bait should I use, at what depth and time?",
+     "answer": "Tell me your fishing style, target fish and location, and I can suggest nets, gear, bait, depth "
+               "and the best time. The Fishing Optimization hub in Features has guides for nets, gear and bait."},
+    {"id": "medical", "screens": [],
+     "question": "Someone is sick or hurt. What medicine or treatment should I give?",
+     "answer": "I cannot give medical advice. Please contact a doctor or emergency services. "
+               "At sea, use the Emergency SOS button on the Home screen."},
+    {"id": "seabot", "screens": ["ChatScreen"],
+     "question": "Who are you? What can SeaBot help with?",
+     "answer": "I am SeaBot, the maritime expert for SeaGuard. I can explain the safety status, PFZ and IBL on "
+               "the Maps tab, app features, and suggest nets, gear, bait and fishing times."},
+]
+
+STOPWORDS = set("""
+a an the is are was were be been am do does did i me my we our you your it its this that these those to of in on
+at by for from with about as and or but if so can could should would will shall may might must what which who
+whom whose when where why how there here tell please any some get got use using want need know give show
+""".split())
+
+_LATIN = re.compile(r"^[a-z0-9]+$")
+
+
+def _humanize(value: Any) -> str:
+    if isinstance(value, list):
+        return ", ".join(_humanize(v) for v in value)
+    return str(value).replace("_", " ")
+
+
+def _stem(word: str) -> str:
+    """Crude suffix folding: English plurals and -ing, and Indic inflections (which are suffixes)."""
+    if _LATIN.match(word):
+        for suffix in ("ing", "es", "s"):
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                return word[:-len(suffix)]
+        return word
+    return word[:5]
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(w) for w in normalize(text).split() if w not in STOPWORDS and len(w) > 1]
+
+
+def _screen_strings(value: Any) -> List[str]:
+    if isinstance(value, dict):
+        return [s for v in value.values() for s in _screen_strings(v)]
+    text = str(value).strip()
+    # Skip single letters (compass points), units and format strings
+    return [text] if len(text) > 2 and any(c.isalpha() for c in text) else []
+
+
+def _screen_answers(screen: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    answers = {}
+    for language, texts in screen.items():
+        strings = list(dict.fromkeys(_screen_strings({k: v for k, v in texts.items() if k != "title"})))[:20]
+        title = texts.get("title", "")
+        if language == "en":
+            answers[language] = f"Open {title} in the SeaGuard app. It has: {', '.join(strings)}."
+        else:
+            answers[language] = f"{title}: {', '.join(strings)}"
+    return answers
+
+
+def build_passages(fishinfo: Dict[str, Any], screen_texts: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Answerable passages: {"id", "source", "answers": {language: text}, "terms": search text}."""
+    passages = []
+    linked = set()
+    for entry in FAQ:
+        answers = {"en": entry["answer"]}
+        terms = [entry["question"], entry["answer"]]
+        for name in entry["screens"]:
+            linked.add(name)
+            for language, text in _screen_answers(screen_texts.get(name, {})).items():
+                terms.append(text)
+                if language != "en":
+                    answers.setdefault(language, text)
+        passages.append({"id": f"faq:{entry['id']}", "source": "faq", "answers": answers, "terms": " ".join(terms)})
+
+    for name, screen in screen_texts.items():
+        # The home screen is mostly weather code labels, which would match every weather question
+        if name in linked or name == "HomeScreen":
+            continue
+        answers = _screen_answers(screen)
+        passages.append({"id": f"screen:{name}", "source": "screens", "answers": answers,
+                         "terms": " ".join(answers.values())})
+
+    def add(passage_id: str, text: str, name: str = ""):
+        # The name is repeated in the search terms so questions naming the subject rank it first
+        passages.append({"id": passage_id, "source": "fishinfo", "answers": {"en": text}, "terms": f"{name} {text}"})
+
+    info = fishinfo.get("fishingRecommendations", fishinfo)
+    for key, fish in info.get("targetFish", {}).items():
+        text = (f"To catch {fish['name']}: best season {_humanize(fish['bestSeasons'])}, best time "
+                f"{_humanize(fish['timeOfDay'])}, depth {fish['preferredDepth']}. Bait: {_humanize(fish['bestBait'])}. "
+                f"Nets: {_humanize(fish['recommendedNets'])}. Found in: {_humanize(fish['bestLocations'])}.")
+        add(f"fish:{key}", text, f"{fish['name']} fish")
+    for key, net in info.get("nets", {}).items():
+        text = (f"{net['name']} ({_humanize(net['type']).lower()}): best for {_humanize(net['bestFor'])}, "
+                f"depth {net['depth']}, mesh size {net['meshSize']}. Needs a {_humanize(net['vesselRequired'])}. "
+                f"Cost {_humanize(net['cost'])}, efficiency {_humanize(net['efficiency'])}.")
+        add(f"net:{key}", text, net['name'])
+    for key, item in info.get("equipment", {}).items():
+        text = (f"{item['name']} ({_humanize(item['type']).lower()} equipment): good for {_humanize(item['bestFor'])}. "
+                f"Price range {item['priceRange']}.")
+        add(f"equipment:{key}", text, item['name'])
+    for key, bait in info.get("bait", {}).items():
+        text = (f"{bait['name']} as bait ({_humanize(bait['type'])}): best for {_humanize(bait['bestFor'])}. "
+                f"Get it at {_humanize(bait['availability'])}, keep it with {_humanize(bait['preservation'])}.")
+        add(f"bait:{key}", text, bait['name'])
+    for key, place in info.get("locations", {}).items():
+        text = (f"{place['name']} ({place['region']}): {place['characteristics']}, usually "
+                f"{_humanize(place['fishingConditions'])}. Best fish: {_humanize(place['bestFish'])}. "
+                f"Best seasons: {_humanize(place['bestSeasons'])}. Water {place['waterTemperature']}, "
+                f"fish at {place['recommendedDepth']}.")
+        add(f"location:{key}", text, place['name'])
+    for key, style in info.get("fishingStyles", {}).items():
+        text = (f"{style['name']}: {style['description']}. Nets: {_humanize(style['preferredNets'])}. "
+                f"Equipment: {_humanize(style['equipment'])}. Vessel: {_humanize(style['vesselType'])}.")
+        add(f"style:{key}", text, style['name'])
+    for i, item in enumerate(info.get("recommendations", [])):
+        rec = item["recommendation"]
+        text = (f"For {_humanize(item['fishingStyle'])} fishing of {_humanize(item['targetFish'])} in "
+                f"{_humanize(item['location'])}: use {_humanize(rec['nets'])} with {_humanize(rec['bait'])} bait, "
+                f"at {rec['depth']} in the {_humanize(rec['bestTime'])}, in {_humanize(rec['season'])}. "
+                f"Tips: {'. '.join(rec['tips'])}.")
+        add(f"recommendation:{i}", text)
+    return passages
+
+
+def build_index(passages: List[Dict[str, Any]], k1: float = 1.2, b: float = 0.75) -> Dict[str, Any]:
+    """Okapi BM25 inverted index over the passages' terms, as a JSON-serializable dict."""
+    lengths, postings = [], {}
+    for doc, passage in enumerate(passages):
+        counts = Counter(tokenize(passage["terms"]))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append([doc, tf])
+    n = len(passages)
+    idf = {term: round(math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)), 4) for term, p in postings.items()}
+    return {
+        "version": 1,
+        "k1": k1,
+        "b": b,
+        "avgdl": sum(lengths) / max(1, n),
+        "lengths": lengths,
+        "passages": [{"id": p["id"], "source": p["source"], "answers": p["answers"]} for p in passages],
+        "postings": postings,
+        "idf": idf,
+    }
+
+
+class LocalAnswers:
+    """Retrieval-based SeaBot answers from the app's own content, with no network or model.
+
+    Questions are matched against a precomputed BM25 index (see `build_index`,
+    or `python -m services.local_answers build`) of the system prompt
+    knowledge as FAQ entries, fishinfo.json, and the multilingual screen texts.
+    A passage is only returned when it scores at least `min_score` and covers
+    at least `min_coverage` of the question's terms, so unrelated questions
+    still go to the model. Emergencies always get the SOS instruction.
+    """
+
+    def __init__(self, index: Dict[str, Any], min_score: float = 3.0, min_coverage: float = 0.6):
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        self._k1 = index["k1"]
+        self._b = index["b"]
+        self._avgdl = index["avgdl"]
+        self._lengths = index["lengths"]
+        self._passages = index["passages"]
+        self._idf = index["idf"]
+        self._postings = {term: [tuple(p) for p in postings] for term, postings in index["postings"].items()}
+        self.questions = 0
+        self.answered = 0
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH, **kwargs) -> "LocalAnswers":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def search(self, question: str, limit: int = 3) -> List[Tuple[float, float, Dict[str, Any]]]:
+        """Best passages as (BM25 score, fraction of question terms matched, passage)."""
+        terms = set(tokenize(question))
+        if not terms:
+            return []
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self._postings[term]:
+                norm = self._k1 * (1 - self._b + self._b * self._lengths[doc] / self._avgdl)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (self._k1 + 1) / (tf + norm)
+                matched[doc] = matched.get(doc, 0) + 1
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return [(scores[doc], matched[doc] / len(terms), self._passages[doc]) for doc in best]
+
+    def answer(self, question: str, language: Optional[str] = None) -> Optional[str]:
+        """A local answer in the question's language (else English), or None when nothing matches well."""
+        self.questions += 1
+        if is_distress(question):
+            self.answered += 1
+            return EMERGENCY_REPLY
+        for score, coverage, passage in self.search(question, limit=1):
+            if score >= self.min_score and coverage >= self.min_coverage:
+                self.answered += 1
+                language = (language or detect_language(question)).lower()
+                return passage["answers"].get(language) or passage["answers"]["en"]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"passages": len(self._passages), "terms": len(self._idf), "questions": self.questions,
+                "answered": self.answered}
+
+
+def main():
+    """python -m services.local_answers build | ask QUESTION..."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the offline SeaBot answer index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Rebuild the index from the app content")
+    build.add_argument("--fishinfo", default=os.path.join(BACKEND_DIR, "..", "frontend", "assets", "fishinfo.json"))
+    build.add_argument("--screen-texts", default=os.path.join(BACKEND_DIR, "multilingual_screenTexts.json"))
+    build.add_argument("--output", default=DEFAULT_INDEX_PATH)
+    ask = commands.add_parser("ask", help="Answer questions from the index, with match scores")
+    ask.add_argument("questions", nargs="+")
+    ask.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with open(args.fishinfo, encoding="utf-8") as f:
+            fishinfo = json.load(f)
+        with open(args.screen_texts, encoding="utf-8") as f:
+            screen_texts = json.load(f)
+        index = build_index(build_passages(fishinfo, screen_texts))
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+        print(f"Indexed {len(index['passages'])} passages, {len(index['idf'])} terms -> {args.output}")
+        return
+
+    engine = LocalAnswers.load(args.index)
+    for question in args.questions:
+        started = time.perf_counter()
+        answer = engine.answer(question)
+        elapsed = (time.perf_counter() - started) * 1000
+        hits = ", ".join(f"{p['id']} {score:.1f}/{coverage:.0%}" for score, coverage, p in engine.search(question))
+        print(f"Q: {question}\n   [{elapsed:.2f} ms] {hits or 'no match'}\nA: {answer}", file=sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
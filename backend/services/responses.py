@@ -0,0 +1,90 @@
+import gzip
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip is offered without it
+    brotli = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, or None for identity."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+class ResponseEncoder:
+    """Serializes and compresses JSON bodies, memoizing the bytes for shared cached objects.
+
+    Cache hits hand out the same result object to every caller, so its encoded
+    bytes are kept in a small LRU keyed on (key, encoding) and reused until
+    the cache replaces the object.
+    """
+
+    def __init__(self, max_entries: int = 4096, min_compress_size: int = 512):
+        self.max_entries = max_entries
+        self.min_compress_size = min_compress_size
+        self._encoded: "OrderedDict[Tuple[Hashable, Optional[str]], Tuple[Any, bytes, Optional[str]]]" = OrderedDict()
+
+    def response(self, obj: Any, accept_encoding: str = "", key: Optional[Hashable] = None,
+                 transform: Optional[Callable[[Any], Any]] = None) -> Response:
+        """JSON response for `obj` (after `transform`), compressed as the client allows.
+
+        Pass `key` only for long-lived shared objects; the memo is checked by
+        identity so a replaced cache entry is never served stale bytes.
+        """
+        encoding = negotiate_encoding(accept_encoding)
+        entry = self._encoded.get((key, encoding)) if key is not None else None
+        if entry is not None and entry[0] is obj:
+            self._encoded.move_to_end((key, encoding))
+            _, body, used = entry
+        else:
+            body = dumps(transform(obj) if transform else obj)
+            used = encoding if len(body) >= self.min_compress_size else None
+            body = compress(body, used)
+            if key is not None:
+                self._encoded[(key, encoding)] = (obj, body, used)
+                if len(self._encoded) > self.max_entries:
+                    self._encoded.popitem(last=False)
+
+        headers = {"Vary": "Accept-Encoding"}
+        if used:
+            headers["Content-Encoding"] = used
+        return Response(content=body, media_type="application/json", headers=headers)
@@ -1,45 +1,154 @@
+import asyncio
+import logging
+import os
+import time
 import httpx
 import xml.etree.ElementTree as ET
 import html
 import re
 from datetime import datetime
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import HTTPException
 
+from services.cache import GridCache, SqliteStore, Uncacheable
+from services.upstream import Upstream, UpstreamUnavailable
+
 class RssService:
-    def __init__(self):
-        self.NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
-        self.GOOGLE_RSS_URL = "https://news.google.com/rss/search"
+    def __init__(self, httpx_client: httpx.AsyncClient, grid_deg: float = 0.1, geocode_ttl: float = 30 * 86400,
+                 geocode_max_entries: int = 50000, cache_store: Optional[SqliteStore] = None,
+                 nominatim_max_concurrency: int = 4, rss_max_concurrency: int = 16,
+                 breaker_failure_threshold: int = 5, breaker_reset_timeout: float = 30,
+                 feed_ttl: float = 600, feed_stale_ttl: float = 86400, feed_max_entries: int = 2000,
+                 warm_top_n: int = 20, warm_places: Optional[List[str]] = None):
+        # Shared, pooled client: keep-alive (and HTTP/2 when h2 is installed) instead of
+        # a fresh TCP/TLS handshake to Nominatim and Google on every request
+        self.session = httpx_client
+        self.NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/reverse")
+        self.GOOGLE_RSS_URL = os.getenv("GOOGLE_NEWS_RSS_URL", "https://news.google.com/rss/search")
         self.HEADERS = {"User-Agent": "SeaGuardRssService/1.0"}
+        # Place names per grid cell: coastlines don't move, so these keep for weeks.
+        # The optional store shares them between workers and across restarts.
+        self._places = GridCache(grid_deg=grid_deg, ttl=geocode_ttl, max_entries=geocode_max_entries,
+                                 max_bytes=8 * 1024 * 1024, store=cache_store, namespace="rss-geocode")
+        # Nominatim's usage policy allows about one request per second, so keep its concurrency low
+        self._nominatim = Upstream("nominatim", max_concurrency=nominatim_max_concurrency,
+                                   failure_threshold=breaker_failure_threshold, reset_timeout=breaker_reset_timeout)
+        self._google_rss = Upstream("google-news-rss", max_concurrency=rss_max_concurrency,
+                                    failure_threshold=breaker_failure_threshold, reset_timeout=breaker_reset_timeout)
+        # Improved search query for more relevant, safety-oriented news; built once, only the place varies
+        search_terms = ["fishing", "coastal", "maritime", "weather", "cyclone", "tsunami", "coast guard", "flood", "storm", "sea conditions"]
+        self._query_terms = f"({ ' OR '.join(search_terms) })"
+        # Parsed feeds per resolved place ("" is the national feed), with the upstream's
+        # ETag/Last-Modified so expired entries are revalidated with a conditional GET.
+        # Every boat in a harbour shares one entry; stale ones are served during refreshes and outages.
+        self._feeds = GridCache(ttl=feed_ttl, stale_ttl=feed_stale_ttl, max_entries=feed_max_entries,
+                                max_bytes=32 * 1024 * 1024, store=cache_store, namespace="rss-feed")
+        # The most requested places (plus any configured ones) are refreshed in the background
+        self.warm_top_n = warm_top_n
+        self.warm_places = list(warm_places or [])
+        self.refresh_interval = feed_ttl * 0.8
+        self._demand: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+        self.revalidated = 0
+        self.refetched = 0
 
-    async def _reverse_place(self, lat: float, lon: float) -> str:
-        """Converts latitude and longitude to a place name using Nominatim."""
-        async with httpx.AsyncClient(timeout=10.0, headers=self.HEADERS) as client:
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
             try:
-                response = await client.get(
-                    self.NOMINATIM_URL,
-                    params={"format": "json", "lat": lat, "lon": lon, "zoom": 10, "addressdetails": 1}
-                )
-                response.raise_for_status()
-                address = response.json().get("address", {})
-                # Prioritize more specific location names
-                for key in ("town", "city", "county", "state_district", "state", "region"):
-                    if address.get(key):
-                        return address[key]
-                return ""
-            except httpx.HTTPStatusError:
-                # Log this error in a real app
-                return ""
-            except Exception:
-                # General exception, log this too
-                return ""
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _reverse_place(self, lat: float, lon: float) -> str:
+        """Converts latitude and longitude to a place name using Nominatim, cached per grid cell."""
+        cell = self._places.cell(lat, lon)
+        return await self._places.get_or_load(cell, lambda: self._lookup_place(*self._places.center(cell)))
+
+    async def _lookup_place(self, lat: float, lon: float) -> str:
+        try:
+            response = await self._nominatim.call(lambda: self.session.get(
+                self.NOMINATIM_URL,
+                params={"format": "json", "lat": lat, "lon": lon, "zoom": 10, "addressdetails": 1},
+                headers=self.HEADERS,
+                timeout=10.0,
+            ))
+            address = response.json().get("address", {})
+        except Exception:
+            # Fall back to national news this time, but look the cell up again next request
+            raise Uncacheable("")
+        # Prioritize more specific location names
+        for key in ("town", "city", "county", "state_district", "state", "region"):
+            if address.get(key):
+                return address[key]
+        # Open sea: no address, and that won't change either
+        return ""
 
-    async def _fetch_google_rss(self, query: str):
-        """Fetches the Google News RSS feed for a given query."""
+    async def _fetch_google_rss(self, query: str, etag: Optional[str] = None,
+                                last_modified: Optional[str] = None) -> Optional[httpx.Response]:
+        """Fetches the Google News RSS feed for a given query; None if unchanged since `etag`/`last_modified`."""
         params = {"q": query, "hl": "en-IN", "gl": "IN", "ceid": "IN:en"}
-        async with httpx.AsyncClient(timeout=15.0, headers=self.HEADERS) as client:
-            response = await client.get(self.GOOGLE_RSS_URL, params=params)
-            response.raise_for_status()  # Will raise HTTPError for 4xx/5xx
-            return response.text
+        headers = dict(self.HEADERS)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            return await self._google_rss.call(lambda: self.session.get(
+                self.GOOGLE_RSS_URL, params=params, headers=headers, timeout=15.0))
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 304:
+                return None
+            raise
+
+    async def _load_feed(self, place: str) -> Dict[str, Any]:
+        """Cache entry for `place`: the parsed feed plus its validators, revalidating any previous entry."""
+        previous = self._feeds.peek(place)
+        query = f"{self._query_terms} AND \"{place or 'India'}\""
+        if previous is not None:
+            response = await self._fetch_google_rss(query, previous["etag"], previous["last_modified"])
+            if response is None:
+                self.revalidated += 1
+                # Same object, so encoded response bytes memoized for it stay valid
+                return previous
+        else:
+            response = await self._fetch_google_rss(query)
+        self.refetched += 1
+        feed_display_title = f"{place} Area News" if place else "India Coastal & Fishing News"
+        return {
+            "feed": self._parse_rss_to_json(response.text, feed_title=feed_display_title),
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            started = time.monotonic()
+            places = list(dict.fromkeys(self.warm_places + [p for p, _ in self._demand.most_common(self.warm_top_n)]))
+            # Halve counts each round so the set follows current demand; keep the counter bounded
+            self._demand = Counter({p: n // 2 for p, n in self._demand.most_common(self.warm_top_n * 4) if n > 1})
+            results = await asyncio.gather(*(self._refresh(p) for p in places), return_exceptions=True)
+            failed = sum(isinstance(r, Exception) for r in results)
+            logging.info(f"News feeds refreshed for {len(places)} places in {time.monotonic() - started:.1f}s "
+                         f"({failed} failed)")
+
+    async def _refresh(self, place: str):
+        self._feeds.put(place, await self._load_feed(place))
+
+    def stats(self):
+        return {
+            "geocode_cache": self._places.stats(),
+            "feed_cache": {**self._feeds.stats(), "revalidated": self.revalidated, "refetched": self.refetched},
+            "warm_places": min(self.warm_top_n, len(self._demand)) + len(self.warm_places),
+            "upstreams": {u.name: u.stats() for u in (self._nominatim, self._google_rss)},
+        }
 
     def _clean_html(self, s: str) -> str:
         """Removes HTML tags and cleans up whitespace."""
@@ -87,25 +196,22 @@ class RssService:
             # Log this error in a real app
             raise HTTPException(status_code=500, detail="Failed to parse RSS feed XML.")
 
-    async def get_news(self, lat: float, lon: float):
-        """
-        Main method to get fishing and coastal news.
-        It finds the place from lat/lon, builds a query, fetches, and parses the RSS feed.
-        """
+    async def get_feed(self, lat: float, lon: float) -> Tuple[str, Dict[str, Any]]:
+        """(resolved place, feed) for a location. The feed object is shared by every caller for that place."""
         place = await self._reverse_place(lat, lon)
-        
-        # Improved search query for more relevant, safety-oriented news
-        search_terms = ["fishing", "coastal", "maritime", "weather", "cyclone", "tsunami", "coast guard", "flood", "storm", "sea conditions"]
-        if place:
-            query = f"({ ' OR '.join(search_terms) }) AND \"{place}\""
-        else:
-            query = f"({ ' OR '.join(search_terms) }) AND \"India\""
-
+        self._demand[place] += 1
         try:
-            xml_content = await self._fetch_google_rss(query)
+            entry = await self._feeds.get_or_load(place, lambda: self._load_feed(place))
+        except UpstreamUnavailable as e:
+            raise HTTPException(status_code=503, detail=f"News feed temporarily unavailable: {e}")
         except httpx.HTTPError as e:
             raise HTTPException(status_code=502, detail=f"Failed to fetch news feed from upstream source: {e}")
+        return place, entry["feed"]
 
-        feed_display_title = f"{place} Area News" if place else "India Coastal & Fishing News"
-        data = self._parse_rss_to_json(xml_content, feed_title=feed_display_title)
-        return data
+    async def get_news(self, lat: float, lon: float):
+        """
+        Main method to get fishing and coastal news.
+        It finds the place from lat/lon and returns its feed, fetched and parsed from Google News RSS
+        at most once per feed TTL and revalidated with a conditional GET after that.
+        """
+        return (await self.get_feed(lat, lon))[1]
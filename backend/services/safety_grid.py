@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from services.fishing_alerts import IndiaFishingAlerts
+
+
+class CoastalSafetyGrid:
+    """Precomputed conditions over Indian coastal waters, refreshed in the background.
+
+    Upstream weather and marine values are held as NumPy arrays on a regular
+    lat/lon grid. Lookups are O(1) with bilinear interpolation and are scored
+    with the same factors and limits as `IndiaFishingAlerts`, so `/fishing-alert`
+    never waits on Open-Meteo while the grid is fresh.
+    """
+
+    # Categorical or circular fields: taken from the nearest node instead of blended
+    NEAREST = {"weather_code", "wave_direction"}
+
+    def __init__(self, alerts: IndiaFishingAlerts, lat_range: Tuple[float, float] = (6.0, 24.0),
+                 lon_range: Tuple[float, float] = (67.0, 93.0), resolution: float = 0.25,
+                 refresh_interval: int = 900, max_concurrency: int = 4):
+        self.alerts = alerts
+        # field name -> (payload, key in the upstream `current` block); every field the live
+        # path returns, so grid and live responses have the same shape
+        self.FIELDS = {
+            key: (source, key)
+            for source, params in (("weather", alerts.WEATHER_PARAMS), ("marine", alerts.MARINE_PARAMS))
+            for key in params["current"].split(",")
+        }
+        self.resolution = resolution
+        self.refresh_interval = refresh_interval
+        # Past this age the grid is considered stale and requests fall back to live fetches
+        self.max_age = refresh_interval * 3
+        self.max_concurrency = max_concurrency
+        self.lats = np.arange(lat_range[0], lat_range[1] + resolution / 2, resolution)
+        self.lons = np.arange(lon_range[0], lon_range[1] + resolution / 2, resolution)
+        self.fields: Dict[str, np.ndarray] = {}
+        self.updated_at = 0.0
+        # Points where the marine model has no data (land); learned on the first refresh of each day
+        self._sea_mask: Optional[np.ndarray] = None
+        self._sea_mask_day = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_fresh(self) -> bool:
+        return bool(self.fields) and (time.time() - self.updated_at) < self.max_age
+
+    def get_alerts(self, lat: float, lon: float, location_name: str = "") -> Optional[Dict[str, Any]]:
+        """Score a point from the in-memory grid, or return None if the grid cannot answer."""
+        sample = self.sample(lat, lon)
+        if sample is None:
+            return None
+        weather, marine = sample
+        result = self.alerts._build_result(weather, marine, lat, lon)
+        result["location"] = location_name or f"{lat:.2f}°N, {lon:.2f}°E"
+        return result
+
+    def sample(self, lat: float, lon: float) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Bilinearly interpolate the grid at a point into weather/marine payloads.
+
+        Missing corners (NaN) are dropped and the remaining weights renormalized.
+        Returns None when the grid is stale, the point is outside it, or no
+        marine data surrounds it (i.e. inland).
+        """
+        if not self.is_fresh():
+            return None
+        fi = (lat - self.lats[0]) / self.resolution
+        fj = (lon - self.lons[0]) / self.resolution
+        if not (0 <= fi <= len(self.lats) - 1 and 0 <= fj <= len(self.lons) - 1):
+            return None
+        i0 = min(int(fi), len(self.lats) - 2)
+        j0 = min(int(fj), len(self.lons) - 2)
+        ti, tj = fi - i0, fj - j0
+        weights = np.array([(1 - ti) * (1 - tj), (1 - ti) * tj, ti * (1 - tj), ti * tj])
+
+        payloads = {"weather": {"current": {}}, "marine": {"current": {}}}
+        for name, (source, key) in self.FIELDS.items():
+            if name in self.NEAREST:
+                value = self._nearest(self.fields[name], i0, j0, weights)
+                payloads[source]["current"][key] = None if value is None else int(value)
+            else:
+                value = self._interpolate(self.fields[name], i0, j0, weights)
+                payloads[source]["current"][key] = None if value is None else round(value, 2)
+        if all(v is None for v in payloads["marine"]["current"].values()):
+            return None
+        return payloads["weather"], payloads["marine"]
+
+    async def refresh(self):
+        """Fetch the whole grid through multi-coordinate Open-Meteo requests and swap it in."""
+        shape = (len(self.lats), len(self.lons))
+        lat_grid, lon_grid = np.meshgrid(self.lats, self.lons, indexing="ij")
+        today = datetime.now(self.alerts.IST).date()
+        if self._sea_mask_day != today:
+            self._sea_mask = None
+        mask = self._sea_mask if self._sea_mask is not None else np.ones(shape, dtype=bool)
+        idx = np.flatnonzero(mask)
+        coords = [(round(float(lat_grid.flat[k]), 4), round(float(lon_grid.flat[k]), 4)) for k in idx]
+
+        chunk_size = self.alerts.batch_chunk_size
+        chunks = [(idx[i:i + chunk_size], coords[i:i + chunk_size]) for i in range(0, len(coords), chunk_size)]
+        fields = {name: np.full(shape, np.nan) for name in self.FIELDS}
+        marine_failed = np.zeros(shape, dtype=bool)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch_chunk(chunk_idx, chunk_coords):
+            async with semaphore:
+                weathers, marines = await asyncio.gather(
+                    self.alerts._fetch_many(self.alerts.WEATHER_URL, chunk_coords, **self.alerts.WEATHER_PARAMS),
+                    self.alerts._fetch_many(self.alerts.MARINE_URL, chunk_coords, **self.alerts.MARINE_PARAMS),
+                )
+            for k, weather, marine in zip(chunk_idx, weathers, marines):
+                marine_failed.flat[k] = not marine
+                payloads = {"weather": weather, "marine": marine}
+                for name, (source, key) in self.FIELDS.items():
+                    value = payloads[source].get("current", {}).get(key)
+                    if value is not None:
+                        fields[name].flat[k] = value
+
+        await asyncio.gather(*(fetch_chunk(i, c) for i, c in chunks))
+
+        if np.isnan(fields["wind_speed_10m"]).all():
+            raise RuntimeError("No grid points returned weather data")
+        if self._sea_mask is None:
+            # Failed requests say nothing about land vs sea, so keep those points
+            self._sea_mask = ~np.isnan(fields["wave_height"]) | marine_failed
+            self._sea_mask_day = today
+        self.fields = fields
+        self.updated_at = time.time()
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.refresh()
+                logging.info(f"Safety grid refreshed in {time.monotonic() - started:.1f}s "
+                             f"({int(self._sea_mask.sum())} sea points)")
+            except Exception as e:
+                logging.error(f"Safety grid refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def _nearest(self, field: np.ndarray, i0: int, j0: int, weights: np.ndarray) -> Optional[float]:
+        corners = field[i0:i0 + 2, j0:j0 + 2].ravel()
+        valid = ~np.isnan(corners)
+        if not valid.any():
+            return None
+        return float(corners[np.argmax(np.where(valid, weights, -1))])
+
+    def _interpolate(self, field: np.ndarray, i0: int, j0: int, weights: np.ndarray) -> Optional[float]:
+        corners = field[i0:i0 + 2, j0:j0 + 2].ravel()
+        valid = ~np.isnan(corners)
+        if not valid.any():
+            return None
+        total = weights[valid].sum()
+        if total <= 0:
+            # Sitting exactly on a missing node: fall back to the valid neighbours
+            return float(corners[valid].mean())
+        return float((corners[valid] * weights[valid]).sum() / total)
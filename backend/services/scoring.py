@@ -0,0 +1,75 @@
+"""
+Vectorized safety scoring.
+
+Scores whole arrays of upstream values against `IndiaFishingAlerts.limits` in
+one pass, with the same formulas as `IndiaFishingAlerts._score`. Missing values
+are NaN in and NaN out, and are left out of the average like `None` in the
+scalar path.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+# (field, label, unit, payload, key in the upstream `current` block)
+FACTORS = [
+    ("wind", "Wind", "m/s", "weather", "wind_speed_10m"),
+    ("rain", "Rain", "mm", "weather", "precipitation"),
+    ("visibility", "Visibility", "m", "weather", "visibility"),
+    ("wave", "Wave", "m", "marine", "wave_height"),
+    ("swell", "Swell", "m", "marine", "swell_wave_height"),
+    ("current", "Current", "m/s", "marine", "ocean_current_velocity"),
+]
+
+SCORE_DTYPE = np.dtype(
+    [(name, "f8") for name, *_ in FACTORS]
+    + [("risk_probability", "f8"), ("is_day", "?"), ("safe", "?")]
+)
+
+
+def score_arrays(limits: Dict[str, float], wind, rain, visibility, wave, swell, current,
+                 is_day) -> np.ndarray:
+    """Score factor arrays (any matching shape) and return a SCORE_DTYPE structured array.
+
+    Factor fields hold unrounded scores; `risk_probability` is the mean of the
+    2-decimal rounded scores, as in the scalar path. Night is always unsafe.
+    """
+    values = np.stack(np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (wind, rain, visibility, wave, swell, current)),
+        np.asarray(is_day, dtype=np.float64),
+    ), axis=-1)
+    is_day = values[..., -1] != 0
+    values = values[..., :-1]
+
+    limit = np.array([limits["wind_ms"], limits["rain_mm"], limits["visibility_m"],
+                      limits["wave_m"], limits["swell_m"], limits["current_ms"]], dtype=np.float64)
+    ratio = (values / limit) * 100
+    # Visibility is the only higher-is-better factor, and its limit depends on day/night
+    ratio[..., 2] = (values[..., 2] / np.where(is_day, limits["visibility_m"], limits["visibility_m_night"])) * 100
+    # np.maximum / np.minimum propagate NaN, so missing values stay missing
+    scores = np.maximum(0, 100 - ratio)
+    scores[..., 2] = np.minimum(100, ratio[..., 2])
+
+    rounded = _round2(scores)
+    valid = ~np.isnan(rounded)
+    count = valid.sum(axis=-1)
+    total = np.where(valid, rounded, 0).sum(axis=-1)
+    avg = np.divide(total, count, out=np.zeros(count.shape), where=count > 0)
+
+    out = np.empty(count.shape, dtype=SCORE_DTYPE)
+    for i, (name, *_) in enumerate(FACTORS):
+        out[name] = scores[..., i]
+    out["risk_probability"] = _round2(avg)
+    out["is_day"] = is_day
+    out["safe"] = (avg >= 75) & is_day
+    return out
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """np.round(values, 2), but matching Python's correctly rounded round() on near-ties."""
+    out = np.array(np.round(values, 2), dtype=np.float64)
+    scaled = values * 100
+    near_tie = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+    if near_tie.any():
+        out[near_tie] = [round(float(v), 2) for v in values[near_tie]]
+    return out
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream was not called: its circuit is open or its concurrency limit is saturated."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Opens after `failure_threshold` failures in a row and rejects calls until
+    `reset_timeout` seconds have passed, then lets a single probe through
+    (half-open). A successful probe closes the circuit, a failed one reopens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            return True
+        # Open, or half-open with the probe already in flight
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            logging.info(f"Circuit for {self.name} closed")
+        self.state = "closed"
+        self.failures = 0
+
+    def release_probe(self):
+        """The half-open probe was never sent; let the next call probe instead."""
+        if self.state == "half_open":
+            self.state = "open"
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logging.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """Circuit breaker plus bounded concurrency for one upstream service."""
+
+    def __init__(self, name: str, max_concurrency: int = 16, queue_timeout: float = 2.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.rejected = 0
+
+    async def call(self, request: Callable[[], Awaitable[httpx.Response]],
+                   wait: bool = False) -> httpx.Response:
+        """Run `request` if the circuit allows it, raising for error statuses.
+
+        Timeouts, transport errors, 429 and 5xx count as failures; other 4xx
+        responses mean the upstream is healthy and are raised without tripping it.
+        Waiting for a concurrency slot is bounded by `queue_timeout`, unless `wait`
+        is set (batch and background work that should queue, not fail).
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise UpstreamUnavailable(f"{self.name} circuit open")
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), None if wait else self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Our own saturation, not an upstream failure: don't count it against the upstream
+            self.rejected += 1
+            self.breaker.release_probe()
+            raise UpstreamUnavailable(f"{self.name} concurrency limit reached")
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+
+        try:
+            response = await request()
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            if status == 429 or status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (e.g. a background refresh stopped at shutdown): no verdict on the upstream
+            self.breaker.release_probe()
+            raise
+        finally:
+            self._semaphore.release()
+        self.breaker.record_success()
+        return response
+
+    def stats(self):
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionController, Overloaded
+
+
+def test_admits_up_to_limit_then_queues_round_robin():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, per_user_limit=3, queue_timeout=5)
+        await admission.acquire("a")
+        order = []
+
+        async def wait(user):
+            await admission.acquire(user)
+            order.append(user)
+
+        waiters = [asyncio.ensure_future(wait(u)) for u in ("a", "a", "b")]
+        await asyncio.sleep(0)
+        assert admission.stats()["queued"] == 3
+        for _ in range(3):
+            admission.release(order[-1] if order else "a")
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        assert order == ["a", "b", "a"]
+
+    asyncio.run(run())
+
+
+def test_rejects_user_limit_and_full_queue():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=1, per_user_limit=1, queue_timeout=5)
+        await admission.acquire("a")
+        with pytest.raises(Overloaded):
+            await admission.acquire("a")
+        waiter = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await admission.acquire("c")
+        assert admission.rejected == {"user_limit": 1, "queue_full": 1, "timeout": 0}
+        admission.release("a")
+        await waiter
+
+    asyncio.run(run())
+
+
+def test_timeout_gives_back_the_queue_place():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, queue_timeout=0.01)
+        await admission.acquire("a")
+        with pytest.raises(Overloaded):
+            await admission.acquire("b")
+        assert admission.stats()["queued"] == 0 and "b" not in admission._per_user
+        admission.release("a")
+        assert admission.stats()["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_admitted_in_the_same_tick_as_the_timeout_keeps_the_slot(monkeypatch):
+    async def run():
+        admission = AdmissionController(max_in_flight=1, queue_timeout=5)
+        await admission.acquire("a")
+
+        async def admitted_at_deadline(awaitable, timeout):
+            # The slot frees up just as the wait times out
+            awaitable.cancel()
+            admission.release("a")
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr("services.admission.asyncio.wait_for", admitted_at_deadline)
+        await admission.acquire("b")
+        assert admission.stats()["in_flight"] == 1 and admission.rejected["timeout"] == 0
+        admission.release("b")
+        assert admission.stats()["in_flight"] == 0 and not admission._per_user
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_no_trace():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, queue_timeout=5)
+        await admission.acquire("a")
+        waiter = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        admission.release("a")
+        assert admission.stats()["in_flight"] == 0 and admission.stats()["queued"] == 0
+        assert not admission._per_user
+
+    asyncio.run(run())
+
+
+def test_priority_lane_is_bounded_and_per_user_limited():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, per_user_limit=1, queue_timeout=5, max_priority=1)
+        await admission.acquire("a")
+        with pytest.raises(Overloaded):
+            await admission.acquire("a", priority=True)
+        first = asyncio.ensure_future(admission.acquire("b", priority=True))
+        second = asyncio.ensure_future(admission.acquire("c", priority=True))
+        await asyncio.sleep(0)
+        stats = admission.stats()
+        assert stats["queued_priority"] == 1 and stats["queued"] == 2
+        admission.release("a")
+        await first
+        assert not second.done()
+        admission.release("b")
+        await second
+
+    asyncio.run(run())
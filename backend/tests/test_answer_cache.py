@@ -0,0 +1,58 @@
+import asyncio
+
+from models.chat import Message
+from services.answer_cache import AnswerCache
+
+
+def ask(text):
+    return [Message(role="user", content=text)]
+
+
+def test_only_stand_alone_questions_get_a_key():
+    cache = AnswerCache()
+    assert cache.key_for(ask("What is the minimum mesh size for trawl nets?")) == \
+        ("latin", "what is the minimum mesh size for trawl nets")
+    assert cache.key_for(ask("Is it safe to go fishing today?")) is None
+    assert cache.key_for(ask("Our boat is sinking, send help")) is None
+    assert cache.key_for(ask("बचाओ, नाव डूब रही है")) is None
+    history = ask("What is the minimum mesh size?") + [Message(role="assistant", content="40 mm."),
+                                                       Message(role="user", content="And for gill nets?")]
+    assert cache.key_for(history) is None
+    assert cache.stats()["skipped"] == 4
+
+
+def test_languages_are_cached_separately():
+    async def run():
+        cache = AnswerCache()
+        tamil = cache.key_for(ask("மீன்பிடி உரிமம் எப்படி பெறுவது"))
+        english = cache.key_for(ask("How do I get a fishing licence?"))
+        french = cache.key_for(ask("How do I get a fishing licence?"), language="FR")
+        assert tamil[0] == "ta" and english[0] == "latin" and french == ("fr", english[1])
+
+        await cache.put(english, "Apply at the fisheries office.")
+        assert await cache.lookup(english) == "Apply at the fisheries office."
+        assert await cache.lookup(french) is None
+        assert await cache.lookup(tamil) is None
+
+    asyncio.run(run())
+
+
+def test_answers_expire_after_the_ttl():
+    async def run():
+        cache = AnswerCache(ttl=0.05)
+        key = cache.key_for(ask("What is the minimum mesh size for trawl nets?"))
+        calls = []
+
+        async def answer():
+            calls.append(1)
+            return "40 mm."
+
+        assert await cache.get_or_answer(key, answer) == "40 mm."
+        assert await cache.get_or_answer(key, answer) == "40 mm."
+        assert len(calls) == 1
+        await asyncio.sleep(0.1)
+        assert await cache.lookup(key) is None
+        assert await cache.get_or_answer(key, answer) == "40 mm."
+        assert len(calls) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+import importlib.util
+import os
+
+import pytest
+
+from benchmarks.bench_backends import agreement, load_images
+from services.fish_classifier import BACKENDS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (backend, model file, runtime modules of which any one will do). The exported
+# files come from `python export_model.py`; the test skips those not on disk.
+CANDIDATES = [
+    ("tflite", "FishModelClassifier_V5.tflite", ("tflite_runtime", "tensorflow")),
+    ("tflite", "FishModelClassifier_V5_int8.tflite", ("tflite_runtime", "tensorflow")),
+    ("onnx", "FishModelClassifier_V5.onnx", ("onnxruntime",)),
+    ("onnx", "FishModelClassifier_V5_int8.onnx", ("onnxruntime",)),
+]
+
+
+def model_path(name: str) -> str:
+    return os.path.join(BACKEND_DIR, name)
+
+
+def require(path: str, runtimes):
+    if not any(importlib.util.find_spec(name) for name in runtimes):
+        pytest.skip(f"needs {' or '.join(runtimes)}")
+    if not os.path.exists(path):
+        pytest.skip(f"{os.path.basename(path)} not found; run export_model.py")
+
+
+@pytest.fixture(scope="module")
+def images():
+    return load_images(None, 32)
+
+
+@pytest.fixture(scope="module")
+def reference(images):
+    path = model_path(BACKENDS["keras"][1])
+    require(path, ("tensorflow",))
+    predict = BACKENDS["keras"][0](path)
+    return predict(images)
+
+
+@pytest.mark.parametrize("backend,name,runtimes", CANDIDATES, ids=[name for _, name, _ in CANDIDATES])
+def test_exported_model_keeps_keras_top5(backend, name, runtimes, images, reference):
+    path = model_path(name)
+    require(path, runtimes)
+    predict = BACKENDS[backend][0](path)
+    _, top5, _ = agreement(reference, predict(images))
+    assert top5 >= 0.95
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.cache import GridCache, SqliteStore, Uncacheable
+
+
+def test_entries_expire_then_serve_stale_while_reloading(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("services.cache.time.monotonic", lambda: now[0])
+
+    async def run():
+        cache = GridCache(ttl=10, stale_ttl=20)
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            return len(loads)
+
+        assert await cache.get_or_load("k", loader) == 1
+        assert await cache.get_or_load("k", loader) == 1
+        now[0] += 15
+        assert cache.get("k") is None and cache.peek("k") == 1
+        assert await cache.get_or_load("k", loader) == 1  # Stale, reloaded in the background
+        for _ in range(3):  # Let the reload run and settle; the patched clock stands still
+            await asyncio.sleep(0)
+        assert await cache.get_or_load("k", loader) == 2
+        now[0] += 40
+        assert cache.peek("k") is None
+        assert cache.stats()["stale_hits"] == 1
+
+    asyncio.run(run())
+
+
+def test_concurrent_loads_are_coalesced_and_errors_not_cached():
+    async def run():
+        cache = GridCache()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise ConnectionError("upstream down")
+            return "ok"
+
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(5)), return_exceptions=True)
+        assert len(calls) == 1 and all(isinstance(r, ConnectionError) for r in results)
+        assert await cache.get_or_load("k", loader) == "ok"
+        assert cache.stats()["coalesced"] == 4
+
+        async def degraded():
+            raise Uncacheable("fallback")
+
+        assert await cache.get_or_load("other", degraded) == "fallback"
+        assert cache.get("other") is None
+
+    asyncio.run(run())
+
+
+def test_get_or_load_many_loads_only_missing_keys():
+    async def run():
+        cache = GridCache()
+        cache.put("a", 1)
+        batches = []
+
+        async def loader(keys):
+            batches.append(sorted(keys))
+            return {key: key.upper() for key in keys if key != "c"}
+
+        values = await cache.get_or_load_many(["a", "b", "c", "b"], loader)
+        assert batches == [["b", "c"]]
+        assert values["a"] == 1 and values["b"] == "B" and isinstance(values["c"], KeyError)
+        assert cache.get("b") == "B" and cache.get("c") is None
+
+    asyncio.run(run())
+
+
+def test_lru_bounds_entries_and_bytes():
+    cache = GridCache(max_entries=2, max_bytes=100)
+    cache.put("a", 1, size=10)
+    cache.put("b", 2, size=10)
+    cache.peek("a")
+    cache.put("c", 3, size=10)
+    assert cache.peek("b") is None and cache.peek("a") == 1
+    cache.put("d", 4, size=95)
+    assert cache.stats()["entries"] == 1 and cache.stats()["evictions"] == 3
+
+
+def test_store_is_shared_between_workers_off_the_event_loop(tmp_path, monkeypatch):
+    async def run():
+        path = str(tmp_path / "cache.db")
+        store_a, store_b = SqliteStore(path), SqliteStore(path)
+        worker_a = GridCache(store=store_a, namespace="alert")
+        worker_b = GridCache(store=store_b, namespace="alert")
+
+        loop_thread = threading.get_ident()
+        threads = []
+        execute = store_b._get_many
+
+        def spy(*args):
+            threads.append(threading.get_ident())
+            return execute(*args)
+
+        monkeypatch.setattr(store_b, "_get_many", spy)
+
+        worker_a.put((1, 2), {"safe": True})
+        await store_a.flush()
+
+        async def never():
+            raise AssertionError("should come from the store")
+
+        assert await worker_b.get_or_load((1, 2), never) == {"safe": True}
+        assert await worker_b.get_or_load_many([(1, 2)], never) == {(1, 2): {"safe": True}}
+        assert worker_b.stats()["store_hits"] == 1
+        assert threads and loop_thread not in threads
+        store_a.close()
+        store_b.close()
+
+    asyncio.run(run())
+
+
+def test_store_purges_on_the_writer_thread(tmp_path):
+    async def run():
+        store = SqliteStore(str(tmp_path / "cache.db"), max_entries=3, purge_every=5)
+        for i in range(5):
+            store.set("ns", str(i), b"1", 2e9 + i, 2e9 + i)
+        store.set("ns", "expired", b"1", 0, 0)
+        await store.flush()
+        assert sorted(await store.get_many("ns", [str(i) for i in range(5)])) == ["2", "3", "4"]
+        store.close()
+        store.set("ns", "late", b"1", 2e9, 2e9)  # Ignored once closed
+
+    asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def no_leaked_threads():
+    yield
+    assert not [t for t in threading.enumerate() if t.name.startswith("sqlite-store")]
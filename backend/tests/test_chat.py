@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("mistralai")
+
+from models.chat import ChatRequest  # noqa: E402
+from services.admission import AdmissionController  # noqa: E402
+from services.chat import ChatService  # noqa: E402
+
+
+def event(text):
+    return SimpleNamespace(data=SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))]))
+
+
+class FakeChat:
+    def __init__(self, chunks, stall=0):
+        self.chunks = chunks
+        self.stall = stall
+
+    async def stream_async(self, **kwargs):
+        async def events():
+            for text in self.chunks:
+                yield event(text)
+            await asyncio.sleep(self.stall)
+        return events()
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    return ChatService(admission=AdmissionController(max_in_flight=1), llm_timeout=0.1)
+
+
+def test_stream_releases_the_slot_once_generation_ends(service):
+    async def run():
+        service.client.chat = FakeChat(["Calm ", "seas ", "today."])
+        stream = service.stream_chat_response(ChatRequest(message="how is the sea"), "client")
+        assert await stream.__anext__() == "Calm "
+        await asyncio.sleep(0.01)
+        # The client has not read the rest yet, but Mistral is done
+        assert service.admission.stats()["in_flight"] == 0
+        assert [chunk async for chunk in stream] == ["seas ", "today."]
+
+    asyncio.run(run())
+
+
+def test_stream_gives_up_the_slot_when_the_client_leaves_or_mistral_stalls(service):
+    async def run():
+        service.client.chat = FakeChat(["Calm "], stall=10)
+        stream = service.stream_chat_response(ChatRequest(message="how is the sea"), "client")
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        assert service.admission.stats()["in_flight"] == 0
+
+        stream = service.stream_chat_response(ChatRequest(message="how is the sea"), "client")
+        with pytest.raises(asyncio.TimeoutError):
+            _ = [chunk async for chunk in stream]
+        assert service.admission.stats()["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_disconnect_mid_stream_drops_the_unanswered_turn(service):
+    async def run():
+        service.client.chat = FakeChat(["Calm "], stall=10)
+        request = ChatRequest(message="how is the sea")
+        stream = service.stream_chat_response(request, "client")
+        await stream.__anext__()
+        await stream.aclose()
+        session = await service.sessions.get_or_create(request.session_id)
+        assert session.messages == [] and not session.lock.locked()
+
+    asyncio.run(run())
@@ -0,0 +1,110 @@
+import asyncio
+
+from services.cache import SqliteStore
+from services.chat_sessions import ChatSessionStore
+
+
+async def no_summary(previous, turns):
+    return previous
+
+
+def test_session_follows_a_client_across_workers(tmp_path):
+    async def run():
+        path = str(tmp_path / "cache.db")
+        store_a, store_b = SqliteStore(path), SqliteStore(path)
+        worker_a = ChatSessionStore(no_summary, store=store_a)
+        worker_b = ChatSessionStore(no_summary, store=store_b)
+
+        session = await worker_a.get_or_create(None)
+        worker_a.append(session, "user", "Hi, I fish near Kochi")
+        worker_a.append(session, "assistant", "Hello")
+        await store_a.flush()
+
+        # Worker B loads it on a memory miss and adds a turn
+        other = await worker_b.get_or_create(session.id)
+        await worker_b.refresh(other)
+        worker_b.append(other, "user", "What about tomorrow?")
+        worker_b.append(other, "assistant", "Looks calm")
+        await store_b.flush()
+
+        # Back on worker A, its in-memory copy is behind until refreshed
+        again = await worker_a.get_or_create(session.id)
+        assert again is session and len(session.messages) == 2
+        await worker_a.refresh(session)
+        assert [m["content"] for m in session.messages][-1] == "Looks calm"
+        assert worker_a.stats()["reloaded"] == 1
+
+        # Nothing newer in the store: the in-memory copy is kept as is
+        await worker_b.refresh(other)
+        assert len(other.messages) == 4 and worker_b.stats()["reloaded"] == 0
+        store_a.close()
+        store_b.close()
+
+    asyncio.run(run())
+
+
+def test_context_keeps_newest_turns_within_budget():
+    async def run():
+        sessions = ChatSessionStore(no_summary, token_budget=40, summary_batch_tokens=10**6)
+        session = await sessions.get_or_create(None)
+        for i in range(10):
+            sessions.append(session, "user", f"question number {i} " * 3)
+        _, recent = sessions.context(session)
+        assert recent[-1]["content"].startswith("question number 9")
+        assert len(recent) < 10 and len(session.pending_summary) == 10 - len(recent)
+
+    asyncio.run(run())
+
+
+def test_turns_stay_pending_until_their_summary_exists(tmp_path):
+    async def run():
+        store = SqliteStore(str(tmp_path / "cache.db"))
+        release, fail = asyncio.Event(), [True]
+
+        async def summarize(previous, turns):
+            await release.wait()
+            if fail[0]:
+                raise ConnectionError("model down")
+            return f"{len(turns)} turns"
+
+        sessions = ChatSessionStore(summarize, token_budget=40, store=store, summary_batch_tokens=1)
+        session = await sessions.get_or_create(None)
+        for i in range(6):
+            sessions.append(session, "user", f"question number {i} " * 3)
+        sessions.context(session)
+        evicted = list(session.pending_summary)
+        assert evicted
+
+        # While the summary runs, the turns are still pending, also in the saved copy
+        await asyncio.sleep(0)
+        sessions.append(session, "assistant", "answer")
+        await store.flush()
+        other = await ChatSessionStore(no_summary, store=store).get_or_create(session.id)
+        assert other.pending_summary == evicted
+
+        release.set()
+        await asyncio.gather(*sessions._tasks)
+        assert session.pending_summary == evicted and session.summary == ""
+
+        fail[0] = False
+        sessions.context(session)
+        await asyncio.gather(*sessions._tasks)
+        assert session.pending_summary == [] and session.summary == f"{len(evicted)} turns"
+        store.close()
+
+    asyncio.run(run())
+
+
+def test_dropping_an_unanswered_turn_is_saved(tmp_path):
+    async def run():
+        store = SqliteStore(str(tmp_path / "cache.db"))
+        sessions = ChatSessionStore(no_summary, store=store)
+        session = await sessions.get_or_create(None)
+        sessions.append(session, "user", "Is it safe today?")
+        sessions.drop_unanswered(session)
+        await store.flush()
+        other = await ChatSessionStore(no_summary, store=store).get_or_create(session.id)
+        assert session.messages == [] and other.messages == []
+        store.close()
+
+    asyncio.run(run())
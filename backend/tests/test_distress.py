@@ -0,0 +1,17 @@
+import pytest
+
+from services.distress import is_distress
+
+
+@pytest.mark.parametrize("text", ["Mayday, we are sinking", "My boat is sinking!", "man overboard near Kochi",
+                                  "our boat capsized", "the boat is taking on water", "We're drowning, send help",
+                                  "बचाओ, नाव डूब रही है", "எங்களை காப்பாற்றுங்கள்", "పడవ మునిగిపోతుంది"])
+def test_distress_messages(text):
+    assert is_distress(text)
+
+
+@pytest.mark.parametrize("text", ["help me choose a gill net", "how does the SOS button work?",
+                                  "what to do in an emergency", "what if my boat sinks",
+                                  "मछली पकड़ने में मदद करो", "வலை பற்றி உதவி"])
+def test_ordinary_questions(text):
+    assert not is_distress(text)
@@ -0,0 +1,98 @@
+import asyncio
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from services.fish_classifier import (
+    ClassifierBusy, FishClassifier, MicroBatcher, PredictionCache, ProcessPool, content_hash, perceptual_hash,
+)
+
+
+def test_pool_that_fails_to_start_releases_processes_and_shared_memory():
+    before = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+    with pytest.raises(RuntimeError, match="failed to load the model"):
+        ProcessPool(2, "onnx", "/nonexistent/model.onnx", load_timeout=60)
+    assert not multiprocessing.active_children()
+    if os.path.isdir("/dev/shm"):
+        assert set(os.listdir("/dev/shm")) <= before
+
+
+def test_failed_load_backs_off_before_retrying():
+    async def run():
+        classifier = FishClassifier("/nonexistent/model.onnx", backend="onnx")
+        calls = []
+        load = classifier.load
+        classifier.load = lambda: calls.append(1) or load()
+        with pytest.raises(Exception) as first:
+            await classifier.ensure_loaded()
+        assert not isinstance(first.value, ClassifierBusy) and classifier.status()["state"] == "failed"
+        with pytest.raises(ClassifierBusy, match="retrying in"):
+            await classifier.ensure_loaded()
+        assert len(calls) == 1
+
+        classifier._retry_at = 0  # Backoff over
+        with pytest.raises(Exception):
+            await classifier.ensure_loaded()
+        assert len(calls) == 2 and classifier.failures == 2
+        classifier.close()
+
+    asyncio.run(run())
+
+
+def test_batcher_merges_concurrent_requests_and_isolates_a_bad_one():
+    passes = []
+
+    def predict_fn(images):
+        passes.append(len(images))
+        if (images[:, 0, 0, 0] < 0).any():
+            raise ValueError("bad image")
+        # One "probability" row per image that identifies it
+        return images[:, 0, 0, :1] * np.ones((1, 3), dtype=np.float32)
+
+    def image(value):
+        return np.full((1, 4, 4, 3), value, dtype=np.float32)
+
+    async def run():
+        batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=200)
+        results = await asyncio.gather(*(batcher.predict_many(image(v)) for v in (1, 2, 3)))
+        assert passes == [3]
+        assert [r[0, 0] for r in results] == [1, 2, 3]
+
+        passes.clear()
+        results = await asyncio.gather(*(batcher.predict_many(image(v)) for v in (4, -1, 5)),
+                                       return_exceptions=True)
+        assert isinstance(results[1], ValueError)
+        assert results[0][0, 0] == 4 and results[2][0, 0] == 5
+        assert passes[0] == 3
+        batcher.stop()
+
+    asyncio.run(run())
+
+
+def test_prediction_cache_matches_exact_bytes_and_near_duplicate_photos():
+    def distance(a, b):
+        return int(np.unpackbits(np.frombuffer(perceptual_hash(a), np.uint8)
+                                 ^ np.frombuffer(perceptual_hash(b), np.uint8)).sum())
+
+    rng = np.random.default_rng(0)
+    photo = rng.uniform(0, 1, (224, 224, 3)).astype(np.float32)
+    recompressed = photo.copy()
+    recompressed[:28, :25] = 1  # A changed corner flips a bit or so
+    other = rng.uniform(0, 1, (224, 224, 3)).astype(np.float32)
+    assert 0 < distance(photo, recompressed) <= 4 < distance(photo, other)
+
+    cache = PredictionCache(perceptual=True, max_distance=4)
+    probabilities = np.array([0.9, 0.1], dtype=np.float32)
+    _, phash_key = cache.lookup_perceptual(content_hash(b"photo"), photo)
+    cache.put(content_hash(b"photo"), probabilities)
+    cache.put(phash_key, probabilities)
+
+    assert cache.lookup(content_hash(b"photo")) is probabilities
+    assert cache.lookup(content_hash(b"recompressed")) is None
+    assert cache.lookup_perceptual(content_hash(b"recompressed"), recompressed)[0] is probabilities
+    # The near-duplicate's bytes now hit directly
+    assert cache.lookup(content_hash(b"recompressed")) is probabilities
+    assert cache.lookup_perceptual(content_hash(b"other"), other)[0] is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["perceptual_hits"] == 1
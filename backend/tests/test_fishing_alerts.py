@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import httpx
+import pytest
+
+from services import solar
+from services.fishing_alerts import IndiaFishingAlerts
+
+IST = ZoneInfo("Asia/Kolkata")
+CALM = {"wind_speed_10m": 2.0, "precipitation": 0.0, "visibility": 20000.0,
+        "wave_height": 0.5, "swell_wave_height": 0.3, "ocean_current_velocity": 0.2}
+
+
+def open_meteo(request: httpx.Request) -> httpx.Response:
+    """Calm conditions everywhere, shaped like Open-Meteo's (multi-)location responses."""
+    params = request.url.params
+    lats, lons = params["latitude"].split(","), params["longitude"].split(",")
+    bodies = []
+    for lat, lon in zip(lats, lons):
+        body = {"latitude": float(lat), "longitude": float(lon)}
+        if "current" in params:
+            body["current"] = {k: CALM.get(k, 1) for k in params["current"].split(",")}
+        if "hourly" in params:
+            # Naive IST wall-clock hours, from yesterday so any test date is covered
+            start = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+            times = [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(72)]
+            body["hourly"] = {"time": times, **{k: [CALM[k]] * 72 for k in params["hourly"].split(",")}}
+        bodies.append(body)
+    return httpx.Response(200, json=bodies[0] if len(bodies) == 1 else bodies)
+
+
+@pytest.fixture
+def alerts():
+    return IndiaFishingAlerts(httpx.AsyncClient(transport=httpx.MockTransport(open_meteo)))
+
+
+def freeze(monkeypatch, epoch):
+    """Pin both clocks the alert code reads: time.time() and datetime.now()."""
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(epoch, tz)
+
+    monkeypatch.setattr("services.fishing_alerts.datetime", FrozenDatetime)
+    monkeypatch.setattr("services.solar.time.time", lambda: epoch)
+    monkeypatch.setattr("services.fishing_alerts.time.time", lambda: epoch)
+
+
+def test_hour_running_past_sunset_is_night(alerts, monkeypatch):
+    lat, lon = 9.95, 76.25  # Kochi
+    today = int(datetime.now(IST).timestamp() // 86400)
+    _, sunset = solar.sun_times(lat, lon, today)
+    sunset_hour = datetime.fromtimestamp(float(sunset), IST).replace(minute=0, second=0, microsecond=0)
+
+    # An hour before: that hour is light throughout, the next one starts light but ends dark
+    freeze(monkeypatch, (sunset_hour - timedelta(minutes=55)).timestamp())
+    timeline = asyncio.run(alerts.get_timeline(lat, lon, hours=3))
+    first, second = timeline["hours"][:2]
+    assert first["time_of_day"] == "Day" and first["safe"]
+    assert second["time"] == sunset_hour.strftime("%Y-%m-%dT%H:00")
+    assert second["time_of_day"] == "Night" and not second["safe"]
+    assert timeline["windows"][-1]["end"] == sunset_hour.strftime("%Y-%m-%dT%H:00")
+
+
+def test_current_hour_agrees_with_the_live_alert(alerts, monkeypatch):
+    lat, lon = 9.95, 76.25
+    today = int(datetime.now(IST).timestamp() // 86400)
+    _, sunset = solar.sun_times(lat, lon, today)
+    for moment in (float(sunset) - 120, float(sunset) + 120):
+        freeze(monkeypatch, moment)
+        alerts.solar = solar.SolarTable(alerts.solar.grid_deg)
+        timeline = asyncio.run(alerts.get_timeline(lat, lon, hours=1))
+        alert = asyncio.run(alerts.get_alerts(lat, lon))
+        assert timeline["hours"][0]["time_of_day"] == alert["time_of_day"]
+        assert timeline["hours"][0]["safe"] == alert["safe"]
+
+
+
+
+
+def test_batch_keeps_input_order_and_shares_cells(alerts):
+    points = [(9.95, 76.25), (13.08, 80.29), (9.951, 76.251), (19.0, 72.8), (9.95, 76.25)]
+    results = asyncio.run(alerts.get_alerts_batch(points))
+    assert [r["location"] for r in results] == [f"{lat:.2f}°N, {lon:.2f}°E" for lat, lon in points]
+    # Points in one grid cell share one upstream evaluation
+    assert results[0]["data"] is results[2]["data"] is results[4]["data"]
+    assert alerts.stats()["alert_cache"]["entries"] == 3
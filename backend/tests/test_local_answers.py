@@ -0,0 +1,24 @@
+import pytest
+
+from services.local_answers import EMERGENCY_REPLY, LocalAnswers
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return LocalAnswers.load()
+
+
+@pytest.mark.parametrize("text", ["My boat is sinking!", "Mayday mayday", "We are drowning, send help",
+                                  "बचाओ", "நாங்கள் மூழ்குகிறோம், காப்பாற்றுங்கள்"])
+def test_distress_gets_the_sos_reply(engine, text):
+    assert engine.answer(text) == EMERGENCY_REPLY
+
+
+@pytest.mark.parametrize("text", ["What to do in an emergency?", "help me choose a net",
+                                  "what if my boat sinks", "how does the SOS button work"])
+def test_questions_about_emergencies_are_answered_normally(engine, text):
+    assert engine.answer(text) != EMERGENCY_REPLY
+
+
+def test_off_topic_falls_through(engine):
+    assert engine.answer("What is the capital of France?") is None
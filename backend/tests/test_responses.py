@@ -0,0 +1,38 @@
+import gzip
+import json
+
+import pytest
+
+from services import responses
+from services.responses import ResponseEncoder, negotiate_encoding
+
+BODY = {"alerts": [{"location": "9.95°N, 76.25°E", "score": 0.8}] * 50}
+
+
+def test_brotli_is_preferred_when_installed():
+    brotli = pytest.importorskip("brotli")
+    assert negotiate_encoding("gzip, deflate, br") == "br"
+    assert negotiate_encoding("br;q=0, gzip") == "gzip"
+    response = ResponseEncoder().response(BODY, "gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert json.loads(brotli.decompress(response.body)) == BODY
+
+
+def test_gzip_then_identity(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("GZIP;q=0.5") == "gzip"
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding("") is None
+
+    encoder = ResponseEncoder()
+    response = encoder.response(BODY, "gzip, br")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(response.body)) == BODY
+
+    plain = encoder.response(BODY, "identity")
+    assert "content-encoding" not in plain.headers and json.loads(plain.body) == BODY
+    # Bodies too small to be worth compressing go out as they are
+    small = encoder.response({"ok": True}, "gzip")
+    assert "content-encoding" not in small.headers
@@ -0,0 +1,110 @@
+import asyncio
+
+import httpx
+
+from services.rss_service import RssService
+
+FEED = """<rss><channel><title>News</title><link>https://news.google.com</link>
+<item><title>Calm seas off {place}</title><link>https://example.com/1</link></item></channel></rss>"""
+
+TOWNS = {9: "Kochi", 8: "Kollam", 13: "Chennai", 10: "Alappuzha"}
+
+
+class Upstreams:
+    """Nominatim and Google News stand-ins that record what was asked."""
+
+    def __init__(self):
+        self.geocoded = []
+        self.feeds = []
+        self.nominatim_down = False
+        self.etag = '"v1"'
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == "nominatim.openstreetmap.org":
+            self.geocoded.append((request.url.params["lat"], request.url.params["lon"]))
+            if self.nominatim_down:
+                return httpx.Response(503)
+            town = TOWNS[int(float(request.url.params["lat"]))]
+            return httpx.Response(200, json={"address": {"town": town}})
+        place = request.url.params["q"].rsplit('"', 2)[-2]
+        self.feeds.append((place, request.headers.get("if-none-match")))
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, text=FEED.format(place=place), headers={"etag": self.etag})
+
+
+def service_for(upstreams, **options):
+    return RssService(httpx.AsyncClient(transport=httpx.MockTransport(upstreams)), **options)
+
+
+def test_place_names_are_cached_per_grid_cell():
+    async def run():
+        upstreams = Upstreams()
+        service = service_for(upstreams)
+        assert await service._reverse_place(9.93, 76.26) == "Kochi"
+        assert await service._reverse_place(9.94, 76.27) == "Kochi"
+        assert len(upstreams.geocoded) == 1
+        assert await service._reverse_place(8.88, 76.59) == "Kollam"
+        assert len(upstreams.geocoded) == 2
+        assert service.stats()["geocode_cache"]["hits"] >= 1
+
+    asyncio.run(run())
+
+
+def test_failed_geocode_falls_back_to_national_news_without_caching_it():
+    async def run():
+        upstreams = Upstreams()
+        upstreams.nominatim_down = True
+        service = service_for(upstreams)
+        assert await service._reverse_place(13.08, 80.29) == ""
+        upstreams.nominatim_down = False
+        assert await service._reverse_place(13.08, 80.29) == "Chennai"
+        assert len(upstreams.geocoded) == 2
+
+    asyncio.run(run())
+
+
+def test_unchanged_feed_is_revalidated_and_kept_fresh():
+    async def run():
+        upstreams = Upstreams()
+        service = service_for(upstreams, feed_ttl=0.05)
+        place, feed = await service.get_feed(9.93, 76.26)
+        assert place == "Kochi" and feed["items"][0]["title"] == "Calm seas off Kochi"
+        entry = service._feeds.peek("Kochi")
+
+        await asyncio.sleep(0.1)
+        assert service._feeds.get("Kochi") is None
+        await service._refresh("Kochi")
+        # A 304 keeps the previous entry, object and all, with a new TTL
+        assert upstreams.feeds[-1] == ("Kochi", '"v1"')
+        assert service._feeds.get("Kochi") is entry
+        assert service.revalidated == 1 and service.refetched == 1
+
+        upstreams.etag = '"v2"'
+        await asyncio.sleep(0.1)
+        await service._refresh("Kochi")
+        assert service._feeds.peek("Kochi") is not entry and service.refetched == 2
+
+    asyncio.run(run())
+
+
+def test_warm_loop_refreshes_the_most_requested_places():
+    async def run():
+        upstreams = Upstreams()
+        service = service_for(upstreams, warm_top_n=2, warm_places=["Chennai"])
+        for lat, times in ((9.93, 3), (8.88, 2), (10.5, 1)):
+            for _ in range(times):
+                await service.get_feed(lat, 76.3)
+        assert service._demand == {"Kochi": 3, "Kollam": 2, "Alappuzha": 1}
+
+        upstreams.feeds.clear()
+        service.refresh_interval = 0.01
+        service.start()
+        while len(upstreams.feeds) < 3:
+            await asyncio.sleep(0.001)
+        await service.stop()
+        assert {place for place, _ in upstreams.feeds} == {"Chennai", "Kochi", "Kollam"}
+        # Counts are halved each round, and places asked for only once are dropped
+        assert service._demand == {"Kochi": 1, "Kollam": 1}
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from services import solar
+
+
+def epoch(day, hh_mm):
+    hour, minute = map(int, hh_mm.split(":"))
+    return datetime(day.year, day.month, day.day, hour, minute, tzinfo=timezone.utc).timestamp()
+
+
+# NOAA Solar Calculator, London (51.5074 N, 0.1278 W), times in UTC
+@pytest.mark.parametrize("day,sunrise,sunset", [
+    (date(2024, 6, 21), "03:43", "20:21"),
+    (date(2024, 12, 21), "08:04", "15:53"),
+])
+def test_sun_times_match_noaa(day, sunrise, sunset):
+    rise, set_ = solar.sun_times(51.5074, -0.1278, (day - date(1970, 1, 1)).days)
+    # NOAA rounds to the minute
+    assert abs(rise - epoch(day, sunrise)) <= 60
+    assert abs(set_ - epoch(day, sunset)) <= 60
+
+
+def test_is_daytime_is_vectorized():
+    day = date(2024, 6, 21)
+    when = [epoch(day, "02:00"), epoch(day, "12:00"), epoch(day, "21:00")]
+    assert solar.is_daytime(51.5074, -0.1278, when).tolist() == [False, True, False]
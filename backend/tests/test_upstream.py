@@ -0,0 +1,117 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.upstream import CircuitBreaker, Upstream, UpstreamUnavailable
+
+
+def response(status):
+    return httpx.Response(status, request=httpx.Request("GET", "https://upstream.test/"))
+
+
+def test_breaker_opens_after_threshold_and_probes_after_reset(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("services.upstream.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_client_errors_do_not_trip_the_breaker():
+    async def run():
+        upstream = Upstream("test", failure_threshold=1)
+        for status in (404, 400):
+            with pytest.raises(httpx.HTTPStatusError):
+                await upstream.call(lambda: asyncio.sleep(0, response(status)))
+        assert upstream.breaker.state == "closed"
+        with pytest.raises(httpx.HTTPStatusError):
+            await upstream.call(lambda: asyncio.sleep(0, response(503)))
+        assert upstream.breaker.state == "open"
+        with pytest.raises(UpstreamUnavailable):
+            await upstream.call(lambda: asyncio.sleep(0, response(200)))
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_is_not_an_upstream_failure():
+    async def run():
+        upstream = Upstream("test", max_concurrency=1, queue_timeout=0.01, failure_threshold=1)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return response(200)
+
+        holder = asyncio.ensure_future(upstream.call(slow))
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamUnavailable):
+            await upstream.call(lambda: asyncio.sleep(0, response(200)))
+        assert upstream.rejected == 1
+        assert upstream.breaker.state == "closed" and upstream.breaker.failures == 0
+
+        # Batch callers wait for the slot instead
+        waiter = asyncio.ensure_future(upstream.call(lambda: asyncio.sleep(0, response(200)), wait=True))
+        await asyncio.sleep(0.03)
+        release.set()
+        assert (await holder).status_code == 200
+        assert (await waiter).status_code == 200
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_hands_the_probe_back():
+    async def run():
+        upstream = Upstream("test", max_concurrency=1, queue_timeout=0.01, failure_threshold=1, reset_timeout=0)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return response(200)
+
+        holder = asyncio.ensure_future(upstream.call(slow, wait=True))
+        await asyncio.sleep(0)
+        upstream.breaker.record_failure()
+        with pytest.raises(UpstreamUnavailable):
+            await upstream.call(lambda: asyncio.sleep(0, response(200)))
+        # The probe that never ran must not leave the circuit stuck half-open
+        assert upstream.breaker.allow()
+        release.set()
+        await holder
+
+    asyncio.run(run())
+
+
+def test_cancelled_probe_hands_the_probe_back():
+    async def run():
+        upstream = Upstream("test", failure_threshold=1, reset_timeout=0)
+        upstream.breaker.record_failure()
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(10)
+
+        probe = asyncio.ensure_future(upstream.call(hang))
+        await started.wait()
+        assert upstream.breaker.state == "half_open"
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        # Not stuck half-open: the next call is let through as the probe
+        assert (await upstream.call(lambda: asyncio.sleep(0, response(200)))).status_code == 200
+        assert upstream.breaker.state == "closed"
+
+    asyncio.run(run())